@@ -1,8 +1,30 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
+from fastapi import HTTPException
+
+from app.core.config import settings
 from app.core.db import get_mongodb_client, get_mongodb_engine
-from app.core.llm import get_llm
-from app.core.vector_store import get_lancedb_vector_store
+from app.core.embeddings import get_query_embedding_dispatcher
+from app.core.llm import get_llm_gateway
+from app.core.readiness import ComponentNotReady, get_readiness
+from app.core.vector_store import (
+    get_async_image_vector_store,
+    get_async_vector_store,
+)
+
+
+async def wait_until_ready(name: str) -> None:
+    """
+    Wait for a model that is loaded in the background, or answer 503.
+    """
+    try:
+        await get_readiness().wait(name, settings.MODEL_READY_TIMEOUT)
+    except ComponentNotReady as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"The {e.name} model is not ready ({e.status}).",
+            headers={"Retry-After": str(settings.MODEL_RETRY_AFTER)},
+        ) from None
 
 
 def db_generator() -> Generator:
@@ -21,17 +43,37 @@ def engine_generator() -> Generator:
         pass
 
 
-def vector_store_generator() -> Generator:
+async def vector_store_generator() -> AsyncGenerator:
+    await wait_until_ready("vector_store")
     try:
-        vector_store = get_lancedb_vector_store()
+        vector_store = get_async_vector_store()
         yield vector_store
     finally:
         pass
 
 
-def llm_generator() -> Generator:
+async def image_vector_store_generator() -> AsyncGenerator:
+    await wait_until_ready("vector_store")
+    try:
+        image_vector_store = get_async_image_vector_store()
+        yield image_vector_store
+    finally:
+        pass
+
+
+async def query_embedder_generator() -> AsyncGenerator:
+    await wait_until_ready("embeddings")
+    try:
+        query_embedder = get_query_embedding_dispatcher()
+        yield query_embedder
+    finally:
+        pass
+
+
+async def llm_generator() -> AsyncGenerator:
+    await wait_until_ready("llm")
     try:
-        llm = get_llm()
+        llm = get_llm_gateway()
         yield llm
     finally:
         pass
@@ -1,9 +1,18 @@
 from fastapi import APIRouter
 
-from app.api.routes import annotation, concept, document, link
+from app.api.routes import (
+    annotation,
+    concept,
+    document,
+    embedding_migration,
+    link,
+    metrics,
+)
 
 api_router = APIRouter()
 api_router.include_router(document.router)
 api_router.include_router(concept.router)
 api_router.include_router(annotation.router)
 api_router.include_router(link.router)
+api_router.include_router(metrics.router)
+api_router.include_router(embedding_migration.router)
@@ -1,18 +1,42 @@
+import asyncio
+import json
 import logging
-from typing import Any
+import time
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
 
-from fastapi import APIRouter, Body, Depends
-from langchain_community.vectorstores import LanceDB
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from odmantic import AIOEngine
 
 from app import schemas
 from app.api import deps
+from app.core.answer_cache import get_answer_cache
 from app.core.config import settings
+from app.core.llm import get_token_counter
+from app.core.prompts import get_rag_prompt
+from app.core.vector_store import request_vector_store_maintenance
 from app.crud.crud_block import block as crud_block
 from app.crud.crud_document import document as crud_document
+from app.rag.context import PackedContext, pack_context
+from app.rag.embeddings.dispatcher import QueryEmbeddingDispatcher
+from app.rag.llm_gateway import LLMGateway, LLMOverloaded
 from app.rag.pdf_processors.marker import MarkerPDFProcessor, flatten_blocks
-from app.rag.prompts.base import get_rag_prompt
-from app.schemas.section import SectionBase, gather_section_hierarchies
+from app.rag.retrieval import retrieval_latency, retrieve, retrieve_many
+from app.rag.utils.thumbnail import (
+    get_or_render_thumbnail_index,
+    get_sprite_path,
+    schedule_thumbnail_sprite,
+)
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+from app.schemas.section import (
+    SectionBase,
+    gather_section_hierarchies,
+    image_blocks_to_chunks,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/document", tags=["document"])
@@ -37,19 +61,58 @@ async def get_document(
 async def upload_document(
     *,
     engine: AIOEngine = Depends(deps.engine_generator),
+    background_tasks: BackgroundTasks,
     document_in: schemas.DocumentCreate,
 ) -> Any:
     document = await crud_document.create(engine, obj_in=document_in)
+    background_tasks.add_task(
+        schedule_thumbnail_sprite,
+        document.id,
+        settings.DOCUMENT_DIR_PATH / document.path,
+    )
     return document
 
 
+@router.post("/thumbnails", response_model=schemas.ThumbnailIndex)
+async def get_thumbnails(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    id: str = Body(..., embed=True),
+) -> Any:
+    document = await crud_document.get(engine, id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="File not found in DB.")
+    # Normally pre-rendered at upload; render now if the background job is not done.
+    return await run_in_threadpool(
+        get_or_render_thumbnail_index, id, settings.DOCUMENT_DIR_PATH / document.path
+    )
+
+
+@router.post("/thumbnail_sprite", response_class=FileResponse)
+async def get_thumbnail_sprite(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    id: str = Body(..., embed=True),
+) -> Any:
+    document = await crud_document.get(engine, id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="File not found in DB.")
+    index = await run_in_threadpool(
+        get_or_render_thumbnail_index, id, settings.DOCUMENT_DIR_PATH / document.path
+    )
+    return FileResponse(get_sprite_path(id), media_type=f"image/{index.format.lower()}")
+
+
 @router.post("/delete", response_model=schemas.Msg)
 async def delete_document(
     *,
     engine: AIOEngine = Depends(deps.engine_generator),
     id: str = Body(..., embed=True),
 ) -> Any:
+    # Also deletes the vectors, without waiting for the embedding model.
     await crud_document.delete(engine, id)
+    if (answer_cache := get_answer_cache()) is not None:
+        answer_cache.invalidate(id)
     return {"msg": "File deleted successfully."}
 
 
@@ -57,7 +120,10 @@ async def delete_document(
 async def process_document(
     *,
     engine: AIOEngine = Depends(deps.engine_generator),
-    vector_store: LanceDB = Depends(deps.vector_store_generator),
+    vector_store: AsyncLanceDB = Depends(deps.vector_store_generator),
+    image_vector_store: AsyncLanceDB | None = Depends(
+        deps.image_vector_store_generator
+    ),
     id: str = Body(..., embed=True),
 ) -> Any:
     document = await crud_document.get(engine, id)
@@ -78,9 +144,12 @@ async def process_document(
         schemas.BlockCreate.from_JSONBlockOutput(id, page_number, block)
         for page_number, block in enumerate(blocks)
     ]
-    await crud_block.create_multi(engine, objs_in=blocks)
+    # Reprocessing replaces the blocks and chunks of the document in place.
+    block_counts = await crud_block.upsert_multi(engine, file_id=id, objs_in=blocks)
+    logger.info(f"Upserted blocks: {block_counts}")
 
-    section_hierarchies = gather_section_hierarchies(blocks, ["1", "2"])
+    levels = ["1", "2"]
+    section_hierarchies = gather_section_hierarchies(blocks, levels)
     sections = [
         SectionBase.from_blocks(blocks, section_hierarchy)
         for section_hierarchy in section_hierarchies
@@ -91,56 +160,411 @@ async def process_document(
     ]
     logger.info(f"Created {len(chunks)} chunks from the document.")
 
-    document_ids = vector_store.add_documents(chunks)
-    logger.info(f"Added {len(document_ids)} documents to the vector store.")
+    chunk_counts = await vector_store.upsert_documents(chunks, file_id=id)
+    logger.info(f"Upserted chunks into the vector store: {chunk_counts}")
 
-    document_in = schemas.DocumentUpdate(metadata=rendered.metadata)
+    embeddings = vector_store.embeddings
+    if image_vector_store is not None and hasattr(embeddings, "embed_images"):
+        image_chunks, images = image_blocks_to_chunks(
+            blocks, levels, embedding_model=embeddings.name
+        )
+        image_counts = await image_vector_store.upsert_documents(
+            image_chunks,
+            file_id=id,
+            embed=lambda indices: embeddings.embed_images([images[i] for i in indices]),
+        )
+        logger.info(f"Upserted images into the image vector store: {image_counts}")
+
+    # Index the new rows without waiting for the next maintenance run.
+    request_vector_store_maintenance()
+
+    # updated_at versions the cached answers of the document (see
+    # _lookup_answer); answers cached by any worker before this are dropped.
+    document_in = schemas.DocumentUpdate(
+        metadata=rendered.metadata, updated_at=datetime.now(timezone.utc)
+    )
     await crud_document.update(engine, db_obj=document, obj_in=document_in)
+    if (answer_cache := get_answer_cache()) is not None:
+        answer_cache.invalidate(id)
     logger.info(f"Recorded file processing in DB with file_id: {id}")
     return {"msg": "Document processed successfully."}
 
 
-@router.post("/rag", response_model=schemas.RAGResponse)
-async def retrieve_and_respond(
-    *,
-    engine: AIOEngine = Depends(deps.engine_generator),
-    vector_store: LanceDB = Depends(deps.vector_store_generator),
-    llm: Any = Depends(deps.llm_generator),
+def _sources(docs: list) -> list[schemas.RAGSource]:
+    return [
+        schemas.RAGSource(
+            file_id=doc.metadata["file_id"], block_ids=doc.metadata["block_ids"]
+        )
+        for doc in docs
+    ]
+
+
+def _pack_context(docs: list) -> PackedContext:
+    context = pack_context(docs, get_token_counter(), settings.RAG_CONTEXT_MAX_TOKENS)
+    logger.info(
+        "Packed %d of %d chunks into %d tokens (%d tokens saved).",
+        len(context.docs),
+        len(docs),
+        context.tokens,
+        context.tokens_saved,
+    )
+    return context
+
+
+def _context_fields(context: PackedContext) -> dict[str, Any]:
+    """
+    The fields of `RAGResponse` about the chunks in the prompt.
+    """
+    return {
+        "answer": len(context.docs),
+        "sources": _sources(context.docs),
+        "context_tokens": context.tokens,
+        "context_tokens_saved": context.tokens_saved,
+    }
+
+
+async def _retrieve_context(
+    engine: AIOEngine,
+    vector_store: AsyncLanceDB,
+    image_vector_store: AsyncLanceDB | None,
+    query_embedder: QueryEmbeddingDispatcher,
     rag_request: schemas.RAGRequest,
-) -> Any:
+    embedding: list[float] | None = None,
+) -> tuple[list, list]:
+    """
+    The chunks retrieved for a question, and the blocks of the best one.
+    """
     file_id = rag_request.file_id
-    retrieved_docs = vector_store.similarity_search(
-        rag_request.question, k=rag_request.k, filter={"metadata.file_id": file_id}
+    mode = rag_request.retrieval_mode
+    start = time.perf_counter()
+    # Embedding runs off the event loop; the searches are async.
+    if mode != "lexical" and embedding is None:
+        embedding = await query_embedder.embed_query(rag_request.question)
+    retrieved_docs = await retrieve(
+        vector_store,
+        image_vector_store,
+        rag_request.question,
+        embedding,
+        k=rag_request.k,
+        file_id=file_id,
+        mode=mode,
+        image_weight=settings.LANCE_IMAGE_RESULT_WEIGHT,
+        file_ids=rag_request.file_ids,
+        max_per_document=rag_request.max_chunks_per_document,
+    )
+    retrieval_latency.record(
+        mode if file_id is not None else f"{mode} (library)",
+        time.perf_counter() - start,
     )
     logger.info("Retrieved %d similar documents for the question.", len(retrieved_docs))
     if len(retrieved_docs) == 0:
-        return schemas.RAGResponse(
-            status="fail",
-            response=f"No documents found for the given file_id({file_id}).",
-            question=rag_request.question,
-        )
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
-
+        return [], []
     most_similar_doc = retrieved_docs[0]
     most_similar_section = await crud_block.get_multi(
         engine,
         {
-            "file_id": file_id,
+            "file_id": most_similar_doc.metadata["file_id"],
             "block_id": {"$in": most_similar_doc.metadata["block_ids"]},
         },
     )
+    return retrieved_docs, most_similar_section
+
+
+class _AnswerLookup(NamedTuple):
+    embedding: list[float] | None = None
+    response: schemas.RAGResponse | None = None
+    key: tuple | None = None
+    version: Any = None
+
+
+async def _lookup_answer(
+    engine: AIOEngine,
+    vector_store: AsyncLanceDB,
+    query_embedder: QueryEmbeddingDispatcher,
+    rag_request: schemas.RAGRequest,
+) -> _AnswerLookup:
+    """
+    The cached answer to a question on a document, if any. The question is
+    embedded here, and the embedding reused for retrieval.
+    """
+    answer_cache = get_answer_cache()
+    if (
+        answer_cache is None
+        or rag_request.file_id is None
+        or rag_request.retrieval_mode == "lexical"
+    ):
+        return _AnswerLookup()
+    document = await crud_document.get(engine, rag_request.file_id)
+    if document is None:
+        return _AnswerLookup()
+    embedding = await query_embedder.embed_query(rag_request.question)
+    key = (
+        rag_request.file_id,
+        vector_store.embeddings.name,
+        rag_request.k,
+        rag_request.retrieval_mode,
+    )
+    response = answer_cache.get(key, embedding, document.updated_at)
+    if response is not None:
+        logger.info("Answered from the answer cache.")
+        response = response.model_copy(update={"question": rag_request.question})
+    return _AnswerLookup(embedding, response, key, document.updated_at)
+
+
+def _remember_answer(lookup: _AnswerLookup, response: schemas.RAGResponse) -> None:
+    answer_cache = get_answer_cache()
+    if answer_cache is not None and lookup.key is not None:
+        answer_cache.put(lookup.key, lookup.embedding, lookup.version, response)
+
+
+def _not_found_message(rag_request: schemas.RAGRequest) -> str:
+    if rag_request.file_id is not None:
+        return f"No documents found for the given file_id({rag_request.file_id})."
+    return "No documents found for the given documents."
+
+
+@router.post("/rag", response_model=schemas.RAGResponse)
+async def retrieve_and_respond(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    vector_store: AsyncLanceDB = Depends(deps.vector_store_generator),
+    image_vector_store: AsyncLanceDB | None = Depends(
+        deps.image_vector_store_generator
+    ),
+    query_embedder: QueryEmbeddingDispatcher = Depends(deps.query_embedder_generator),
+    llm: LLMGateway = Depends(deps.llm_generator),
+    rag_request: schemas.RAGRequest,
+) -> Any:
+    lookup = await _lookup_answer(engine, vector_store, query_embedder, rag_request)
+    if lookup.response is not None:
+        return lookup.response
+    retrieved_docs, most_similar_section = await _retrieve_context(
+        engine,
+        vector_store,
+        image_vector_store,
+        query_embedder,
+        rag_request,
+        embedding=lookup.embedding,
+    )
+    if len(retrieved_docs) == 0:
+        return schemas.RAGResponse(
+            status="fail",
+            response=_not_found_message(rag_request),
+            question=rag_request.question,
+        )
+    context = _pack_context(retrieved_docs)
 
     prompt = get_rag_prompt()
     messages = prompt.invoke(
-        {"question": rag_request.question, "context": docs_content}
+        {"question": rag_request.question, "context": context.text}
     )
-    response = llm.invoke(messages)
+    response = await llm.ainvoke(messages)
     logger.info("Generated response from the language model.")
 
-    return schemas.RAGResponse(
+    rag_response = schemas.RAGResponse(
         status="success",
         response=response,
         question=rag_request.question,
-        answer=len(retrieved_docs),
         section=most_similar_section,
+        **_context_fields(context),
+    )
+    _remember_answer(lookup, rag_response)
+    return rag_response
+
+
+def _format_event(event: str, data: Any, sse: bool) -> str:
+    data = jsonable_encoder(data)
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+@router.post("/rag_stream")
+async def retrieve_and_stream(
+    *,
+    request: Request,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    vector_store: AsyncLanceDB = Depends(deps.vector_store_generator),
+    image_vector_store: AsyncLanceDB | None = Depends(
+        deps.image_vector_store_generator
+    ),
+    query_embedder: QueryEmbeddingDispatcher = Depends(deps.query_embedder_generator),
+    llm: LLMGateway = Depends(deps.llm_generator),
+    rag_request: schemas.RAGRequest,
+) -> Any:
+    """
+    `/rag`, streamed as the answer is generated: a "sections" event with the
+    retrieved sections (the fields of `RAGResponse` but the response), then a
+    "token" event per generated chunk of text, and a "done" event. A failure is
+    reported by an "error" event.
+
+    Events are newline-delimited JSON objects with "event" and "data" keys, or
+    server-sent events if the request accepts `text/event-stream`.
+    """
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    lookup = await _lookup_answer(engine, vector_store, query_embedder, rag_request)
+    if lookup.response is not None:
+        cached = lookup.response
+
+        async def cached_events() -> AsyncGenerator[str, None]:
+            yield _format_event(
+                "sections", cached.model_dump(exclude={"status", "response"}), sse
+            )
+            yield _format_event("token", cached.response, sse)
+            yield _format_event("done", None, sse)
+
+        return StreamingResponse(
+            cached_events(),
+            media_type="text/event-stream" if sse else "application/x-ndjson",
+        )
+    retrieved_docs, most_similar_section = await _retrieve_context(
+        engine,
+        vector_store,
+        image_vector_store,
+        query_embedder,
+        rag_request,
+        embedding=lookup.embedding,
+    )
+
+    async def events() -> AsyncGenerator[str, None]:
+        if len(retrieved_docs) == 0:
+            yield _format_event("error", _not_found_message(rag_request), sse)
+            return
+        context = _pack_context(retrieved_docs)
+        sections = {
+            "question": rag_request.question,
+            "section": most_similar_section,
+            **_context_fields(context),
+        }
+        yield _format_event("sections", sections, sse)
+        prompt = get_rag_prompt()
+        messages = prompt.invoke(
+            {"question": rag_request.question, "context": context.text}
+        )
+        tokens = []
+        try:
+            # The LLM is read asynchronously; the event loop serves other
+            # requests between chunks.
+            async for chunk in llm.astream(messages):
+                # Chat models stream message chunks, LLMs strings.
+                token = getattr(chunk, "content", chunk)
+                tokens.append(token)
+                yield _format_event("token", token, sse)
+        except LLMOverloaded as e:
+            yield _format_event("error", str(e), sse)
+            return
+        except Exception:
+            logger.exception("Failed to stream a response from the language model.")
+            yield _format_event("error", "Failed to generate a response.", sse)
+            return
+        logger.info("Streamed response from the language model.")
+        _remember_answer(
+            lookup,
+            schemas.RAGResponse(status="success", response="".join(tokens), **sections),
+        )
+        yield _format_event("done", None, sse)
+
+    if retrieved_docs:
+        # Answer 429 now if the LLM queue is full, rather than in the stream.
+        llm.check()
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+    )
+
+
+@router.post("/rag_batch", response_model=list[schemas.RAGResponse])
+async def retrieve_and_respond_batch(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    vector_store: AsyncLanceDB = Depends(deps.vector_store_generator),
+    image_vector_store: AsyncLanceDB | None = Depends(
+        deps.image_vector_store_generator
+    ),
+    query_embedder: QueryEmbeddingDispatcher = Depends(deps.query_embedder_generator),
+    llm: LLMGateway = Depends(deps.llm_generator),
+    rag_request: schemas.RAGBatchRequest,
+) -> Any:
+    """
+    Answer several questions on a document, e.g. for a study guide. The answers
+    are in the order of the questions.
+    """
+    file_id = rag_request.file_id
+    questions = rag_request.questions
+    mode = rag_request.retrieval_mode
+    start = time.perf_counter()
+    embeddings = None
+    if mode != "lexical":
+        # All the questions in one call to the model.
+        embeddings = await query_embedder.embed_queries(questions)
+    retrieved = await retrieve_many(
+        vector_store,
+        image_vector_store,
+        questions,
+        embeddings,
+        k=rag_request.k,
+        file_id=file_id,
+        mode=mode,
+        image_weight=settings.LANCE_IMAGE_RESULT_WEIGHT,
+    )
+    retrieval_latency.record(f"{mode} (batch)", time.perf_counter() - start)
+    logger.info("Retrieved documents for %d questions.", len(questions))
+
+    # The sections of all the answers in one query.
+    block_ids = {
+        block_id
+        for docs in retrieved
+        if docs
+        for block_id in docs[0].metadata["block_ids"]
+    }
+    blocks = await crud_block.get_multi(
+        engine, {"file_id": file_id, "block_id": {"$in": list(block_ids)}}
+    )
+    blocks_by_id = {block.block_id: block for block in blocks}
+
+    # Answer 429 if the LLM queue is full, rather than failing every question.
+    llm.check()
+    prompt = get_rag_prompt()
+    # The LLM serves other requests too; only a few answers are queued at once.
+    semaphore = asyncio.Semaphore(settings.RAG_BATCH_LLM_CONCURRENCY)
+
+    async def respond(question: str, docs: list) -> schemas.RAGResponse:
+        if len(docs) == 0:
+            return schemas.RAGResponse(
+                status="fail",
+                response=f"No documents found for the given file_id({file_id}).",
+                question=question,
+            )
+        context = _pack_context(docs)
+        messages = prompt.invoke({"question": question, "context": context.text})
+        try:
+            async with semaphore:
+                response = await llm.ainvoke(messages)
+        except Exception:
+            # One failed answer does not fail the others.
+            logger.exception("Failed to generate a response for a batch question.")
+            return schemas.RAGResponse(
+                status="fail",
+                response="Failed to generate a response.",
+                question=question,
+            )
+        return schemas.RAGResponse(
+            status="success",
+            response=response,
+            question=question,
+            **_context_fields(context),
+            section=[
+                blocks_by_id[block_id]
+                for block_id in docs[0].metadata["block_ids"]
+                if block_id in blocks_by_id
+            ],
+        )
+
+    responses = await asyncio.gather(
+        *(
+            respond(question, docs)
+            for question, docs in zip(questions, retrieved, strict=True)
+        )
     )
+    logger.info("Generated %d responses from the language model.", len(responses))
+    return responses
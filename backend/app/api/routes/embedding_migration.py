@@ -0,0 +1,67 @@
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from odmantic import AIOEngine
+
+from app import schemas
+from app.api import deps
+from app.api.deps import wait_until_ready
+from app.core import embedding_migration
+from app.core.embedding_migration import EmbeddingMigrationError
+from app.crud import embedding_migration as crud_embedding_migration
+from app.rag.embeddings.registry import EMBEDDING_MODEL_REGISTRY
+
+router = APIRouter(prefix="/embedding_migration", tags=["embedding_migration"])
+
+
+@router.post("/start", response_model=schemas.EmbeddingMigrationBase)
+async def start_embedding_migration(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    migration_in: schemas.EmbeddingMigrationCreate,
+) -> Any:
+    if migration_in.model_key not in EMBEDDING_MODEL_REGISTRY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown embedding model '{migration_in.model_key}'.",
+        )
+    await wait_until_ready("vector_store")
+    try:
+        return await embedding_migration.start_migration(
+            engine, migration_in.model_key, migration_in.model_kwargs
+        )
+    except EmbeddingMigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from None
+
+
+@router.post("/list", response_model=list[schemas.EmbeddingMigrationBase])
+async def list_embedding_migrations(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+) -> Any:
+    return await crud_embedding_migration.get_multi(engine)
+
+
+@router.post("/cutover", response_model=schemas.EmbeddingMigrationBase)
+async def cutover_embedding_migration(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+    id: str = Body(..., embed=True),
+) -> Any:
+    await wait_until_ready("vector_store")
+    try:
+        return await embedding_migration.cutover(engine, id)
+    except EmbeddingMigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from None
+
+
+@router.post("/rollback", response_model=schemas.EmbeddingMigrationBase)
+async def rollback_embedding_migration(
+    *,
+    engine: AIOEngine = Depends(deps.engine_generator),
+) -> Any:
+    await wait_until_ready("vector_store")
+    try:
+        return await embedding_migration.rollback(engine)
+    except EmbeddingMigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from None
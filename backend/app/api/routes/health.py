@@ -0,0 +1,26 @@
+from typing import Any
+
+from fastapi import APIRouter, Response
+
+from app import schemas
+from app.core.readiness import get_readiness
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/ready", response_model=schemas.Readiness)
+async def ready(response: Response) -> Any:
+    readiness = get_readiness()
+    if not readiness.is_ready():
+        response.status_code = 503
+    return schemas.Readiness(
+        ready=readiness.is_ready(),
+        components={
+            name: schemas.ComponentStatus(
+                status=component.status,
+                error=component.error,
+                load_seconds=component.load_seconds,
+            )
+            for name, component in readiness.components.items()
+        },
+    )
@@ -0,0 +1,76 @@
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app import schemas
+from app.api.deps import wait_until_ready
+from app.core.answer_cache import get_answer_cache
+from app.core.embeddings import get_query_embedding_cache
+from app.core.llm import get_llm_gateway
+from app.core.vector_store import (
+    get_async_image_vector_store,
+    get_async_vector_store,
+    get_index_managers,
+)
+from app.rag.retrieval import retrieval_latency
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.post("/query_embedding_cache", response_model=schemas.CacheStats)
+async def get_query_embedding_cache_stats() -> Any:
+    await wait_until_ready("embeddings")
+    cache = get_query_embedding_cache()
+    if cache is None:
+        raise HTTPException(
+            status_code=404, detail="The query embedding cache is disabled."
+        )
+    return cache.stats()
+
+
+@router.post("/answer_cache", response_model=schemas.CacheStats)
+async def get_answer_cache_stats() -> Any:
+    answer_cache = get_answer_cache()
+    if answer_cache is None:
+        raise HTTPException(status_code=404, detail="The answer cache is disabled.")
+    return answer_cache.stats()
+
+
+@router.post("/document_vector_cache", response_model=list[schemas.CacheStats])
+async def get_document_vector_cache_stats() -> Any:
+    await wait_until_ready("vector_store")
+    stores = [get_async_vector_store(), get_async_image_vector_store()]
+    caches = [
+        store.document_cache
+        for store in stores
+        if store is not None and store.document_cache is not None
+    ]
+    if not caches:
+        raise HTTPException(
+            status_code=404, detail="The document vector cache is disabled."
+        )
+    return [cache.stats() for cache in caches]
+
+
+@router.post("/llm", response_model=schemas.LLMGatewayStats)
+async def get_llm_gateway_stats() -> Any:
+    await wait_until_ready("llm")
+    return get_llm_gateway().stats()
+
+
+@router.post("/vector_index", response_model=list[schemas.VectorIndexStats])
+async def get_vector_index_stats() -> Any:
+    await wait_until_ready("vector_store")
+    return [
+        schemas.VectorIndexStats(
+            **await run_in_threadpool(index_manager.status),
+            search_latency=index_manager.vector_store.search_stats.summary(),
+        )
+        for index_manager in get_index_managers()
+    ]
+
+
+@router.post("/retrieval", response_model=list[schemas.RetrievalLatency])
+async def get_retrieval_latency() -> Any:
+    return retrieval_latency.summary("mode")
@@ -0,0 +1,26 @@
+from app.core.config import settings
+from app.rag.answer_cache import SemanticAnswerCache
+
+
+class _AnswerCacheSingleton:
+    _instance = None
+    answer_cache = SemanticAnswerCache | None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            instance.answer_cache = (
+                SemanticAnswerCache(
+                    settings.RAG_ANSWER_CACHE_SIZE,
+                    threshold=settings.RAG_ANSWER_CACHE_THRESHOLD,
+                    ttl=settings.RAG_ANSWER_CACHE_TTL,
+                )
+                if settings.RAG_ANSWER_CACHE_SIZE > 0
+                else None
+            )
+            cls._instance = instance
+        return cls._instance
+
+
+def get_answer_cache() -> SemanticAnswerCache | None:
+    return _AnswerCacheSingleton().answer_cache
@@ -45,15 +45,111 @@ class Settings(BaseSettings):
 
     LANCE_URI: str = "lancedb/nexusnote"
     LANCE_TABLE_NAME: str = "vectorstore"
+    # Matryoshka search dimension (e.g. 256); None searches the full embeddings.
+    LANCE_SEARCH_DIM: int | None = None
+    # Candidates re-ranked with the full embeddings, as a multiple of k.
+    LANCE_RESCORE_FACTOR: int = 4
+    # ANN index, trained once a table has LANCE_INDEX_MIN_ROWS rows and re-trained
+    # when it has grown by LANCE_INDEX_RETRAIN_GROWTH; smaller tables are searched
+    # exhaustively.
+    LANCE_INDEX_TYPE: Literal["IVF_PQ", "IVF_HNSW_PQ", "IVF_HNSW_SQ"] = "IVF_PQ"
+    LANCE_INDEX_MIN_ROWS: int = 10_000
+    LANCE_INDEX_RETRAIN_GROWTH: float = 2.0
+    LANCE_MAINTENANCE_INTERVAL_SECONDS: float = 600
+    # Fragment compaction and removal of table versions older than
+    # LANCE_VERSION_RETENTION_SECONDS.
+    LANCE_COMPACTION_INTERVAL_SECONDS: float = 3600
+    LANCE_VERSION_RETENTION_SECONDS: float = 3600
+    # Maintenance runs in the one process holding this lock, next to the tables.
+    LANCE_MAINTENANCE_LOCK_PATH: Path = Path("./lancedb/maintenance.lock")
+    # Index on the file_id column used by per-document searches. BTREE suits the
+    # many distinct values of a large library; BITMAP is smaller for a few hundred.
+    LANCE_FILE_ID_INDEX_TYPE: Literal["BTREE", "BITMAP"] = "BTREE"
+    LANCE_NPROBES: int = 20
+    LANCE_REFINE_FACTOR: int | None = None
+    # Per-document searches run on float16 copies of the document's vectors,
+    # memory-mapped from this directory, for the LANCE_DOCUMENT_CACHE_SIZE most
+    # recently searched documents. Set the path to None to search LanceDB.
+    LANCE_DOCUMENT_CACHE_DIR_PATH: Path | None = Path("./data/document_vectors")
+    LANCE_DOCUMENT_CACHE_SIZE: int = 64
+    # Documents whose vectors are kept on disk, least recently used removed first.
+    LANCE_DOCUMENT_CACHE_DISK_SIZE: int = 4096
+    # Picture/Figure embeddings; None disables image indexing and search.
+    LANCE_IMAGE_TABLE_NAME: str | None = "imagestore"
+    # Weight of the image results when fused with the text results.
+    LANCE_IMAGE_RESULT_WEIGHT: float = 0.5
 
+    # Model of the LANCE_*_TABLE_NAME tables. Once an embedding model migration
+    # has been cut over, its model and tables are served instead.
     EMBEDDINGS_MODEL_KEY: str = "jina-clip-v2"
     EMBEDDINGS_KWARGS: dict[str, Any] = {}
+    # Share of the time an embedding model migration spends re-embedding; it
+    # sleeps the rest, leaving the CPU/GPU to live queries.
+    EMBEDDING_MIGRATION_DUTY_CYCLE: float = 0.5
+    # The served model and tables are those of the active migration in the
+    # database; every API worker checks for a new one this often. Re-embedding
+    # runs in the one process holding EMBEDDING_MIGRATION_LOCK_PATH.
+    EMBEDDING_MIGRATION_POLL_SECONDS: float = 5.0
+    EMBEDDING_MIGRATION_LOCK_PATH: Path = Path("./lancedb/embedding_migration.lock")
+    # Longest write to the vector store tables, i.e. processing a document. After
+    # a cutover or rollback, documents written to the previous tables are synced
+    # again once every worker has switched: after the poll interval plus this.
+    EMBEDDING_MIGRATION_SETTLE_SECONDS: float = 60.0
+    # Persistent cache of document embeddings; set the path to None to disable it.
+    EMBEDDINGS_CACHE_DIR_PATH: Path | None = Path("./data/embeddings_cache")
+    EMBEDDINGS_CACHE_MAX_BYTES: int = 2 * 1024**3
+    # In-memory LRU of query embeddings; a size of 0 disables it.
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    QUERY_EMBEDDING_CACHE_TTL: float | None = 24 * 60 * 60
+    # Concurrent query embeddings are batched for up to this long.
+    QUERY_EMBEDDING_MAX_BATCH_SIZE: int = 32
+    QUERY_EMBEDDING_MAX_WAIT_MS: float = 5.0
+    # Model served to all API workers when EMBEDDINGS_MODEL_KEY is
+    # "embedding-server" (see app/rag/embeddings/server.py).
+    EMBEDDING_SERVER_SOCKET_PATH: Path = Path("/tmp/nexusnote-embeddings.sock")
+    EMBEDDING_SERVER_MODEL_KEY: str = "jina-clip-v2"
+    EMBEDDING_SERVER_MODEL_KWARGS: dict[str, Any] = {}
+
+    # Models load in the background after startup; requests that need a model
+    # wait this long for it before answering 503 with this Retry-After.
+    MODEL_READY_TIMEOUT: float = 30.0
+    MODEL_RETRY_AFTER: int = 10
 
     LLM_CLS: type[Any] = OllamaLLM
     LLM_KWARGS: dict[str, Any] = {"model": "llama3.2"}
+    # Hugging Face tokenizer of the LLM (e.g. a Llama 3.2 one for llama3.2), used
+    # to count prompt tokens. None uses the LLM class's own tokenizer if it has
+    # one (e.g. ChatOpenAI's), else an estimate of 4 characters per token.
+    LLM_TOKENIZER: str | None = None
+    # Generations in flight on the LLM backend; up to LLM_MAX_QUEUE more wait for
+    # LLM_QUEUE_TIMEOUT seconds, and further requests get 429 with this
+    # Retry-After.
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_MAX_QUEUE: int = 32
+    LLM_QUEUE_TIMEOUT: float = 60.0
+    LLM_RETRY_AFTER: int = 10
+    # Prompt versions of app/rag/prompts by key, e.g. {"rag": 1}; prompts that
+    # are not pinned use their latest version.
+    PROMPT_VERSIONS: dict[str, int] = {}
+    # Answers generated at once for a /document/rag_batch request.
+    RAG_BATCH_LLM_CONCURRENCY: int = 4
+    # Tokens of retrieved text put in a RAG prompt; None puts all of it.
+    RAG_CONTEXT_MAX_TOKENS: int | None = 2048
+    # Answers to questions on a document are reused for later questions within
+    # RAG_ANSWER_CACHE_THRESHOLD cosine similarity; a size of 0 disables it.
+    RAG_ANSWER_CACHE_SIZE: int = 1024
+    RAG_ANSWER_CACHE_THRESHOLD: float = 0.95
+    RAG_ANSWER_CACHE_TTL: float | None = 24 * 60 * 60
 
     DOCUMENT_DIR_PATH: Path = Path("./data/documents")
     DOCUMENT_DIR_PATH.mkdir(exist_ok=True, parents=True)
 
+    # Page thumbnails are pre-rendered into one sprite (atlas) per document.
+    THUMBNAIL_DIR_PATH: Path = Path("./data/thumbnails")
+    THUMBNAIL_DIR_PATH.mkdir(exist_ok=True, parents=True)
+    THUMBNAIL_WIDTH: int = 128
+    THUMBNAIL_FORMAT: Literal["WEBP", "JPEG", "PNG"] = "WEBP"
+    THUMBNAIL_QUALITY: int = 75
+
 
 settings = Settings()  # type: ignore
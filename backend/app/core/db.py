@@ -4,6 +4,7 @@ from pymongo.driver_info import DriverInfo
 
 from app.__version__ import __version__
 from app.core.config import settings
+from app.models.block import Block
 
 DRIVER_INFO = DriverInfo(name="nexusnote", version=__version__)
 
@@ -47,3 +48,5 @@ async def ping():
 
 async def init_db():
     _MongoClientSingleton()
+    # Create the indexes declared by the models.
+    await get_mongodb_engine().configure_database([Block])
@@ -0,0 +1,518 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+from odmantic import AIOEngine
+
+from app.core.config import settings
+from app.core.embeddings import create_embeddings, get_embeddings, set_embeddings
+from app.core.lease import FileLease
+from app.core.vector_store import (
+    get_async_image_vector_store,
+    get_async_vector_store,
+    request_vector_store_maintenance,
+    set_vector_store,
+)
+from app.crud.crud_block import block as crud_block
+from app.crud.crud_document import document as crud_document
+from app.crud.crud_embedding_migration import (
+    embedding_migration as crud_embedding_migration,
+)
+from app.models.embedding_migration import EmbeddingMigration
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+logger = logging.getLogger(__name__)
+
+# Loaded target models, reused at cutover.
+_models: dict[str, Any] = {}
+_tasks: dict[str, asyncio.Task] = {}
+# Syncs of the writes made during a switch (see `_sync_late_writes`), referenced
+# until done.
+_late_syncs: set[asyncio.Task] = set()
+# Serializes switches of the served model and tables in this process.
+_switch_lock = asyncio.Lock()
+# Migration whose model and tables this process serves; None for the configured
+# ones.
+_served_id: str | None = None
+
+
+class EmbeddingMigrationError(Exception):
+    pass
+
+
+class ServingConfig(NamedTuple):
+    model_key: str
+    model_kwargs: dict[str, Any]
+    table_name: str
+    image_table_name: str | None
+    migration_id: str | None = None
+
+
+def _serving_config(migration: EmbeddingMigration | None) -> ServingConfig:
+    if migration is None:
+        return ServingConfig(
+            settings.EMBEDDINGS_MODEL_KEY,
+            settings.EMBEDDINGS_KWARGS,
+            settings.LANCE_TABLE_NAME,
+            settings.LANCE_IMAGE_TABLE_NAME,
+        )
+    return ServingConfig(
+        migration.model_key,
+        migration.model_kwargs,
+        migration.table_name,
+        migration.image_table_name,
+        migration.id,
+    )
+
+
+def _model_key(config: ServingConfig) -> str:
+    return config.migration_id or "configured"
+
+
+def _lease() -> FileLease:
+    """
+    Held while re-embedding, so that a single process writes the tables of a
+    migration.
+    """
+    return FileLease(settings.EMBEDDING_MIGRATION_LOCK_PATH)
+
+
+async def get_serving_config(engine: AIOEngine) -> ServingConfig:
+    """
+    The model and tables to serve: those of the active migration, if any.
+    """
+    return _serving_config(await crud_embedding_migration.get_active(engine))
+
+
+def set_served_config(config: ServingConfig) -> None:
+    """
+    Record the model and tables this process was started with.
+    """
+    global _served_id
+    _served_id = config.migration_id
+
+
+def _create_stores(
+    embeddings: Any, config: ServingConfig
+) -> tuple[AsyncLanceDB, AsyncLanceDB | None]:
+    def create(table_name: str) -> AsyncLanceDB:
+        return AsyncLanceDB(
+            settings.LANCE_URI,
+            embeddings,
+            table_name,
+            search_dim=settings.LANCE_SEARCH_DIM,
+            rescore_factor=settings.LANCE_RESCORE_FACTOR,
+        )
+
+    image_store = None
+    if config.image_table_name is not None and hasattr(embeddings, "embed_images"):
+        image_store = create(config.image_table_name)
+    return create(config.table_name), image_store
+
+
+async def _load_model(key: str, config: ServingConfig) -> Any:
+    if key not in _models:
+        _models[key] = await asyncio.to_thread(
+            create_embeddings, config.model_key, config.model_kwargs
+        )
+    return _models[key]
+
+
+async def _image_embedder(
+    engine: AIOEngine, file_id: str, docs: list, embeddings: Any
+) -> tuple[list, Any]:
+    """
+    Embeds image chunks from the images stored with their blocks. Returns the
+    chunks whose image was found, and the embedding function.
+    """
+    blocks = await crud_block.get_multi(
+        engine,
+        {
+            "file_id": file_id,
+            "block_id": {"$in": [doc.metadata["block_ids"][0] for doc in docs]},
+        },
+    )
+    images = {
+        block.block_id: block.images.get(block.block_id)
+        or next(iter(block.images.values()))
+        for block in blocks
+        if block.images
+    }
+    docs = [doc for doc in docs if doc.metadata["block_ids"][0] in images]
+    return docs, lambda indices: embeddings.embed_images(
+        [images[docs[i].metadata["block_ids"][0]] for i in indices]
+    )
+
+
+async def sync_store(
+    engine: AIOEngine,
+    source: AsyncLanceDB,
+    target: AsyncLanceDB,
+    images: bool,
+    duty_cycle: float = 1.0,
+    on_document=None,
+    file_ids: set[str] | None = None,
+) -> None:
+    """
+    Make the rows of `target` match those of `source`, one document at a time,
+    embedding new and changed chunks with the model of `target`.
+
+    Args:
+        images: The rows are image chunks, embedded from their blocks' images.
+        duty_cycle: Share of the time spent embedding; the rest is slept.
+        file_ids: The documents to sync; all of them by default.
+    """
+    source_ids = await source.file_ids()
+    for file_id in sorted(source_ids if file_ids is None else source_ids & file_ids):
+        start = time.perf_counter()
+        docs = await source.get_documents(file_id)
+        for doc in docs:
+            doc.metadata["embedding_model"] = target.embeddings.name
+        embed = None
+        if images:
+            docs, embed = await _image_embedder(
+                engine, file_id, docs, target.embeddings
+            )
+        await target.upsert_documents(docs, file_id, embed=embed)
+        if on_document is not None:
+            await on_document()
+        if duty_cycle < 1.0:
+            await asyncio.sleep(
+                (time.perf_counter() - start) * (1 - duty_cycle) / duty_cycle
+            )
+    removed = await target.file_ids() - source_ids
+    for file_id in removed if file_ids is None else removed & file_ids:
+        await target.delete({"file_id": file_id})
+
+
+async def sync_tables(
+    engine: AIOEngine,
+    embeddings: Any,
+    config: ServingConfig,
+    duty_cycle: float = 1.0,
+    on_document=None,
+    source: ServingConfig | None = None,
+    file_ids: set[str] | None = None,
+) -> None:
+    """
+    Make the tables of `config` match those of `source`, by default the served
+    ones (see `sync_store`).
+    """
+    target, image_target = _create_stores(embeddings, config)
+    if source is None:
+        text_source, image_source = (
+            get_async_vector_store(),
+            get_async_image_vector_store(),
+        )
+    else:
+        # Only read: the model of `config` only decides whether images are synced.
+        text_source, image_source = _create_stores(embeddings, source)
+    await sync_store(
+        engine, text_source, target, False, duty_cycle, on_document, file_ids
+    )
+    if image_source is not None and image_target is not None:
+        await sync_store(
+            engine, image_source, image_target, True, duty_cycle, file_ids=file_ids
+        )
+
+
+async def _run_migration(engine: AIOEngine, migration_id: str) -> None:
+    lease = _lease()
+    if not lease.acquire():
+        # Another process is re-embedding.
+        return
+    try:
+        # Read again under the lease: a previous holder may have finished it.
+        migration = await crud_embedding_migration.get(engine, migration_id)
+        if migration is None or migration.status != "running":
+            return
+        logger.info(f"Running embedding migration {migration.id}.")
+        await _run_migration_locked(engine, migration)
+    finally:
+        lease.release()
+
+
+async def _run_migration_locked(
+    engine: AIOEngine, migration: EmbeddingMigration
+) -> None:
+    try:
+        # Re-embed from the tables that are served, as recorded in the database.
+        await follow_active_migration(engine)
+        embeddings = await _load_model(migration.id, _serving_config(migration))
+        migration.num_documents = len(await get_async_vector_store().file_ids())
+        migration.num_done = 0
+        await engine.save(migration)
+
+        async def on_document() -> None:
+            migration.num_done += 1
+            migration.updated_at = datetime.now(timezone.utc)
+            await engine.save(migration)
+
+        await sync_tables(
+            engine,
+            embeddings,
+            _serving_config(migration),
+            duty_cycle=settings.EMBEDDING_MIGRATION_DUTY_CYCLE,
+            on_document=on_document,
+        )
+    except Exception as e:
+        logger.exception(f"Embedding migration {migration.id} failed.")
+        migration.status = "failed"
+        migration.error = str(e)
+        _models.pop(migration.id, None)
+    else:
+        logger.info(f"Embedding migration {migration.id} is ready for cutover.")
+        migration.status = "ready"
+    migration.updated_at = datetime.now(timezone.utc)
+    await engine.save(migration)
+
+
+def _spawn(engine: AIOEngine, migration: EmbeddingMigration) -> None:
+    task = asyncio.create_task(_run_migration(engine, migration.id))
+    _tasks[migration.id] = task
+    task.add_done_callback(lambda _: _tasks.pop(migration.id, None))
+
+
+async def start_migration(
+    engine: AIOEngine, model_key: str, model_kwargs: dict[str, Any]
+) -> EmbeddingMigration:
+    """
+    Re-embed the served tables with another model into new tables, in the
+    background. Queries keep using the served tables until the cutover.
+    """
+    if await crud_embedding_migration.get_pending(engine) is not None:
+        raise EmbeddingMigrationError("Another migration is in progress.")
+    version = await crud_embedding_migration.count(engine) + 2
+    source = await crud_embedding_migration.get_active(engine)
+    migration = EmbeddingMigration(
+        model_key=model_key,
+        model_kwargs=model_kwargs,
+        table_name=f"{settings.LANCE_TABLE_NAME}_v{version}",
+        image_table_name=(
+            f"{settings.LANCE_IMAGE_TABLE_NAME}_v{version}"
+            if settings.LANCE_IMAGE_TABLE_NAME is not None
+            else None
+        ),
+        source_id=source.id if source is not None else None,
+    )
+    await engine.save(migration)
+    _spawn(engine, migration)
+    return migration
+
+
+async def resume_migrations(engine: AIOEngine) -> None:
+    """
+    Restart the re-embedding interrupted by a restart, or by the exit of the
+    process running it; chunks already written are skipped. Only the process
+    that gets the lease resumes it.
+    """
+    migration = await crud_embedding_migration.get_pending(engine)
+    if (
+        migration is not None
+        and migration.status == "running"
+        and migration.id not in _tasks
+    ):
+        _spawn(engine, migration)
+
+
+async def _serve(config: ServingConfig) -> None:
+    """
+    Serve the model and tables of `config` in this process.
+    """
+    global _served_id
+    key = _model_key(config)
+    embeddings = await _load_model(key, config)
+    # No await between the two: every request sees either the old or the new
+    # model with its tables.
+    set_embeddings(embeddings)
+    set_vector_store(get_embeddings(), config.table_name, config.image_table_name)
+    _served_id = config.migration_id
+    request_vector_store_maintenance()
+    # Only the served model and those of running migrations stay loaded.
+    for model_key in list(_models):
+        if model_key != key and model_key not in _tasks:
+            del _models[model_key]
+    logger.info(f"Serving the embedding model and tables of '{key}'.")
+
+
+async def follow_active_migration(engine: AIOEngine) -> None:
+    """
+    Serve the model and tables of the active migration recorded in the database,
+    if this process serves others, e.g. after a cutover made by another process.
+    """
+    config = await get_serving_config(engine)
+    if config.migration_id == _served_id:
+        return
+    async with _switch_lock:
+        if config.migration_id != _served_id:
+            await _serve(config)
+
+
+async def watch_migrations(engine: AIOEngine) -> None:
+    """
+    Every EMBEDDING_MIGRATION_POLL_SECONDS, follow the active migration and
+    resume a running one that no process is working on. Every process runs
+    this, so cutovers and rollbacks apply to all of them.
+    """
+    while True:
+        try:
+            await follow_active_migration(engine)
+            await resume_migrations(engine)
+        except Exception:
+            logger.exception("Failed to follow the embedding migrations.")
+        await asyncio.sleep(settings.EMBEDDING_MIGRATION_POLL_SECONDS)
+
+
+async def _catch_up(engine: AIOEngine, config: ServingConfig) -> dict[str, int]:
+    """
+    Sync the tables of `config` with the served ones before switching to them,
+    under the lease.
+
+    Returns:
+        dict: The versions of the served tables before the sync, by table name;
+            documents written after are synced again by `_sync_late_writes`.
+    """
+    lease = _lease()
+    if not lease.acquire():
+        raise EmbeddingMigrationError(
+            "The tables are being re-embedded by another process; try again later."
+        )
+    try:
+        await follow_active_migration(engine)
+        embeddings = await _load_model(_model_key(config), config)
+        versions = {}
+        for store in (get_async_vector_store(), get_async_image_vector_store()):
+            if store is not None and (version := await store.version()) is not None:
+                versions[store._table_name] = version
+        # Catch up on the documents processed or deleted since the last sync.
+        await sync_tables(engine, embeddings, config)
+        return versions
+    finally:
+        lease.release()
+
+
+async def _sync_late_writes(
+    engine: AIOEngine,
+    source: ServingConfig,
+    target: ServingConfig,
+    versions: dict[str, int],
+) -> None:
+    """
+    After a switch from the tables of `source` to those of `target`, sync the
+    documents written to the former since `versions` again: by the catch-up
+    itself, by writes started before the switch, and by the processes that had not
+    switched yet. Runs once every process has switched, i.e. after
+    EMBEDDING_MIGRATION_POLL_SECONDS plus EMBEDDING_MIGRATION_SETTLE_SECONDS, in
+    the process that made the switch.
+    """
+    await asyncio.sleep(
+        settings.EMBEDDING_MIGRATION_POLL_SECONDS
+        + settings.EMBEDDING_MIGRATION_SETTLE_SECONDS
+    )
+    lease = _lease()
+    while not lease.acquire():
+        await asyncio.sleep(settings.EMBEDDING_MIGRATION_POLL_SECONDS)
+    try:
+        embeddings = await _load_model(_model_key(target), target)
+        file_ids = set()
+        for store in _create_stores(embeddings, source):
+            if store is not None:
+                file_ids |= await store.changed_file_ids(
+                    versions.get(store._table_name)
+                )
+        # Deleted documents are gone from the served tables, but not from those
+        # of retired migrations.
+        documents = await crud_document.get_multi(
+            engine, {"_id": {"$in": sorted(file_ids)}}
+        )
+        file_ids &= {document.id for document in documents}
+        if file_ids:
+            await sync_tables(
+                engine, embeddings, target, source=source, file_ids=file_ids
+            )
+        logger.info(f"Synced {len(file_ids)} documents written during the switch.")
+    except Exception:
+        logger.exception("Failed to sync the documents written during the switch.")
+    finally:
+        lease.release()
+
+
+def _spawn_late_sync(
+    engine: AIOEngine,
+    source: ServingConfig,
+    target: ServingConfig,
+    versions: dict[str, int],
+) -> None:
+    task = asyncio.create_task(_sync_late_writes(engine, source, target, versions))
+    _late_syncs.add(task)
+    task.add_done_callback(_late_syncs.discard)
+
+
+async def cutover(engine: AIOEngine, id: str) -> EmbeddingMigration:
+    """
+    Serve the model and tables of a ready migration. The previous tables are
+    kept for rollback.
+
+    The switch is recorded in the database: this process switches right away,
+    and the others within EMBEDDING_MIGRATION_POLL_SECONDS (see
+    `watch_migrations`). Until then they keep serving the previous model with
+    its own tables; the documents they write there are synced into the new
+    tables afterwards (see `_sync_late_writes`).
+    """
+    migration = await crud_embedding_migration.get(engine, id)
+    if migration is None or migration.status != "ready":
+        raise EmbeddingMigrationError("The migration is not ready for cutover.")
+    config = _serving_config(migration)
+    versions = await _catch_up(engine, config)
+    async with _switch_lock:
+        migration = await crud_embedding_migration.get(engine, id)
+        if migration is None or migration.status != "ready":
+            raise EmbeddingMigrationError("The migration is not ready for cutover.")
+        active = await crud_embedding_migration.get_active(engine)
+        now = datetime.now(timezone.utc)
+        if active is not None:
+            active.status = "retired"
+            active.updated_at = now
+            await engine.save(active)
+        migration.status = "active"
+        migration.updated_at = now
+        await engine.save(migration)
+        await _serve(config)
+        _spawn_late_sync(engine, _serving_config(active), config, versions)
+        logger.info(f"Cut over to embedding migration {migration.id}.")
+        return migration
+
+
+async def rollback(engine: AIOEngine) -> EmbeddingMigration:
+    """
+    Serve the model and tables that were served before the last cutover again.
+    Documents processed since are re-embedded into them first. Like `cutover`,
+    the other processes follow within EMBEDDING_MIGRATION_POLL_SECONDS, and the
+    documents they write until then are synced afterwards.
+    """
+    active = await crud_embedding_migration.get_active(engine)
+    if active is None:
+        raise EmbeddingMigrationError("There is no migration to roll back.")
+    previous = None
+    if active.source_id is not None:
+        previous = await crud_embedding_migration.get(engine, active.source_id)
+    config = _serving_config(previous)
+    versions = await _catch_up(engine, config)
+    async with _switch_lock:
+        current = await crud_embedding_migration.get_active(engine)
+        if current is None or current.id != active.id:
+            raise EmbeddingMigrationError("The active migration has changed.")
+        now = datetime.now(timezone.utc)
+        if previous is not None:
+            previous.status = "active"
+            previous.updated_at = now
+            await engine.save(previous)
+        active.status = "rolled_back"
+        active.updated_at = now
+        await engine.save(active)
+        await _serve(config)
+        _spawn_late_sync(engine, _serving_config(active), config, versions)
+        logger.info(f"Rolled back embedding migration {active.id}.")
+        return active
@@ -1,23 +1,81 @@
+from typing import Any
+
 from app.core.config import settings
-from app.rag.embeddings.registry import create_embedding_model
+from app.rag.embeddings.cache import CachedEmbeddings
+from app.rag.embeddings.dispatcher import QueryEmbeddingDispatcher
+from app.rag.embeddings.query_cache import QueryCachedEmbeddings, QueryEmbeddingCache
+from app.rag.embeddings.registry import EMBEDDING_MODEL_REGISTRY, create_embedding_model
+
+
+def create_embeddings(model_key: str, model_kwargs: dict[str, Any]):
+    cacheable = getattr(EMBEDDING_MODEL_REGISTRY.get(model_key), "cacheable", True)
+    if settings.EMBEDDINGS_CACHE_DIR_PATH is None or not cacheable:
+        return create_embedding_model(model_key, **model_kwargs)
+    return CachedEmbeddings(
+        model_key,
+        cache_dir=settings.EMBEDDINGS_CACHE_DIR_PATH,
+        max_bytes=settings.EMBEDDINGS_CACHE_MAX_BYTES,
+        **model_kwargs,
+    )
 
 
 class _EmbeddingsSingleton:
     _instance = None
     embeddings = None
+    query_cache = None
+    dispatcher = None
 
-    def __new__(cls):
+    def __new__(cls, model_key: str | None = None, model_kwargs: dict | None = None):
         if cls._instance is None:
-            cls._instance = super(_EmbeddingsSingleton, cls).__new__(cls)
-            cls._instance.embeddings = create_embedding_model(
-                settings.EMBEDDINGS_MODEL_KEY, **settings.EMBEDDINGS_KWARGS
+            if model_key is None:
+                model_key = settings.EMBEDDINGS_MODEL_KEY
+                model_kwargs = settings.EMBEDDINGS_KWARGS
+            cls._instance = cls._create(
+                create_embeddings(model_key, model_kwargs or {})
             )
         return cls._instance
 
+    @classmethod
+    def _create(cls, embeddings) -> "_EmbeddingsSingleton":
+        instance = super().__new__(cls)
+        if settings.QUERY_EMBEDDING_CACHE_SIZE > 0:
+            # Shared by every path that embeds queries through the singleton.
+            instance.query_cache = QueryEmbeddingCache(
+                settings.QUERY_EMBEDDING_CACHE_SIZE,
+                ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            )
+            embeddings = QueryCachedEmbeddings(embeddings, instance.query_cache)
+        instance.embeddings = embeddings
+        instance.dispatcher = QueryEmbeddingDispatcher(
+            embeddings,
+            max_batch_size=settings.QUERY_EMBEDDING_MAX_BATCH_SIZE,
+            max_wait=settings.QUERY_EMBEDDING_MAX_WAIT_MS / 1000,
+        )
+        return instance
+
 
 def get_embeddings():
     return _EmbeddingsSingleton().embeddings
 
 
-def init_embeddings():
-    _EmbeddingsSingleton()
+def get_query_embedding_dispatcher() -> QueryEmbeddingDispatcher:
+    return _EmbeddingsSingleton().dispatcher
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache | None:
+    return _EmbeddingsSingleton().query_cache
+
+
+def init_embeddings(model_key: str | None = None, model_kwargs: dict | None = None):
+    """
+    Initialize the embeddings singleton, by default with the configured model.
+    """
+    _EmbeddingsSingleton(model_key, model_kwargs)
+
+
+def set_embeddings(embeddings) -> None:
+    """
+    Serve queries with another, already loaded, model (see
+    app/core/embedding_migration.py).
+    """
+    _EmbeddingsSingleton._instance = _EmbeddingsSingleton._create(embeddings)
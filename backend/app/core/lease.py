@@ -0,0 +1,42 @@
+import fcntl
+from pathlib import Path
+from typing import IO
+
+
+class FileLease:
+    """
+    An exclusive lock on a file, held by at most one process at a time, for
+    background work that every API worker would otherwise repeat. The lock is
+    released with `release` or when the holder exits, so another process can take
+    over the work.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._file: IO | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """
+        Take the lock if it is free. Returns whether this lease holds it.
+        """
+        if self._file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
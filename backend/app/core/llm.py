@@ -1,20 +1,97 @@
+import logging
+from collections.abc import Callable
+
+from langchain_core.language_models import BaseLanguageModel
+
 from app.core.config import settings
+from app.rag.context import estimate_tokens
+from app.rag.llm_gateway import LLMGateway
+
+logger = logging.getLogger(__name__)
 
 
 class _LLMSingleton:
     _instance = None
     llm = None
+    gateway: LLMGateway | None = None
+    count_tokens: Callable[[str], int] | None = None
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(_LLMSingleton, cls).__new__(cls)
-            cls._instance.llm = settings.LLM_CLS(**settings.LLM_KWARGS)
+            # Published only once fully built, so that a failed load is retried.
+            instance = super().__new__(cls)
+            instance.llm = settings.LLM_CLS(**settings.LLM_KWARGS)
+            # Routes generate through the gateway, which bounds the generations
+            # sent to the backend at once.
+            name = settings.LLM_CLS.__name__
+            if "model" in settings.LLM_KWARGS:
+                name = f"{name}({settings.LLM_KWARGS['model']})"
+            instance.gateway = LLMGateway(
+                instance.llm,
+                name,
+                max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                max_queue=settings.LLM_MAX_QUEUE,
+                queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+                retry_after=settings.LLM_RETRY_AFTER,
+            )
+            instance.count_tokens = _token_counter(instance.llm)
+            cls._instance = instance
         return cls._instance
 
 
+def _has_tokenizer(llm) -> bool:
+    """
+    Whether the LLM counts tokens with its own tokenizer, rather than with
+    LangChain's default, GPT-2's, downloaded on first use.
+    """
+    if not isinstance(llm, BaseLanguageModel):
+        return False
+    cls = type(llm)
+    return (
+        llm.custom_get_token_ids is not None
+        or cls.get_token_ids is not BaseLanguageModel.get_token_ids
+        or cls.get_num_tokens is not BaseLanguageModel.get_num_tokens
+    )
+
+
+def _token_counter(llm) -> Callable[[str], int]:
+    """
+    The token counter of the LLM: the LLM_TOKENIZER tokenizer if set, else the
+    LLM's own if it has one, else an estimate from the text length. A tokenizer
+    that cannot be loaded (e.g. offline) also falls back to the estimate.
+    """
+    try:
+        if settings.LLM_TOKENIZER is not None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(settings.LLM_TOKENIZER)
+
+            def count_tokens(text: str) -> int:
+                return len(tokenizer.encode(text, add_special_tokens=False))
+
+        elif _has_tokenizer(llm):
+            count_tokens = llm.get_num_tokens
+        else:
+            return estimate_tokens
+        # Loads the tokenizer's files now rather than on the first request.
+        count_tokens("")
+    except Exception:
+        logger.exception("Failed to load the LLM tokenizer; estimating tokens.")
+        return estimate_tokens
+    return count_tokens
+
+
 def get_llm():
     return _LLMSingleton().llm
 
 
+def get_llm_gateway() -> LLMGateway:
+    return _LLMSingleton().gateway
+
+
+def get_token_counter() -> Callable[[str], int]:
+    return _LLMSingleton().count_tokens
+
+
 def init_llm():
     _LLMSingleton()
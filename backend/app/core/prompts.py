@@ -0,0 +1,37 @@
+from langchain_core.prompts import BasePromptTemplate
+
+from app.core.config import settings
+from app.rag.prompts import create_prompt
+from app.rag.prompts.registry import PROMPT_REGISTRY
+
+
+class _PromptsSingleton:
+    """
+    The registered prompts, built once at the versions pinned in
+    settings.PROMPT_VERSIONS (the latest otherwise).
+    """
+
+    _instance = None
+    prompts = dict[str, BasePromptTemplate]
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            instance.prompts = {
+                key: create_prompt(key, settings.PROMPT_VERSIONS.get(key))
+                for key in PROMPT_REGISTRY
+            }
+            cls._instance = instance
+        return cls._instance
+
+
+def get_prompt(key: str) -> BasePromptTemplate:
+    return _PromptsSingleton().prompts[key]
+
+
+def get_rag_prompt() -> BasePromptTemplate:
+    return get_prompt("rag")
+
+
+def init_prompts() -> None:
+    _PromptsSingleton()
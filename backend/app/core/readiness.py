@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Literal
+
+from app.core.db import get_mongodb_engine
+from app.core.embedding_migration import get_serving_config, set_served_config
+from app.core.embeddings import get_embeddings, init_embeddings
+from app.core.llm import init_llm
+from app.core.vector_store import init_vector_store
+
+logger = logging.getLogger(__name__)
+
+Status = Literal["pending", "loading", "ready", "failed"]
+
+
+class ComponentNotReady(Exception):
+    def __init__(self, name: str, status: Status):
+        super().__init__(f"'{name}' is not ready ({status}).")
+        self.name = name
+        self.status = status
+
+
+class _Component:
+    def __init__(self):
+        self.status: Status = "pending"
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.event = asyncio.Event()
+
+
+class _ReadinessSingleton:
+    """
+    Load state of the models behind the API. Models load in the background after
+    startup, so routes that do not need them are served immediately.
+    """
+
+    _instance = None
+    components: dict[str, _Component]
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.components = {
+                name: _Component() for name in ("embeddings", "llm", "vector_store")
+            }
+        return cls._instance
+
+    async def load(self, name: str, init: Callable[[], None]) -> None:
+        component = self.components[name]
+        component.status = "loading"
+        component.error = None
+        # Waiters wait for this load, not a previous one (e.g. a second lifespan).
+        component.event.clear()
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(init)
+        except Exception as e:
+            logger.exception(f"Failed to load {name}.")
+            component.status = "failed"
+            component.error = str(e)
+        else:
+            component.status = "ready"
+            logger.info(f"Loaded {name} in {time.perf_counter() - start:.1f}s.")
+        component.load_seconds = time.perf_counter() - start
+        component.event.set()
+
+    async def wait(self, name: str, timeout: float) -> None:
+        """
+        Wait until `name` is loaded.
+
+        Raises:
+            ComponentNotReady: If it is still loading after `timeout` seconds, or
+                failed to load.
+        """
+        component = self.components[name]
+        try:
+            await asyncio.wait_for(component.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise ComponentNotReady(name, component.status) from None
+        if component.status != "ready":
+            raise ComponentNotReady(name, component.status)
+
+    def is_ready(self) -> bool:
+        return all(c.status == "ready" for c in self.components.values())
+
+
+def get_readiness() -> _ReadinessSingleton:
+    return _ReadinessSingleton()
+
+
+async def load_models() -> None:
+    """
+    Load the models in the background; the vector store needs the embeddings.
+    The served embedding model and tables are those of the active embedding
+    model migration, if any.
+    """
+    readiness = get_readiness()
+    config = await get_serving_config(get_mongodb_engine())
+    await asyncio.gather(
+        readiness.load(
+            "embeddings",
+            lambda: init_embeddings(config.model_key, config.model_kwargs),
+        ),
+        readiness.load("llm", init_llm),
+    )
+    if readiness.components["embeddings"].status != "ready":
+        readiness.components["vector_store"].status = "failed"
+        readiness.components["vector_store"].error = "The embeddings failed to load."
+        readiness.components["vector_store"].event.set()
+        return
+    await readiness.load(
+        "vector_store",
+        lambda: init_vector_store(
+            get_embeddings(), config.table_name, config.image_table_name
+        ),
+    )
+    set_served_config(config)
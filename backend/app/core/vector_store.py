@@ -1,41 +1,275 @@
-
-from langchain_community.vectorstores import LanceDB
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
 
 import lancedb
 from app.core.config import settings
+from app.core.lease import FileLease
+from app.rag.vector_stores.document_cache import DocumentVectorCache
+from app.rag.vector_stores.index_manager import VectorIndexManager
+from app.rag.vector_stores.lancedb import FILE_ID_KEY, NexusLanceDB
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
 from lancedb.db import DBConnection
 
+logger = logging.getLogger(__name__)
+
+# Set by requests of this process; created by the maintenance loop, in its own
+# event loop.
+_maintenance_requested: asyncio.Event | None = None
+# Requests from other processes are seen by the maintaining one within this time.
+_REQUEST_POLL_SECONDS = 5.0
+
+
+def _create_vector_store(connection, embeddings, table_name: str) -> NexusLanceDB:
+    return NexusLanceDB(
+        connection,
+        embeddings,
+        settings.LANCE_URI,
+        table_name=table_name,
+        search_dim=settings.LANCE_SEARCH_DIM,
+        rescore_factor=settings.LANCE_RESCORE_FACTOR,
+        nprobes=settings.LANCE_NPROBES,
+        refine_factor=settings.LANCE_REFINE_FACTOR,
+    )
+
+
+def _create_document_cache(table_name: str) -> DocumentVectorCache | None:
+    if settings.LANCE_DOCUMENT_CACHE_DIR_PATH is None:
+        return None
+    return DocumentVectorCache(
+        settings.LANCE_DOCUMENT_CACHE_DIR_PATH / table_name,
+        max_documents=settings.LANCE_DOCUMENT_CACHE_SIZE,
+        max_disk_documents=settings.LANCE_DOCUMENT_CACHE_DISK_SIZE,
+    )
+
+
+def _create_async_vector_store(
+    vector_store: NexusLanceDB | None,
+) -> AsyncLanceDB | None:
+    if vector_store is None:
+        return None
+    document_cache = _create_document_cache(vector_store._table_name)
+    # Same table and settings; search latencies are reported with the index status.
+    return AsyncLanceDB(
+        settings.LANCE_URI,
+        vector_store.embeddings,
+        vector_store._table_name,
+        search_dim=vector_store.search_dim,
+        rescore_factor=vector_store.rescore_factor,
+        nprobes=vector_store.nprobes,
+        refine_factor=vector_store.refine_factor,
+        search_stats=vector_store.search_stats,
+        document_cache=document_cache,
+    )
+
 
 class _VectorStoreSingleton:
     _instance = None
     connection = DBConnection | None
-    vector_store = LanceDB | None
+    vector_store = NexusLanceDB | None
+    image_vector_store = NexusLanceDB | None
+    async_vector_store = AsyncLanceDB | None
+    async_image_vector_store = AsyncLanceDB | None
+    index_managers = list[VectorIndexManager]
 
-    def __new__(cls, embeddings=None, table_name=None):
+    def __new__(cls, embeddings=None, table_name=None, image_table_name=None):
         if cls._instance is None:
             if embeddings is None or table_name is None:
                 raise ValueError(
                     "Please provide both embeddings and table_name for initialization."
                 )
+            cls._instance = cls._create(embeddings, table_name, image_table_name)
+        return cls._instance
 
-            cls._instance = super(_VectorStoreSingleton, cls).__new__(cls)
-            connection = lancedb.connect(settings.LANCE_URI)
-            cls._instance.connection = connection
-            cls._instance.vector_store = LanceDB(
-                connection,
-                embeddings,
-                settings.LANCE_URI,
-                table_name=table_name,
+    @classmethod
+    def _create(
+        cls, embeddings, table_name: str, image_table_name: str | None
+    ) -> "_VectorStoreSingleton":
+        instance = super().__new__(cls)
+        connection = lancedb.connect(settings.LANCE_URI)
+        instance.connection = connection
+        instance.vector_store = _create_vector_store(connection, embeddings, table_name)
+        # Image rows are embedded by the caller; the store only embeds queries.
+        instance.image_vector_store = (
+            _create_vector_store(connection, embeddings, image_table_name)
+            if image_table_name is not None
+            else None
+        )
+        # The API reads and writes through the async stores; the sync ones are
+        # used for index maintenance.
+        instance.async_vector_store = _create_async_vector_store(instance.vector_store)
+        instance.async_image_vector_store = _create_async_vector_store(
+            instance.image_vector_store
+        )
+        instance.index_managers = [
+            VectorIndexManager(
+                vector_store,
+                min_rows=settings.LANCE_INDEX_MIN_ROWS,
+                retrain_growth=settings.LANCE_INDEX_RETRAIN_GROWTH,
+                index_type=settings.LANCE_INDEX_TYPE,
+                scalar_index_columns={
+                    FILE_ID_KEY: settings.LANCE_FILE_ID_INDEX_TYPE,
+                    vector_store._text_key: "INVERTED",
+                },
             )
-        return cls._instance
+            for vector_store in (instance.vector_store, instance.image_vector_store)
+            if vector_store is not None
+        ]
+        return instance
 
 
-def get_lancedb_vector_store() -> LanceDB:
+def get_lancedb_vector_store() -> NexusLanceDB:
     return _VectorStoreSingleton().vector_store
 
 
-def init_vector_store(embeddings, table_name: str) -> None:
+def get_lancedb_image_vector_store() -> NexusLanceDB | None:
+    return _VectorStoreSingleton().image_vector_store
+
+
+def get_async_vector_store() -> AsyncLanceDB:
+    return _VectorStoreSingleton().async_vector_store
+
+
+def get_async_image_vector_store() -> AsyncLanceDB | None:
+    return _VectorStoreSingleton().async_image_vector_store
+
+
+def get_index_managers() -> list[VectorIndexManager]:
+    return _VectorStoreSingleton().index_managers
+
+
+def init_vector_store(
+    embeddings, table_name: str, image_table_name: str | None = None
+) -> None:
     """
     Initialize the vector store singleton.
     """
-    _VectorStoreSingleton(embeddings, table_name)
+    _VectorStoreSingleton(embeddings, table_name, image_table_name)
+
+
+def set_vector_store(
+    embeddings, table_name: str, image_table_name: str | None = None
+) -> None:
+    """
+    Serve another set of tables, e.g. after an embedding model migration. The
+    stores are built before the switch, so requests see either the old or the new
+    stores.
+    """
+    instance = _VectorStoreSingleton._create(embeddings, table_name, image_table_name)
+    _VectorStoreSingleton._instance = instance
+
+
+async def delete_document_vectors(file_id: str, table_names: list[str]) -> None:
+    """
+    Delete the rows of a document from the given tables. Unlike the served
+    stores, this does not wait for the embedding model to load: deletes do not
+    embed.
+    """
+    for table_name in table_names:
+        # The cached vectors of the document are invalidated for every process
+        # through the cache directory.
+        store = AsyncLanceDB(
+            settings.LANCE_URI,
+            None,
+            table_name,
+            document_cache=_create_document_cache(table_name),
+        )
+        await store.delete({FILE_ID_KEY: file_id})
+    logger.info(f"Deleted the vectors of file_id: {file_id}")
+
+
+def _request_path() -> Path:
+    path = settings.LANCE_MAINTENANCE_LOCK_PATH
+    return path.with_name(f"{path.name}.requested")
+
+
+def request_vector_store_maintenance() -> None:
+    """
+    Run the maintenance now instead of at the next interval, e.g. after adding
+    the first rows of a table, in whichever process maintains the tables.
+    """
+    if _maintenance_requested is not None:
+        _maintenance_requested.set()
+    path = _request_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    except OSError:
+        logger.warning("Failed to request vector store maintenance.")
+
+
+def _requested_at() -> float:
+    try:
+        return _request_path().stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+async def _wait_for_request(
+    requested: asyncio.Event, timeout: float, since: float
+) -> None:
+    """
+    Wait `timeout` seconds, or until maintenance is requested by this process or,
+    after `since`, by another.
+    """
+    deadline = time.monotonic() + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            await asyncio.wait_for(
+                requested.wait(), min(remaining, _REQUEST_POLL_SECONDS)
+            )
+            return
+        except asyncio.TimeoutError:
+            if _requested_at() > since:
+                return
+
+
+async def run_vector_store_maintenance() -> None:
+    """
+    Periodically keep the indexes of the vector store tables up to date, and
+    compact the tables less often.
+
+    Only the process holding LANCE_MAINTENANCE_LOCK_PATH maintains the tables:
+    concurrent index builds and compactions of a table conflict, and removing
+    old versions in one process can break reads of another. The others retry at
+    each interval, to take over if the holder exits.
+    """
+    global _maintenance_requested
+    requested = _maintenance_requested = asyncio.Event()
+    lease = FileLease(settings.LANCE_MAINTENANCE_LOCK_PATH)
+    while not lease.acquire():
+        await asyncio.sleep(settings.LANCE_MAINTENANCE_INTERVAL_SECONDS)
+    logger.info("Maintaining the vector store tables in this process.")
+    last_compaction = time.monotonic()
+    while True:
+        requested.clear()
+        started = time.time()
+        compact = (
+            time.monotonic() - last_compaction
+            >= settings.LANCE_COMPACTION_INTERVAL_SECONDS
+        )
+        for index_manager in get_index_managers():
+            table_name = index_manager.vector_store._table_name
+            try:
+                action = await asyncio.to_thread(index_manager.maintain)
+                if action != "none":
+                    logger.info(f"Index of '{table_name}': {action}.")
+                if compact:
+                    stats = await asyncio.to_thread(
+                        index_manager.compact,
+                        timedelta(seconds=settings.LANCE_VERSION_RETENTION_SECONDS),
+                    )
+                    logger.info(
+                        f"Compacted '{table_name}': removed "
+                        f"{stats['fragments_removed']} fragments, reclaimed "
+                        f"{stats['bytes_removed']} bytes."
+                    )
+            except Exception:
+                logger.exception("Vector store maintenance failed.")
+        if compact:
+            last_compaction = time.monotonic()
+        await _wait_for_request(
+            requested, settings.LANCE_MAINTENANCE_INTERVAL_SECONDS, started
+        )
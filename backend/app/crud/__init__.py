@@ -2,6 +2,14 @@ from .crud_annotation import annotation
 from .crud_block import block
 from .crud_concept import concept
 from .crud_document import document
+from .crud_embedding_migration import embedding_migration
 from .crud_link import link
 
-__all__ = ["annotation", "block", "concept", "document", "link"]
+__all__ = [
+    "annotation",
+    "block",
+    "concept",
+    "document",
+    "embedding_migration",
+    "link",
+]
@@ -1,10 +1,48 @@
+from fastapi.encoders import jsonable_encoder
+from odmantic import AIOEngine
+from pymongo import ReplaceOne
+
 from app.crud.base import CRUDBase
 from app.models.block import Block
 from app.schemas.block import BlockCreate, BlockUpdate
 
 
 class CRUDBlock(CRUDBase[Block, BlockCreate, BlockUpdate]):
-    pass
+    async def upsert_multi(
+        self, engine: AIOEngine, *, file_id: str, objs_in: list[BlockCreate]
+    ) -> dict[str, int]:
+        """
+        Replace the blocks of a document, matched on (file_id, block_id), in one
+        bulk write. Blocks that are no longer in `objs_in` are removed.
+        """
+        collection = engine.get_collection(self.model)
+        requests = []
+        for obj_in in objs_in:
+            # The document keeps its _id when replaced.
+            doc = self.model(**jsonable_encoder(obj_in)).model_dump_doc()
+            del doc["_id"]
+            requests.append(
+                ReplaceOne(
+                    {"file_id": doc["file_id"], "block_id": doc["block_id"]},
+                    doc,
+                    upsert=True,
+                )
+            )
+        upserted = modified = 0
+        if requests:
+            result = await collection.bulk_write(requests, ordered=False)
+            upserted, modified = result.upserted_count, result.modified_count
+        deleted = await collection.delete_many(
+            {
+                "file_id": file_id,
+                "block_id": {"$nin": [obj_in.block_id for obj_in in objs_in]},
+            }
+        )
+        return {
+            "upserted": upserted,
+            "modified": modified,
+            "deleted": deleted.deleted_count,
+        }
 
 
 block = CRUDBlock(Block)
@@ -5,10 +5,15 @@ from uuid import uuid4
 from odmantic import AIOEngine
 
 from app.core.config import settings
+from app.core.vector_store import delete_document_vectors
 from app.crud.base import CRUDBase
+from app.crud.crud_embedding_migration import (
+    embedding_migration as crud_embedding_migration,
+)
 from app.models.annotation import Annotation
 from app.models.concept import Concept
 from app.models.document import Document
+from app.rag.utils.thumbnail import remove_thumbnail_sprite
 from app.schemas.document import DocumentCreate, DocumentUpdate
 
 
@@ -53,12 +58,30 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         )
         return document, annotations, concepts
 
+    async def _vector_table_names(self, engine: AIOEngine) -> list[str]:
+        """
+        The tables a document may have rows in: the configured ones, and those of
+        the active and the pending embedding migration.
+        """
+        table_names = [settings.LANCE_TABLE_NAME, settings.LANCE_IMAGE_TABLE_NAME]
+        for migration in (
+            await crud_embedding_migration.get_active(engine),
+            await crud_embedding_migration.get_pending(engine),
+        ):
+            if migration is not None:
+                table_names += [migration.table_name, migration.image_table_name]
+        return list(dict.fromkeys(name for name in table_names if name is not None))
+
     async def delete(self, engine: AIOEngine, id: str) -> Document:
+        # Vectors first: if this fails the document is kept and the delete can be
+        # retried. The space is reclaimed by the next compaction.
+        await delete_document_vectors(id, await self._vector_table_names(engine))
         document = await super().delete(engine, id=id)
 
         # Remove the document file.
         document_path = settings.DOCUMENT_DIR_PATH / document.path
         document_path.unlink()
+        remove_thumbnail_sprite(id)
 
         # Find annotations associated with the document so we can later remove their references.
         annotations = await engine.find(Annotation, {"file_id": id})
@@ -0,0 +1,36 @@
+from odmantic import AIOEngine
+
+from app.crud.base import CRUDBase
+from app.models.embedding_migration import EmbeddingMigration
+from app.schemas.embedding_migration import (
+    EmbeddingMigrationBase,
+    EmbeddingMigrationCreate,
+)
+
+
+class CRUDEmbeddingMigration(
+    CRUDBase[EmbeddingMigration, EmbeddingMigrationCreate, EmbeddingMigrationBase]
+):
+    async def get_active(self, engine: AIOEngine) -> EmbeddingMigration | None:
+        """
+        The migration whose tables are served; None for the configured ones.
+        """
+        return await engine.find_one(
+            self.model,
+            self.model.status == "active",
+            sort=self.model.updated_at.desc(),
+        )
+
+    async def get_pending(self, engine: AIOEngine) -> EmbeddingMigration | None:
+        """
+        The migration that is re-embedding or waiting for cutover, if any.
+        """
+        return await engine.find_one(
+            self.model, self.model.status.in_(["running", "ready"])
+        )
+
+    async def count(self, engine: AIOEngine) -> int:
+        return await engine.count(self.model)
+
+
+embedding_migration = CRUDEmbeddingMigration(EmbeddingMigration)
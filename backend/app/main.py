@@ -1,26 +1,40 @@
+import asyncio
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.routes import health
 from app.core.config import settings
-from app.core.db import init_db
-from app.core.embeddings import get_embeddings, init_embeddings
-from app.core.llm import init_llm
-from app.core.vector_store import init_vector_store
+from app.core.db import get_mongodb_engine, init_db
+from app.core.embedding_migration import watch_migrations
+from app.core.prompts import init_prompts
+from app.core.readiness import get_readiness, load_models
+from app.core.vector_store import run_vector_store_maintenance
+from app.rag.llm_gateway import LLMOverloaded
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+async def background_tasks():
+    await load_models()
+    if get_readiness().components["vector_store"].status == "ready":
+        await asyncio.gather(
+            watch_migrations(get_mongodb_engine()), run_vector_store_maintenance()
+        )
+
+
 async def lifespan(app: FastAPI):
     await init_db()
-    init_embeddings()
-    init_llm()
-    init_vector_store(get_embeddings(), settings.LANCE_TABLE_NAME)
+    init_prompts()
+    # Serve requests right away; routes that need a model wait for it (see /ready).
+    background = asyncio.create_task(background_tasks())
     yield
+    background.cancel()
 
 
 app = FastAPI(
@@ -31,6 +45,15 @@ app = FastAPI(
 )
 
 
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(_request: Request, exc: LLMOverloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -50,3 +73,4 @@ if settings.all_cors_origins:
 
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(health.router)
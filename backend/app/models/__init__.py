@@ -2,6 +2,7 @@ from .annotation import Annotation
 from .block import Block
 from .concept import Concept
 from .document import Document
+from .embedding_migration import EmbeddingMigration
 from .link import Link
 
-__all__ = ["Block", "Document", "Annotation", "Concept", "Link"]
+__all__ = ["Block", "Document", "EmbeddingMigration", "Annotation", "Concept", "Link"]
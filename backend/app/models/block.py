@@ -1,4 +1,4 @@
-from odmantic import Model
+from odmantic import Index, Model
 
 
 class Block(Model):
@@ -23,3 +23,8 @@ class Block(Model):
     # convert Marker's Dict[int, str] to Dict[str, str]
     section_hierarchy: dict[str, str] | None = None
     images: dict | None = None
+
+    model_config = {
+        # Blocks are looked up and upserted by (file_id, block_id).
+        "indexes": lambda: [Index(Block.file_id, Block.block_id)],
+    }
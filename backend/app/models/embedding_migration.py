@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from typing import Any, Literal
+from uuid import uuid4
+
+from odmantic import Field, Model
+
+MigrationStatus = Literal[
+    "running", "ready", "failed", "active", "retired", "rolled_back"
+]
+
+
+class EmbeddingMigration(Model):
+    """
+    Re-embedding of the vector store with another model into versioned tables.
+
+    - status: "running" while re-embedding, "ready" for cutover, "active" once its
+      tables are served, "retired" when superseded by a later cutover and
+      "rolled_back" when the previous tables were restored.
+    - source_id: migration whose tables were served when this one started; None
+      for the configured model and tables.
+    """
+
+    id: str = Field(default_factory=lambda: str(uuid4()), primary_field=True)
+    model_key: str
+    model_kwargs: dict[str, Any] = Field(default_factory=dict)
+    table_name: str
+    image_table_name: str | None = None
+    source_id: str | None = None
+    status: MigrationStatus = "running"
+    num_documents: int = 0
+    num_done: int = 0
+    error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
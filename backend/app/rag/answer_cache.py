@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+
+@dataclass
+class _Entry:
+    key: Hashable
+    version: Any
+    created: float
+    vector: np.ndarray
+    value: Any
+
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU of answers, returned for later questions on the same document
+    whose embedding is within `threshold` cosine similarity of a cached one, so
+    that paraphrases of a question are answered without the LLM.
+
+    Keys are tuples starting with the file_id, followed by whatever else the
+    answer depends on (e.g. the number of retrieved chunks). Entries are tagged
+    with the version of the document they were answered from; looking them up
+    with another version (e.g. after the document was reprocessed, by any worker)
+    drops them. Thread-safe, like `QueryEmbeddingCache`.
+    """
+
+    def __init__(
+        self, max_size: int = 1024, threshold: float = 0.95, ttl: float | None = None
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._ids_by_key: dict[Hashable, set[int]] = {}
+        self._next_id = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: Any) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._ids_by_key[entry.key]
+        ids.discard(entry_id)
+        if not ids:
+            del self._ids_by_key[entry.key]
+
+    def get(self, key: tuple, embedding: Any, version: Any) -> Any | None:
+        with self._lock:
+            now = time.monotonic()
+            ids = []
+            for entry_id in list(self._ids_by_key.get(key, ())):
+                entry = self._entries[entry_id]
+                if entry.version != version or (
+                    self.ttl is not None and now - entry.created >= self.ttl
+                ):
+                    self._remove(entry_id)
+                else:
+                    ids.append(entry_id)
+            if ids:
+                vectors = np.stack([self._entries[i].vector for i in ids])
+                similarities = vectors @ self._normalize(embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]].value
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, embedding: Any, version: Any, value: Any) -> None:
+        with self._lock:
+            entry_id = next(self._next_id)
+            self._entries[entry_id] = _Entry(
+                key, version, time.monotonic(), self._normalize(embedding), value
+            )
+            self._ids_by_key.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, file_id: str) -> None:
+        """
+        Drop the answers of a document, e.g. when it is reprocessed or deleted.
+        """
+        with self._lock:
+            for key in [key for key in self._ids_by_key if key[0] == file_id]:
+                for entry_id in list(self._ids_by_key[key]):
+                    self._remove(entry_id)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
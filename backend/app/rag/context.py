@@ -0,0 +1,110 @@
+import math
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+from app.rag.utils.text import normalize_text, text_hash
+
+CHUNK_SEPARATOR = "\n\n"
+# Characters per token of English text for common BPE tokenizers.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count estimated from the text length, for LLMs whose tokenizer is not
+    available locally.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class PackedContext:
+    """
+    The context of a RAG prompt: the text, the chunks it was taken from (best
+    first) and its size in tokens, before and after packing.
+    """
+
+    text: str
+    docs: list[Document] = field(default_factory=list)
+    tokens: int = 0
+    original_tokens: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        # Token counts of the parts of a text add up to about that of the text.
+        return max(self.original_tokens - self.tokens, 0)
+
+
+def _truncate(text: str, count_tokens: Callable[[str], int], max_tokens: int) -> str:
+    """
+    The longest prefix of `text` within `max_tokens`, by binary search on its
+    length, since only a token counter is available.
+    """
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip()
+
+
+def pack_context(
+    docs: list[Document],
+    count_tokens: Callable[[str], int],
+    max_tokens: int | None,
+) -> PackedContext:
+    """
+    Pack retrieved chunks into a RAG prompt context of at most `max_tokens`
+    tokens (no limit if None), instead of joining all of them.
+
+    Chunks are taken in retrieval order, i.e. best first. Their text has a line
+    per block (see `SectionBase.to_chunks`), and blocks already in the context,
+    e.g. a figure caption that is also in its section's chunk, are left out. The
+    chunk that does not fit is cut, and the chunks after it are dropped.
+
+    Args:
+        count_tokens: Token counter of the LLM the prompt is for.
+    """
+    separator_tokens = count_tokens(CHUNK_SEPARATOR)
+    seen = set()
+    packed_docs, texts = [], []
+    tokens = original_tokens = 0
+    full = False
+    for doc in docs:
+        original_tokens += count_tokens(doc.page_content)
+        if full:
+            continue
+        lines = []
+        for line in doc.page_content.splitlines():
+            key = text_hash(line)
+            if not normalize_text(line) or key in seen:
+                continue
+            seen.add(key)
+            lines.append(line)
+        if not lines:
+            continue
+        text = "\n".join(lines)
+        budget = None
+        if max_tokens is not None:
+            budget = max_tokens - tokens - (separator_tokens if texts else 0)
+        text_tokens = count_tokens(text)
+        if budget is not None and text_tokens > budget:
+            full = True
+            text = _truncate(text, count_tokens, budget) if budget > 0 else ""
+            if not text:
+                continue
+            text_tokens = count_tokens(text)
+        if texts:
+            tokens += separator_tokens
+        tokens += text_tokens
+        texts.append(text)
+        packed_docs.append(doc)
+    # The separators the chunks would have been joined with.
+    original_tokens += separator_tokens * max(len(docs) - 1, 0)
+    return PackedContext(
+        CHUNK_SEPARATOR.join(texts), packed_docs, tokens, original_tokens
+    )
@@ -2,9 +2,17 @@ from langchain_ollama import OllamaEmbeddings
 from langchain_openai import OpenAIEmbeddings
 
 from .jina_clip import JinaClipV2Embeddings
+from .jina_clip_onnx import JinaClipV2OnnxEmbeddings
 from .registry import register_embedding_model
+from .remote import EmbeddingServerClient
 
 register_embedding_model("openai")(OpenAIEmbeddings)
 register_embedding_model("ollama")(OllamaEmbeddings)
 
-__all__ = ["JinaClipV2Embeddings", "OpenAIEmbeddings", "OllamaEmbeddings"]
+__all__ = [
+    "EmbeddingServerClient",
+    "JinaClipV2Embeddings",
+    "JinaClipV2OnnxEmbeddings",
+    "OpenAIEmbeddings",
+    "OllamaEmbeddings",
+]
@@ -0,0 +1,35 @@
+def length_bucketed_batches(
+    lengths: list[int], batch_size: int, max_tokens_per_batch: int
+) -> list[list[int]]:
+    """
+    Group items into batches of similar length to reduce padding waste.
+
+    Items are sorted by length (longest first) and packed greedily, so the first
+    item of every batch is its longest and the padded size of a batch is
+    `len(batch) * lengths[batch[0]]`. A batch is closed when it reaches
+    `batch_size` items or when adding another item would exceed
+    `max_tokens_per_batch` padded tokens. An item longer than the budget gets a
+    batch of its own.
+
+    Args:
+        lengths: Token length of each item.
+        batch_size: Maximum number of items per batch.
+        max_tokens_per_batch: Maximum number of padded tokens per batch.
+
+    Returns:
+        list[list[int]]: Batches of indices into `lengths`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: list[list[int]] = []
+    current: list[int] = []
+    for i in order:
+        if current and (
+            len(current) >= batch_size
+            or lengths[current[0]] * (len(current) + 1) > max_tokens_per_batch
+        ):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
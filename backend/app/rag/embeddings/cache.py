@@ -0,0 +1,309 @@
+"""
+Persistent embedding cache.
+
+Vectors are keyed by the hash of the normalized text and stored as float16 in
+Arrow IPC shards (one columnar file per write) that are memory-mapped on load.
+Each (model key, model kwargs) pair gets its own directory, so switching models
+or their options never returns stale vectors.
+
+The cache is bounded in bytes and evicts whole shards, oldest first. Hits found
+in the older half of the shards are re-written into the next shard, which makes
+eviction approximate an LRU at shard granularity. Runs of small recent shards
+are merged into one, so that the number of open memory maps stays small.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.registry import create_embedding_model, embed_queries
+from app.rag.utils.text import text_hash
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 16
+
+
+class _Shard:
+    def __init__(self, path: Path):
+        self.path = path
+        self.source = pa.memory_map(str(path))
+        table = pa.ipc.open_file(self.source).read_all()
+        self.keys: list[bytes] = table.column("key").to_pylist()
+        dim = table.schema.field("vector").type.list_size
+        self.vectors: np.ndarray = (
+            table.column("vector")
+            .combine_chunks()
+            .flatten()
+            .to_numpy(zero_copy_only=False)
+            .reshape(-1, dim)
+        )
+        self.nbytes = path.stat().st_size
+        self.live = 0
+
+    def close(self) -> None:
+        self.source.close()
+
+
+class EmbeddingDiskCache:
+    """
+    Bounded on-disk store of float16 vectors for a single embedding namespace.
+
+    Once `merge_count` shards smaller than `merge_bytes` follow each other at the
+    recent end, their live rows are written into a single shard.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int,
+        merge_bytes: int = 16 * 1024**2,
+        merge_count: int = 8,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.merge_bytes = merge_bytes
+        self.merge_count = merge_count
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        # Insertion order is age order: the first shard is the oldest.
+        self._shards: dict[str, _Shard] = {}
+        # Age rank of each shard, rebuilt when shards are added or dropped.
+        self._positions: dict[str, int] | None = None
+        self._index: dict[bytes, tuple[str, int]] = {}
+        self._dir_mtime: int | None = None
+        with self._lock:
+            self._refresh()
+            self._evict()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(shard.nbytes for shard in self._shards.values())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _refresh(self) -> None:
+        # Pick up shards written (or evicted) by other processes sharing the directory.
+        mtime = self.directory.stat().st_mtime_ns
+        if mtime == self._dir_mtime:
+            return
+        self._dir_mtime = mtime
+        names = sorted(path.name for path in self.directory.glob("shard-*.arrow"))
+        for name in set(self._shards) - set(names):
+            self._drop(name, unlink=False)
+        for name in names:
+            if name not in self._shards:
+                try:
+                    self._add_shard(self.directory / name)
+                except (OSError, pa.ArrowInvalid):
+                    logger.warning(f"Skipping unreadable embedding cache shard: {name}")
+
+    def _add_shard(self, path: Path) -> None:
+        shard = _Shard(path)
+        self._shards[path.name] = shard
+        self._positions = None
+        for row, key in enumerate(shard.keys):
+            previous = self._index.get(key)
+            if previous is not None and previous[0] in self._shards:
+                self._shards[previous[0]].live -= 1
+            self._index[key] = (path.name, row)
+            shard.live += 1
+        for name in [name for name, s in self._shards.items() if s.live == 0]:
+            self._drop(name)
+
+    def _drop(self, name: str, unlink: bool = True) -> None:
+        shard = self._shards.pop(name)
+        self._positions = None
+        for key in shard.keys:
+            if self._index.get(key, (None,))[0] == name:
+                del self._index[key]
+        shard.close()
+        if unlink:
+            shard.path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        total = self.nbytes
+        while total > self.max_bytes and len(self._shards) > 1:
+            name = next(iter(self._shards))
+            total -= self._shards[name].nbytes
+            self._drop(name)
+
+    def _lookup(self, keys: list[bytes]) -> list[np.ndarray | None]:
+        results: list[np.ndarray | None] = []
+        for key in keys:
+            location = self._index.get(key)
+            if location is None:
+                results.append(None)
+            else:
+                name, row = location
+                results.append(self._shards[name].vectors[row])
+        return results
+
+    def get_many(self, keys: list[bytes]) -> list[np.ndarray | None]:
+        """
+        Return the float16 vector of each key, or None when it is not cached.
+        """
+        with self._lock:
+            results = self._lookup(keys)
+            if any(result is None for result in results):
+                self._refresh()
+                results = self._lookup(keys)
+            return results
+
+    def is_stale(self, key: bytes) -> bool:
+        """
+        Whether a cached key lives in the older half of the shards and should be
+        re-written to survive the next evictions.
+        """
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return False
+            if self._positions is None:
+                self._positions = {name: i for i, name in enumerate(self._shards)}
+            return self._positions[location[0]] < len(self._shards) // 2
+
+    def _write_shard(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float16)
+        table = pa.table(
+            {
+                "key": pa.array(keys, type=pa.binary(KEY_SIZE)),
+                "vector": pa.FixedSizeListArray.from_arrays(
+                    pa.array(vectors.reshape(-1)), vectors.shape[1]
+                ),
+            }
+        )
+        name = f"shard-{time.time_ns():020d}-{os.getpid()}-{next(self._counter)}.arrow"
+        path = self.directory / name
+        tmp_path = path.with_name(name + ".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        # Shards whose rows all moved to the new one are dropped.
+        self._add_shard(path)
+
+    def _merge_recent(self) -> None:
+        small = []
+        for name in reversed(self._shards):
+            if self._shards[name].nbytes >= self.merge_bytes:
+                break
+            small.append(name)
+        if len(small) < self.merge_count:
+            return
+        keys, vectors = [], []
+        for name in reversed(small):
+            shard = self._shards[name]
+            for row, key in enumerate(shard.keys):
+                if self._index.get(key) == (name, row):
+                    keys.append(key)
+                    vectors.append(shard.vectors[row])
+        # The merged shard is the newest, like the shards it replaces.
+        self._write_shard(keys, np.stack(vectors))
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        if len(keys) == 0:
+            return
+        with self._lock:
+            self._write_shard(keys, vectors)
+            self._merge_recent()
+            self._evict()
+
+
+def get_namespace(model_key: str, model_kwargs: dict[str, Any]) -> str:
+    kwargs = json.dumps(model_kwargs, sort_keys=True, default=str)
+    digest = hashlib.blake2b(
+        f"{model_key}|{kwargs}".encode(), digest_size=8
+    ).hexdigest()
+    return f"{model_key}-{digest}"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a registry embedding model with a persistent cache of document vectors.
+
+    Queries are passed straight through: they are short-lived and would only
+    churn the shards.
+    """
+
+    def __init__(
+        self,
+        model_key: str,
+        cache_dir: str | Path,
+        max_bytes: int,
+        **model_kwargs: Any,
+    ):
+        self.embeddings = create_embedding_model(model_key, **model_kwargs)
+        self.name = getattr(self.embeddings, "name", model_key)
+        self.cache = EmbeddingDiskCache(
+            Path(cache_dir) / get_namespace(model_key, model_kwargs), max_bytes
+        )
+
+    def __getattr__(self, name: str):
+        # Expose optional capabilities of the wrapped model, e.g. `embed_images`.
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_hash(text, KEY_SIZE) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, and refresh old hits in the same
+        # write so that frequently used vectors are not evicted.
+        missing: dict[bytes, int] = {}
+        for i, (key, vector) in enumerate(zip(keys, vectors, strict=True)):
+            if vector is None:
+                missing.setdefault(key, i)
+        touched = {
+            key: vector
+            for key, vector in zip(keys, vectors, strict=True)
+            if vector is not None and self.cache.is_stale(key)
+        }
+        new_vectors: dict[bytes, np.ndarray] = {}
+        if missing:
+            embedded = self.embeddings.embed_documents(
+                [texts[i] for i in missing.values()]
+            )
+            new_vectors = dict(
+                zip(
+                    missing,
+                    np.asarray(embedded, dtype=np.float16),
+                    strict=True,
+                )
+            )
+        logger.info(
+            f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses."
+        )
+        if new_vectors or touched:
+            to_write = {**touched, **new_vectors}
+            self.cache.put_many(list(to_write), np.stack(list(to_write.values())))
+
+        # Misses are returned float16-rounded like hits, so that re-embedding the
+        # same text always yields the same vector.
+        return [
+            np.asarray(
+                vector if vector is not None else new_vectors[key], dtype=np.float32
+            ).tolist()
+            for key, vector in zip(keys, vectors, strict=True)
+        ]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # Batched queries also bypass the cache, though the model embeds them
+        # like documents.
+        return embed_queries(self.embeddings, texts)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.registry import embed_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingDispatcher:
+    """
+    Embeds queries off the event loop, batching concurrent calls.
+
+    The first query waits up to `max_wait` seconds for others to join its batch;
+    a batch is dispatched as soon as it holds `max_batch_size` queries. Batches run
+    one at a time on a worker thread, and queries that arrive while a batch is
+    running are collected into the next one.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+    ):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="query-embed"
+        )
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._task: asyncio.Task | None = None
+        self._running = False
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return embed_queries(self.embeddings, texts)
+
+    async def embed_query(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._timer is None and not self._running:
+            self._timer = loop.call_later(self.max_wait, self._flush, loop)
+        return await future
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed the queries of one request (e.g. a batch of questions) in a single
+        call, on the same worker thread as the batches of single queries.
+        """
+        loop = asyncio.get_running_loop()
+        unique = list(dict.fromkeys(texts))
+        vectors = await loop.run_in_executor(self.executor, self._embed_batch, unique)
+        by_text = dict(zip(unique, vectors, strict=True))
+        return [list(by_text[text]) for text in texts]
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._running or not self._pending:
+            return
+        batch = self._pending[: self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size :]
+        self._running = True
+        # Keep a reference so that the running batch is not garbage collected.
+        self._task = loop.create_task(self._run(loop, batch))
+
+    async def _run(
+        self, loop: asyncio.AbstractEventLoop, batch: list[tuple[str, asyncio.Future]]
+    ) -> None:
+        # Identical concurrent queries are embedded once.
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await loop.run_in_executor(
+                self.executor, self._embed_batch, texts
+            )
+        except asyncio.CancelledError:
+            # E.g. on shutdown: the callers must not wait forever.
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            by_text = dict(zip(texts, vectors, strict=True))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(list(by_text[text]))
+        finally:
+            self._running = False
+        logger.debug(f"Embedded {len(texts)} queries in one batch.")
+        # Queries that arrived during this batch form the next one.
+        if self._pending:
+            self._flush(loop)
@@ -3,23 +3,70 @@ https://huggingface.co/jinaai/jina-clip-v2/blob/main/README.md
 https://python.langchain.com/docs/how_to/custom_embeddings/
 """
 
+import base64
+import io
+
 from langchain_core.embeddings import Embeddings
-from transformers import AutoModel
+from PIL import Image
 
+from app.rag.embeddings.batching import length_bucketed_batches
 from app.rag.embeddings.registry import register_embedding_model
 
 
 @register_embedding_model("jina-clip-v2")
 class JinaClipV2Embeddings(Embeddings):
     name: str = "jina-clip-v2"
+    max_length: int = 8192
+
+    def __init__(self, batch_size: int = 32, max_tokens_per_batch: int = 16384):
+        # Imported here: importing the model classes pulls in torch, which would
+        # otherwise slow down every import of the embeddings registry.
+        from transformers import AutoModel, AutoTokenizer
 
-    def __init__(self):
         self.model = AutoModel.from_pretrained(
             "jinaai/jina-clip-v2", trust_remote_code=True
         )
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            "jinaai/jina-clip-v2", trust_remote_code=True
+        )
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+
+    def _token_lengths(self, texts: list[str]) -> list[int]:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return [self.model.encode_text(txt) for txt in texts]
+        embeddings: list[list[float]] = [[] for _ in texts]
+        if not texts:
+            return embeddings
+
+        batches = length_bucketed_batches(
+            self._token_lengths(texts), self.batch_size, self.max_tokens_per_batch
+        )
+        for batch in batches:
+            # One forward pass per batch; results are scattered back to the
+            # original positions.
+            vectors = self.model.encode_text(
+                [texts[i] for i in batch], batch_size=len(batch)
+            )
+            for i, vector in zip(batch, vectors, strict=True):
+                embeddings[i] = vector.tolist()
+        return embeddings
 
     def embed_query(self, text: str):
         return self.embed_documents([text])[0]
+
+    def embed_images(self, images: list[str]) -> list[list[float]]:
+        """
+        Embed base64-encoded images into the same space as the text embeddings.
+        """
+        embeddings: list[list[float]] = []
+        for start in range(0, len(images), self.batch_size):
+            batch = [
+                Image.open(io.BytesIO(base64.b64decode(image))).convert("RGB")
+                for image in images[start : start + self.batch_size]
+            ]
+            vectors = self.model.encode_image(batch, batch_size=len(batch))
+            embeddings += [vector.tolist() for vector in vectors]
+        return embeddings
@@ -0,0 +1,146 @@
+"""
+https://huggingface.co/jinaai/jina-clip-v2/blob/main/README.md
+https://onnxruntime.ai/docs/performance/model-optimizations/quantization.html
+
+Requires the optional `onnx` dependencies: `uv sync --extra onnx`.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from transformers import AutoTokenizer
+
+from app.rag.embeddings.batching import length_bucketed_batches
+from app.rag.embeddings.registry import register_embedding_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "jinaai/jina-clip-v2"
+FP32_FILE_NAME = "text_encoder.onnx"
+INT8_FILE_NAME = "text_encoder.int8.onnx"
+
+
+def export_text_encoder(model_dir: str | Path, opset_version: int = 17) -> Path:
+    """
+    Export the jina-clip-v2 text tower (including the projection and the final
+    normalization) to ONNX and quantize its weights to int8.
+
+    Args:
+        model_dir: Directory where the ONNX files are written.
+        opset_version: ONNX opset used for the export.
+
+    Returns:
+        Path: Path to the quantized model.
+    """
+    import torch
+    import torch.nn.functional as F
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel
+
+    class _TextEncoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids):
+            # The text tower derives the attention mask from the padding tokens.
+            return F.normalize(self.model.get_text_features(input_ids), p=2, dim=-1)
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = model_dir / FP32_FILE_NAME
+    int8_path = model_dir / INT8_FILE_NAME
+
+    model = AutoModel.from_pretrained(MODEL_NAME, trust_remote_code=True).eval()
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
+    dummy = tokenizer(["a", "a longer sentence"], padding=True, return_tensors="pt")
+    logger.info(f"Exporting the {MODEL_NAME} text encoder to ONNX: {fp32_path}")
+    with torch.inference_mode():
+        torch.onnx.export(
+            _TextEncoder(model),
+            (dummy["input_ids"],),
+            str(fp32_path),
+            input_names=["input_ids"],
+            output_names=["embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "embeddings": {0: "batch"},
+            },
+            opset_version=opset_version,
+        )
+
+    logger.info(f"Quantizing the text encoder to int8: {int8_path}")
+    quantize_dynamic(
+        str(fp32_path),
+        str(int8_path),
+        weight_type=QuantType.QInt8,
+        # The fp32 text tower is larger than the 2GB protobuf limit.
+        use_external_data_format=True,
+    )
+    return int8_path
+
+
+@register_embedding_model("jina-clip-v2-onnx-int8")
+class JinaClipV2OnnxEmbeddings(Embeddings):
+    """
+    jina-clip-v2 text embeddings on ONNX Runtime with int8 weights, for CPU-only
+    nodes. The vectors live in the same space as JinaClipV2Embeddings, but are
+    not identical to them, so the model has its own name: chunks, caches and
+    migrations tell the two apart.
+    """
+
+    name: str = "jina-clip-v2-onnx-int8"
+    max_length: int = 8192
+
+    def __init__(
+        self,
+        model_dir: str | Path = "./data/onnx/jina-clip-v2",
+        intra_op_num_threads: int = 0,
+        batch_size: int = 32,
+        max_tokens_per_batch: int = 16384,
+    ):
+        import onnxruntime as ort
+
+        model_path = Path(model_dir) / INT8_FILE_NAME
+        if not model_path.exists():
+            model_path = export_text_encoder(model_dir)
+
+        options = ort.SessionOptions()
+        # 0 lets ONNX Runtime use one thread per physical core.
+        options.intra_op_num_threads = intra_op_num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            MODEL_NAME, trust_remote_code=True
+        )
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        embeddings: list[list[float]] = [[] for _ in texts]
+        if not texts:
+            return embeddings
+
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        batches = length_bucketed_batches(
+            lengths, self.batch_size, self.max_tokens_per_batch
+        )
+        for batch in batches:
+            padded = self.tokenizer.pad(
+                {"input_ids": [encoded["input_ids"][i] for i in batch]},
+                return_tensors="np",
+            )
+            (vectors,) = self.session.run(
+                None, {"input_ids": padded["input_ids"].astype(np.int64)}
+            )
+            for i, vector in zip(batch, vectors, strict=True):
+                embeddings[i] = vector.tolist()
+        return embeddings
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
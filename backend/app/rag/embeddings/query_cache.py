@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.registry import embed_queries
+from app.rag.utils.text import normalize_text
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by model name and normalized query, with
+    an optional time-to-live. Thread-safe, since routes embed queries from the
+    threadpool.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, list[float]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, str]) -> list[float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                self.ttl is None or time.monotonic() - entry[0] < self.ttl
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple[str, str], vector: list[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that answers repeated queries from a QueryEmbeddingCache.
+    Documents are passed through unchanged.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingCache):
+        self.embeddings = embeddings
+        self.name = getattr(embeddings, "name", type(embeddings).__name__)
+        self.cache = cache
+
+    def __getattr__(self, name: str):
+        # Expose optional capabilities of the wrapped model, e.g. `embed_images`.
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = (self.name, normalize_text(text))
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        # Callers must not be able to mutate the cached vector.
+        return list(vector)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Batched `embed_query`: cache misses are embedded in one call.
+        """
+        keys = [(self.name, normalize_text(text)) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = embed_queries(self.embeddings, [texts[i] for i in missing])
+            for i, vector in zip(missing, embedded, strict=True):
+                self.cache.put(keys[i], vector)
+                vectors[i] = vector
+        return [list(vector) for vector in vectors]
@@ -15,3 +15,15 @@ def create_embedding_model(key: str, **kwargs):
     if model_cls is None:
         raise ValueError(f"Embedding model with key '{key}' not found in registry.")
     return model_cls(**kwargs)
+
+
+def embed_queries(embeddings, texts: list[str]) -> list[list[float]]:
+    """
+    Embed a batch of queries in one call. Models without a dedicated batched
+    query method embed queries like documents, which is the case for every model
+    in the registry.
+    """
+    method = getattr(embeddings, "embed_queries", None)
+    if method is not None:
+        return method(texts)
+    return embeddings.embed_documents(texts)
@@ -0,0 +1,161 @@
+"""
+Client for the out-of-process embedding server (see `server.py`).
+
+Requests and responses are length-prefixed JSON messages over a Unix socket.
+Vectors are not serialized: the server writes them as float32 into a shared
+memory buffer owned by the connection, and the response only carries the buffer
+name and the result shape.
+"""
+
+import json
+import socket
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.rag.embeddings.registry import register_embedding_model
+
+HEADER = struct.Struct("!I")
+
+
+def encode_message(message: dict[str, Any]) -> bytes:
+    payload = json.dumps(message).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def send_message(sock: socket.socket, message: dict[str, Any]) -> None:
+    sock.sendall(encode_message(message))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection.")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> dict[str, Any]:
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    return json.loads(_recv_exactly(sock, size))
+
+
+class _Connection:
+    def __init__(self, socket_path: str, connect_timeout: float):
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The server binds its socket only once the model is loaded.
+                self.sock.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+        self.shm: shared_memory.SharedMemory | None = None
+
+    def _attach(self, name: str) -> shared_memory.SharedMemory:
+        if self.shm is None or self.shm.name != name:
+            if self.shm is not None:
+                self.shm.close()
+            self.shm = shared_memory.SharedMemory(name=name)
+            # The server owns (and unlinks) the buffer; without this the resource
+            # tracker of this process would unlink it on exit as well.
+            resource_tracker.unregister(self.shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return self.shm
+
+    def request(self, message: dict[str, Any]) -> Any:
+        send_message(self.sock, message)
+        response = recv_message(self.sock)
+        if "error" in response:
+            raise RuntimeError(f"Embedding server error: {response['error']}")
+        if "shm" not in response:
+            return response
+        shape = tuple(response["shape"])
+        shm = self._attach(response["shm"])
+        # Copy out before the next request on this connection reuses the buffer.
+        return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+
+    def close(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+        self.sock.close()
+
+
+@register_embedding_model("embedding-server")
+class EmbeddingServerClient(Embeddings):
+    """
+    Embeddings served by a shared model process, so that several API workers do
+    not each load their own copy of the model.
+    """
+
+    # The server applies the persistent embedding cache itself.
+    cacheable: bool = False
+
+    def __init__(
+        self,
+        socket_path: str | Path | None = None,
+        connect_timeout: float = 600.0,
+    ):
+        # The path the server binds, unless given.
+        if socket_path is None:
+            socket_path = settings.EMBEDDING_SERVER_SOCKET_PATH
+        self.socket_path = str(socket_path)
+        self.connect_timeout = connect_timeout
+        # One connection per thread, so concurrent callers do not share a buffer.
+        self._local = threading.local()
+        self._name: str | None = None
+
+    def _connection(self) -> _Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = _Connection(self.socket_path, self.connect_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, message: dict[str, Any]) -> Any:
+        # Connecting retries for up to connect_timeout; its failures are final.
+        connection = self._connection()
+        try:
+            return connection.request(message)
+        except (ConnectionError, BrokenPipeError):
+            # The server may have been restarted; reconnect once.
+            connection.close()
+            self._local.connection = None
+            return self._connection().request(message)
+
+    @property
+    def name(self) -> str:
+        # Report the served model so that chunk metadata stays meaningful.
+        if self._name is None:
+            self._name = self._request({"op": "info"})["name"]
+        return self._name
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._request({"op": "embed_documents", "texts": texts}).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._request({"op": "embed_query", "text": text})[0].tolist()
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._request({"op": "embed_queries", "texts": texts}).tolist()
+
+    def embed_images(self, images: list[str]) -> list[list[float]]:
+        if not images:
+            return []
+        return self._request({"op": "embed_images", "images": images}).tolist()
@@ -0,0 +1,124 @@
+"""
+Out-of-process embedding server shared by all API workers.
+
+    python -m app.rag.embeddings.server
+
+Loads EMBEDDING_SERVER_MODEL_KEY once and serves it over a Unix socket at
+EMBEDDING_SERVER_SOCKET_PATH. Each connection owns a shared memory buffer that
+results are written to; the buffer is grown when needed and unlinked when the
+connection closes. See `remote.py` for the client.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embeddings import create_embeddings
+from app.rag.embeddings.registry import embed_queries
+from app.rag.embeddings.remote import HEADER, encode_message
+
+logger = logging.getLogger(__name__)
+
+MIN_BUFFER_SIZE = 1024 * 1024
+
+
+class EmbeddingServer:
+    def __init__(self, embeddings: Any, socket_path: str):
+        self.embeddings = embeddings
+        self.socket_path = socket_path
+        # A single model copy: calls are serialized on one thread.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+    def _embed(self, message: dict[str, Any]) -> np.ndarray:
+        if message["op"] == "embed_documents":
+            vectors = self.embeddings.embed_documents(message["texts"])
+        elif message["op"] == "embed_query":
+            vectors = [self.embeddings.embed_query(message["text"])]
+        elif message["op"] == "embed_queries":
+            vectors = embed_queries(self.embeddings, message["texts"])
+        elif message["op"] == "embed_images":
+            vectors = self.embeddings.embed_images(message["images"])
+        else:
+            raise ValueError(f"Unknown operation: {message['op']}")
+        return np.asarray(vectors, dtype=np.float32)
+
+    @staticmethod
+    def _ensure_buffer(
+        shm: shared_memory.SharedMemory | None, nbytes: int
+    ) -> shared_memory.SharedMemory:
+        if shm is not None and shm.size >= nbytes:
+            return shm
+        size = max(nbytes, MIN_BUFFER_SIZE)
+        if shm is not None:
+            # Grow geometrically so that a slowly growing batch size does not
+            # re-create the buffer on every request.
+            size = max(size, 2 * shm.size)
+            shm.close()
+            shm.unlink()
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    async def _read_message(self, reader: asyncio.StreamReader) -> dict[str, Any]:
+        (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+        return json.loads(await reader.readexactly(size))
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        shm: shared_memory.SharedMemory | None = None
+        try:
+            while True:
+                try:
+                    message = await self._read_message(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    if message["op"] == "info":
+                        response = {"name": getattr(self.embeddings, "name", None)}
+                    else:
+                        vectors = await loop.run_in_executor(
+                            self.executor, self._embed, message
+                        )
+                        shm = self._ensure_buffer(shm, vectors.nbytes)
+                        out = np.ndarray(vectors.shape, np.float32, buffer=shm.buf)
+                        out[:] = vectors
+                        response = {"shm": shm.name, "shape": list(vectors.shape)}
+                except Exception as e:
+                    logger.exception("Failed to handle embedding request.")
+                    response = {"error": str(e)}
+                writer.write(encode_message(response))
+                await writer.drain()
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            writer.close()
+
+    async def serve_forever(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        logger.info(f"Embedding server listening on {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Loading embedding model: {settings.EMBEDDING_SERVER_MODEL_KEY}")
+    embeddings = create_embeddings(
+        settings.EMBEDDING_SERVER_MODEL_KEY, settings.EMBEDDING_SERVER_MODEL_KWARGS
+    )
+    server = EmbeddingServer(embeddings, str(settings.EMBEDDING_SERVER_SOCKET_PATH))
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
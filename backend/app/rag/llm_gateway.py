@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from app.rag.utils.latency import LatencyStats
+
+
+class LLMOverloaded(Exception):
+    """
+    A generation could not be started: the queue was full or the wait for a
+    slot timed out.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMGateway:
+    """
+    Async access to an LLM backend with at most `max_concurrency` generations in
+    flight, since local backends (e.g. Ollama) slow down for everyone when too
+    many generations overlap.
+
+    Further calls wait in a queue of up to `max_queue` calls, for at most
+    `queue_timeout` seconds; calls beyond the queue are rejected right away.
+    Both raise `LLMOverloaded`, answered with 429 and `retry_after`.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        name: str,
+        max_concurrency: int = 2,
+        max_queue: int = 32,
+        queue_timeout: float = 60.0,
+        retry_after: int = 10,
+    ):
+        self.llm = llm
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.queue_wait = LatencyStats()
+
+    def check(self) -> None:
+        """
+        Raise `LLMOverloaded` if a call made now would be rejected, e.g. before
+        starting a streaming response.
+        """
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMOverloaded(
+                f"The {self.name} LLM queue is full.", retry_after=self.retry_after
+            )
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one of the `max_concurrency` generation slots.
+        """
+        self.check()
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LLMOverloaded(
+                f"Timed out waiting for the {self.name} LLM.",
+                retry_after=self.retry_after,
+            ) from None
+        finally:
+            self.queued -= 1
+        self.queue_wait.record(self.name, time.perf_counter() - start)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def ainvoke(self, input: Any, **kwargs: Any) -> Any:
+        async with self.slot():
+            return await self.llm.ainvoke(input, **kwargs)
+
+    async def astream(self, input: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        # The slot is held until the stream ends or its consumer stops reading.
+        async with self.slot():
+            async for chunk in self.llm.astream(input, **kwargs):
+                yield chunk
+
+    def stats(self) -> dict[str, Any]:
+        queue_wait = self.queue_wait.summary()
+        return {
+            "backend": self.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_wait_p50_ms": queue_wait[0]["p50_ms"] if queue_wait else 0.0,
+            "queue_wait_p95_ms": queue_wait[0]["p95_ms"] if queue_wait else 0.0,
+        }
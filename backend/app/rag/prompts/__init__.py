@@ -0,0 +1,8 @@
+from .rag import rag_prompt_v1
+from .registry import create_prompt, register_prompt
+
+__all__ = [
+    "create_prompt",
+    "rag_prompt_v1",
+    "register_prompt",
+]
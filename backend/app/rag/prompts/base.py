@@ -1,5 +0,0 @@
-from langchain import hub
-
-
-def get_rag_prompt():
-    return hub.pull("rlm/rag-prompt")
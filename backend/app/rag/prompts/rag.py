@@ -0,0 +1,23 @@
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.rag.prompts.registry import register_prompt
+
+
+@register_prompt("rag", 1)
+def rag_prompt_v1() -> ChatPromptTemplate:
+    # The text of "rlm/rag-prompt" on LangChain Hub, which was pulled at every
+    # request before the registry.
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                "human",
+                "You are an assistant for question-answering tasks. Use the "
+                "following pieces of retrieved context to answer the question. If "
+                "you don't know the answer, just say that you don't know. Use three "
+                "sentences maximum and keep the answer concise.\n"
+                "Question: {question} \n"
+                "Context: {context} \n"
+                "Answer:",
+            )
+        ]
+    )
@@ -0,0 +1,29 @@
+from collections.abc import Callable
+
+from langchain_core.prompts import BasePromptTemplate
+
+# A simple registry of versioned prompts, shipped with the app
+PROMPT_REGISTRY: dict[str, dict[int, Callable[[], BasePromptTemplate]]] = {}
+
+
+def register_prompt(key: str, version: int):
+    def decorator(factory):
+        PROMPT_REGISTRY.setdefault(key, {})[version] = factory
+        return factory
+
+    return decorator
+
+
+def create_prompt(key: str, version: int | None = None) -> BasePromptTemplate:
+    """
+    Build a registered prompt; the latest version unless `version` is given.
+    """
+    versions = PROMPT_REGISTRY.get(key)
+    if not versions:
+        raise ValueError(f"Prompt with key '{key}' not found in registry.")
+    if version is None:
+        version = max(versions)
+    factory = versions.get(version)
+    if factory is None:
+        raise ValueError(f"Prompt '{key}' has no version {version} in registry.")
+    return factory()
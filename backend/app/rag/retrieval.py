@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any, Literal
+
+from langchain_core.documents import Document
+
+from app.rag.utils.latency import LatencyStats
+from app.rag.vector_stores.fusion import merge_top_k, reciprocal_rank_fusion
+from app.rag.vector_stores.lancedb_async import file_ids_filter
+
+RetrievalMode = Literal["vector", "lexical", "hybrid"]
+
+# End-to-end retrieval latency (query embedding included) per mode.
+retrieval_latency = LatencyStats()
+
+
+def chunk_key(doc: Document) -> tuple:
+    return (
+        doc.metadata.get("file_id"),
+        doc.metadata.get("modality", "text"),
+        tuple(doc.metadata["block_ids"]),
+    )
+
+
+def _document_of(doc: Document) -> str:
+    return doc.metadata["file_id"]
+
+
+async def retrieve(
+    vector_store: Any,
+    image_vector_store: Any | None,
+    question: str,
+    embedding: list[float] | None,
+    k: int,
+    file_id: str | None,
+    mode: RetrievalMode = "vector",
+    image_weight: float = 1.0,
+    file_ids: list[str] | None = None,
+    max_per_document: int | None = None,
+) -> list[Document]:
+    """
+    Retrieve the chunks that best match a question, in a document (`file_id`),
+    in a set of documents (`file_ids`) or, when neither is given, in the whole
+    library.
+
+    - vector: text and image embeddings, fused by rank.
+    - lexical: BM25 over the chunk text, for exact terms such as acronyms,
+      equation or author names.
+    - hybrid: both, fused by rank.
+
+    Args:
+        vector_store: An `AsyncLanceDB` of text chunks.
+        image_vector_store: An `AsyncLanceDB` of image chunks, if any.
+        embedding: Embedding of the question; unused in lexical mode.
+        image_weight: Weight of the image results in the fusion.
+        max_per_document: Chunks kept per document when searching several.
+    """
+    results = await retrieve_many(
+        vector_store,
+        image_vector_store,
+        [question],
+        [embedding] if embedding is not None else None,
+        k=k,
+        file_id=file_id,
+        mode=mode,
+        image_weight=image_weight,
+        file_ids=file_ids,
+        max_per_document=max_per_document,
+    )
+    return results[0]
+
+
+async def _search_documents(
+    vector_store: Any,
+    embeddings: list[list[float]],
+    k: int,
+    file_ids: list[str] | None,
+    max_per_document: int | None,
+) -> list[list[Document]]:
+    results = await asyncio.gather(
+        *(
+            vector_store.search_documents(
+                embedding, k, file_ids=file_ids, max_per_document=max_per_document
+            )
+            for embedding in embeddings
+        )
+    )
+    return [[doc for doc, _ in pairs] for pairs in results]
+
+
+async def retrieve_many(
+    vector_store: Any,
+    image_vector_store: Any | None,
+    questions: list[str],
+    embeddings: list[list[float]] | None,
+    k: int,
+    file_id: str | None,
+    mode: RetrievalMode = "vector",
+    image_weight: float = 1.0,
+    file_ids: list[str] | None = None,
+    max_per_document: int | None = None,
+) -> list[list[Document]]:
+    """
+    `retrieve` for several questions. The vector searches of all the questions
+    on a document are done together (see `AsyncLanceDB.search_many`).
+    """
+    library = file_id is None
+    filter = {"file_id": file_id}
+    searches, weights = [], []
+    if mode in ("vector", "hybrid"):
+        for store, weight in (
+            (vector_store, 1.0),
+            (image_vector_store, image_weight),
+        ):
+            if store is None:
+                continue
+            if library:
+                searches.append(
+                    _search_documents(store, embeddings, k, file_ids, max_per_document)
+                )
+            else:
+                searches.append(
+                    store.similarity_search_by_vectors(embeddings, k=k, filter=filter)
+                )
+            weights.append(weight)
+    if mode in ("lexical", "hybrid"):
+        if library:
+            lexical_filter = file_ids_filter(file_ids) if file_ids is not None else None
+            # More chunks than k, since the caps drop some of them.
+            lexical_k = k if max_per_document is None else 2 * k
+        else:
+            lexical_filter, lexical_k = filter, k
+        searches.append(
+            asyncio.gather(
+                *(
+                    vector_store.lexical_search(
+                        question, k=lexical_k, filter=lexical_filter
+                    )
+                    for question in questions
+                )
+            )
+        )
+        weights.append(1.0)
+    # The searches are independent and run concurrently.
+    results = await asyncio.gather(*searches)
+    retrieved = []
+    for rankings in zip(*results, strict=True):
+        if len(rankings) == 1:
+            docs = rankings[0]
+        else:
+            # Scores of the different searches are not on the same scale, so the
+            # result lists are merged by rank.
+            docs = reciprocal_rank_fusion(
+                list(rankings), key=chunk_key, weights=weights
+            )
+        if library:
+            docs = merge_top_k(
+                [docs], k, group=_document_of, max_per_group=max_per_document
+            )
+        retrieved.append(list(docs[:k]))
+    return retrieved
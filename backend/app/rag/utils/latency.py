@@ -0,0 +1,34 @@
+import threading
+from collections import deque
+from collections.abc import Hashable
+from typing import Any
+
+import numpy as np
+
+
+class LatencyStats:
+    """
+    Recent latencies per key (e.g. per retrieval mode), as percentiles.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: dict[Hashable, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def summary(self, key_name: str = "key") -> list[dict[str, Any]]:
+        with self._lock:
+            latencies = {key: list(values) for key, values in self._latencies.items()}
+        return [
+            {
+                key_name: key,
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50) * 1000),
+                "p95_ms": float(np.percentile(values, 95) * 1000),
+            }
+            for key, values in sorted(latencies.items())
+        ]
@@ -0,0 +1,23 @@
+import hashlib
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before using it as a cache key: Unicode NFC, collapsed
+    whitespace and no leading/trailing whitespace.
+    """
+    text = unicodedata.normalize("NFC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def text_hash(text: str, digest_size: int = 16) -> bytes:
+    """
+    Hash of the normalized text.
+    """
+    return hashlib.blake2b(
+        normalize_text(text).encode("utf-8"), digest_size=digest_size
+    ).digest()
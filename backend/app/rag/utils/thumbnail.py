@@ -0,0 +1,176 @@
+"""
+Pre-rendered page thumbnails packed into a single sprite (atlas) per document.
+
+The sprite is written next to a JSON index describing where each page lives in
+the atlas, so the viewer can fetch one compact asset instead of rendering every
+page on demand.
+"""
+
+import logging
+import math
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import fitz
+from PIL import Image
+
+from app.core.config import settings
+from app.schemas.thumbnail import ThumbnailIndex, ThumbnailRect
+
+logger = logging.getLogger(__name__)
+
+SPRITE_SUFFIXES = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+
+
+def _lower_thread_priority() -> None:
+    # On Linux the niceness set through setpriority applies to the calling thread
+    # only, so this keeps thumbnail rendering from competing with request handling.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+# A single low-priority worker: thumbnails are a nice-to-have and must never
+# starve request handling or PDF processing.
+_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix="thumbnail",
+    initializer=_lower_thread_priority,
+)
+_pending: dict[str, Future] = {}
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def get_sprite_path(file_id: str) -> Path:
+    suffix = SPRITE_SUFFIXES[settings.THUMBNAIL_FORMAT]
+    return settings.THUMBNAIL_DIR_PATH / f"{file_id}{suffix}"
+
+
+def get_index_path(file_id: str) -> Path:
+    return settings.THUMBNAIL_DIR_PATH / f"{file_id}.json"
+
+
+def _get_lock(file_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(file_id, threading.Lock())
+
+
+def render_thumbnail_sprite(
+    file_id: str, pdf_path: str | Path, width: int | None = None
+) -> ThumbnailIndex:
+    """
+    Render every page of a PDF at a fixed thumbnail width and pack them into a
+    near-square grid, which keeps the sprite within the image format limits even
+    for very long documents.
+
+    Args:
+        file_id: Document id used to name the sprite and index files.
+        pdf_path: Path to the PDF document.
+        width: Thumbnail width in pixels (default: settings.THUMBNAIL_WIDTH).
+
+    Returns:
+        ThumbnailIndex: The index describing each page's rectangle in the sprite.
+    """
+    width = width or settings.THUMBNAIL_WIDTH
+    thumbnails: list[Image.Image] = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            scale = width / page.rect.width
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            thumbnails.append(
+                Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            )
+
+    cell_width = max((thumb.width for thumb in thumbnails), default=width)
+    cell_height = max((thumb.height for thumb in thumbnails), default=width)
+    columns = max(1, math.ceil(math.sqrt(len(thumbnails) * cell_height / cell_width)))
+    rows = max(1, math.ceil(len(thumbnails) / columns))
+
+    sprite = Image.new("RGB", (columns * cell_width, rows * cell_height), "white")
+    rects = []
+    for page_number, thumb in enumerate(thumbnails):
+        x = (page_number % columns) * cell_width
+        y = (page_number // columns) * cell_height
+        sprite.paste(thumb, (x, y))
+        rects.append(
+            ThumbnailRect(
+                page_number=page_number,
+                x=x,
+                y=y,
+                width=thumb.width,
+                height=thumb.height,
+            )
+        )
+
+    index = ThumbnailIndex(
+        file_id=file_id,
+        format=settings.THUMBNAIL_FORMAT,
+        sprite_width=sprite.width,
+        sprite_height=sprite.height,
+        pages=rects,
+    )
+
+    # Write to temporary files first: the index appearing on disk signals that the
+    # sprite is complete, so it has to be moved into place last.
+    sprite_path = get_sprite_path(file_id)
+    index_path = get_index_path(file_id)
+    tmp_sprite_path = sprite_path.with_name(sprite_path.name + ".tmp")
+    tmp_index_path = index_path.with_name(index_path.name + ".tmp")
+    sprite.save(
+        tmp_sprite_path,
+        format=settings.THUMBNAIL_FORMAT,
+        quality=settings.THUMBNAIL_QUALITY,
+    )
+    tmp_index_path.write_text(index.model_dump_json())
+    os.replace(tmp_sprite_path, sprite_path)
+    os.replace(tmp_index_path, index_path)
+    return index
+
+
+def get_or_render_thumbnail_index(file_id: str, pdf_path: str | Path) -> ThumbnailIndex:
+    """
+    Return the thumbnail index of a document, rendering the sprite first if the
+    background job has not produced it yet.
+    """
+    with _get_lock(file_id):
+        index_path = get_index_path(file_id)
+        if index_path.exists():
+            return ThumbnailIndex.model_validate_json(index_path.read_text())
+        return render_thumbnail_sprite(file_id, pdf_path)
+
+
+def _render_in_background(file_id: str, pdf_path: Path) -> None:
+    try:
+        get_or_render_thumbnail_index(file_id, pdf_path)
+        logger.info(f"Pre-rendered page thumbnails for file: {file_id}")
+    except Exception:
+        # The document may have been deleted in the meantime; the viewer falls back
+        # to rendering on demand, so a failure here is not fatal.
+        logger.exception(f"Failed to pre-render page thumbnails for file: {file_id}")
+    finally:
+        with _locks_guard:
+            _pending.pop(file_id, None)
+
+
+def schedule_thumbnail_sprite(file_id: str, pdf_path: str | Path) -> Future:
+    """
+    Queue the sprite rendering of a document on the low-priority worker.
+    """
+    with _locks_guard:
+        future = _pending.get(file_id)
+        if future is None:
+            future = _executor.submit(_render_in_background, file_id, Path(pdf_path))
+            _pending[file_id] = future
+        return future
+
+
+def remove_thumbnail_sprite(file_id: str) -> None:
+    with _get_lock(file_id):
+        get_sprite_path(file_id).unlink(missing_ok=True)
+        get_index_path(file_id).unlink(missing_ok=True)
+    with _locks_guard:
+        _locks.pop(file_id, None)
@@ -0,0 +1,241 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+
+@dataclass
+class DocumentVectors:
+    """
+    The rows of one document (without vectors) and their vectors as a float16
+    matrix, memory-mapped from disk.
+    """
+
+    version: int
+    rows: pa.Table
+    matrix: np.ndarray
+    norms: np.ndarray
+
+    def search(self, query: np.ndarray, k: int) -> pa.Table:
+        """
+        Exact nearest neighbors by squared L2 distance, like the vector index.
+        """
+        return self.search_many(np.asarray(query)[None, :], k)[0]
+
+    def search_many(self, queries: np.ndarray, k: int) -> list[pa.Table]:
+        """
+        `search` for each row of `queries`, with a single matrix product.
+        """
+        if len(self.rows) == 0:
+            empty = self.rows.append_column("_distance", pa.array([], pa.float32()))
+            return [empty] * len(queries)
+        queries = np.asarray(queries, dtype=np.float32)
+        distances = (
+            self.norms[None, :]
+            + np.einsum("ij,ij->i", queries, queries)[:, None]
+            - 2 * (queries @ self.matrix.T)
+        )
+        k = min(k, distances.shape[1])
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(distances, top, strict=True):
+            order = candidates[np.argsort(row[candidates])]
+            results.append(
+                self.rows.take(pa.array(order)).append_column(
+                    "_distance", pa.array(row[order], type=pa.float32())
+                )
+            )
+        return results
+
+
+class DocumentVectorCache:
+    """
+    Per-document vector matrices for exact search within a document, which only
+    has a few hundred chunks: a matrix product is cheaper than a filtered search
+    of the whole table.
+
+    Matrices are written to `directory` as float16 .npy files, memory-mapped on
+    first use and kept open for the `max_documents` most recently searched
+    documents. Entries are tagged with the table version they were read at.
+    Writes to a document `invalidate` it at the table version that follows them,
+    in a marker file seen by every process, and entries read at an earlier
+    version are stale; writes to other documents leave them valid.
+
+    At most `max_disk_documents` documents keep files on disk: each `put` removes
+    the files and markers of the least recently searched or written ones beyond
+    that. A document without files or marker is read again from the table.
+    """
+
+    def __init__(
+        self, directory: Path, max_documents: int = 64, max_disk_documents: int = 4096
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_documents = max_documents
+        self.max_disk_documents = max_disk_documents
+        self._entries: OrderedDict[str, DocumentVectors] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, file_id: str, version: int) -> tuple[Path, Path]:
+        stem = f"{file_id}.{version}"
+        return self.directory / f"{stem}.npy", self.directory / f"{stem}.arrow"
+
+    def _marker_path(self, file_id: str) -> Path:
+        return self.directory / f"{file_id}.invalidated"
+
+    def _invalidated_at(self, file_id: str) -> int:
+        """
+        The table version of the last write to the document, or -1.
+        """
+        try:
+            return int(self._marker_path(file_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return -1
+
+    def _versions(self, file_id: str) -> list[int]:
+        versions = []
+        for path in self.directory.glob(f"{file_id}.*.npy"):
+            version = path.name[len(file_id) + 1 : -len(".npy")]
+            if version.isdigit():
+                versions.append(int(version))
+        return sorted(versions, reverse=True)
+
+    def _load(self, file_id: str, version: int) -> DocumentVectors | None:
+        matrix_path, rows_path = self._paths(file_id, version)
+        if not (matrix_path.exists() and rows_path.exists()):
+            return None
+        matrix = np.load(matrix_path, mmap_mode="r")
+        with pa.memory_map(str(rows_path)) as source:
+            rows = pa.ipc.open_file(source).read_all()
+        norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32)
+        return DocumentVectors(version, rows, matrix, norms)
+
+    def _remember(self, file_id: str, entry: DocumentVectors) -> None:
+        self._entries[file_id] = entry
+        self._entries.move_to_end(file_id)
+        while len(self._entries) > self.max_documents:
+            self._entries.popitem(last=False)
+
+    def get(self, file_id: str) -> DocumentVectors | None:
+        with self._lock:
+            invalidated_at = self._invalidated_at(file_id)
+            entry = self._entries.get(file_id)
+            if entry is None or entry.version < invalidated_at:
+                # Written by another process, or before a restart.
+                entry = None
+                versions = self._versions(file_id)
+                if versions and versions[0] >= invalidated_at:
+                    entry = self._load(file_id, versions[0])
+            if entry is None:
+                self._entries.pop(file_id, None)
+                self.misses += 1
+                return None
+            self._remember(file_id, entry)
+            self.hits += 1
+        # The modification time orders documents for the disk eviction.
+        try:
+            os.utime(self._paths(file_id, entry.version)[0])
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def put(
+        self, file_id: str, version: int, rows: pa.Table, vector_key: str
+    ) -> DocumentVectors:
+        """
+        Store the vectors of a document, read from the table at `version` (or
+        later).
+        """
+        vectors = rows[vector_key].combine_chunks()
+        matrix = (
+            vectors.flatten().to_numpy().reshape(len(rows), -1).astype(np.float16)
+            if len(rows)
+            else np.empty((0, 0), dtype=np.float16)
+        )
+        rows = rows.drop_columns([vector_key])
+        matrix_path, rows_path = self._paths(file_id, version)
+        # Written under temporary names and renamed, so that other processes
+        # never load a partial file.
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{matrix_path}{tmp_suffix}", "wb") as f:
+            np.save(f, matrix)
+        with pa.OSFile(f"{rows_path}{tmp_suffix}", "wb") as sink:
+            with pa.ipc.new_file(sink, rows.schema) as writer:
+                writer.write_table(rows)
+        os.replace(f"{matrix_path}{tmp_suffix}", matrix_path)
+        os.replace(f"{rows_path}{tmp_suffix}", rows_path)
+        with self._lock:
+            self._remove_versions(file_id, below=version)
+            entry = self._load(file_id, version)
+            self._remember(file_id, entry)
+            self._evict_disk()
+            return entry
+
+    def _evict_disk(self) -> None:
+        """
+        Remove the files and markers of the least recently used documents beyond
+        `max_disk_documents`. Their open entries stay valid: the memory maps keep
+        the removed files readable.
+        """
+        used: dict[str, float] = {}
+        for path in self.directory.iterdir():
+            name = path.name
+            if name.endswith(".invalidated"):
+                file_id = name[: -len(".invalidated")]
+            elif name.endswith((".npy", ".arrow")):
+                file_id = name.rsplit(".", 2)[0]
+            else:
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            used[file_id] = max(used.get(file_id, 0.0), mtime)
+        excess = len(used) - self.max_disk_documents
+        if excess <= 0:
+            return
+        for file_id in sorted(used, key=used.__getitem__)[:excess]:
+            self._remove_versions(file_id, below=float("inf"))
+            self._marker_path(file_id).unlink(missing_ok=True)
+
+    def _remove_versions(self, file_id: str, below: float) -> None:
+        """
+        Remove the files of the versions of a document older than `below`; newer
+        ones may have been written by another process.
+        """
+        for version in self._versions(file_id):
+            if version < below:
+                for path in self._paths(file_id, version):
+                    path.unlink(missing_ok=True)
+
+    def invalidate(self, file_id: str, version: int) -> None:
+        """
+        Mark the vectors of a document read before table `version` as stale, e.g.
+        after a write to the document that created that version.
+        """
+        marker_path = self._marker_path(file_id)
+        tmp_path = f"{marker_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            version = max(version, self._invalidated_at(file_id))
+            with open(tmp_path, "w") as f:
+                f.write(str(version))
+            os.replace(tmp_path, marker_path)
+            self._entries.pop(file_id, None)
+            self._remove_versions(file_id, below=version)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_documents,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
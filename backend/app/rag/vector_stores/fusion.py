@@ -0,0 +1,78 @@
+import heapq
+from collections import Counter
+from collections.abc import Callable, Hashable, Iterable, Sequence
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[T]],
+    key: Callable[[T], Hashable],
+    weights: Sequence[float] | None = None,
+    k: int = 60,
+) -> list[T]:
+    """
+    Merge ranked result lists whose scores are not comparable (e.g. text-text
+    and text-image similarities, or BM25 and vector scores).
+
+    Each item scores `sum(weight / (k + rank))` over the lists it appears in;
+    items are identified across lists by `key`.
+
+    Args:
+        rankings: Result lists, best first.
+        key: Identity of an item across the lists.
+        weights: Weight of each list. Defaults to 1 for every list.
+        k: Rank smoothing constant; larger values flatten the rank differences.
+
+    Returns:
+        list[T]: The distinct items, best first.
+    """
+    if weights is None:
+        weights = [1.0] * len(rankings)
+    scores: dict[Hashable, float] = {}
+    items: dict[Hashable, T] = {}
+    for ranking, weight in zip(rankings, weights, strict=True):
+        for rank, item in enumerate(ranking, start=1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + weight / (k + rank)
+            items.setdefault(item_key, item)
+    return [
+        items[item_key]
+        for item_key in sorted(scores, key=scores.__getitem__, reverse=True)
+    ]
+
+
+def merge_top_k(
+    rankings: Sequence[Iterable[T]],
+    k: int,
+    score: Callable[[T], Any] | None = None,
+    group: Callable[[T], Hashable] | None = None,
+    max_per_group: int | None = None,
+) -> list[T]:
+    """
+    Merge result lists whose scores are comparable (e.g. the searches of several
+    documents) into the k best, keeping at most `max_per_group` items of a group,
+    so that a single document cannot fill the results.
+
+    The lists are consumed lazily through a heap, so only about k items of each
+    are read.
+
+    Args:
+        rankings: Result lists, each sorted by ascending `score`.
+        score: Sort key of an item, lower is better (e.g. a distance). Unneeded
+            for a single list.
+        group: Group of an item, e.g. its document.
+    """
+    merged = []
+    counts: Counter = Counter()
+    for item in heapq.merge(*rankings, key=score):
+        if group is not None and max_per_group is not None:
+            item_group = group(item)
+            if counts[item_group] >= max_per_group:
+                continue
+            counts[item_group] += 1
+        merged.append(item)
+        if len(merged) == k:
+            break
+    return merged
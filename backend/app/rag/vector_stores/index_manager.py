@@ -0,0 +1,214 @@
+"""
+https://lancedb.github.io/lancedb/ann_indexes/
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Literal
+
+from app.rag.utils.latency import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+IndexType = Literal["IVF_PQ", "IVF_HNSW_PQ", "IVF_HNSW_SQ"]
+# INVERTED is Lance's full-text (BM25) index.
+ScalarIndexType = Literal["BTREE", "BITMAP", "INVERTED"]
+
+
+class SearchLatencyStats(LatencyStats):
+    """
+    Recent vector search latencies, grouped by table size (powers of two), to
+    see how search cost grows with the library.
+
+    Searches group their latency by `num_rows`, the table size counted at most
+    every `count_interval` seconds (and by `VectorIndexManager.maintain`) rather
+    than with an extra query per search.
+    """
+
+    def __init__(self, window: int = 1000, count_interval: float = 60.0):
+        super().__init__(window)
+        self.count_interval = count_interval
+        self.num_rows: int | None = None
+        self._counted_at = 0.0
+
+    def needs_count(self) -> bool:
+        return (
+            self.num_rows is None
+            or time.monotonic() - self._counted_at >= self.count_interval
+        )
+
+    def set_num_rows(self, num_rows: int) -> None:
+        self.num_rows = num_rows
+        self._counted_at = time.monotonic()
+
+    def record(self, num_rows: int, seconds: float) -> None:
+        bucket = 2 ** int(math.log2(num_rows)) if num_rows > 0 else 0
+        super().record(bucket, seconds)
+
+    def summary(self, key_name: str = "min_rows") -> list[dict[str, Any]]:
+        return super().summary(key_name)
+
+
+def _num_sub_vectors(dim: int, target_sub_dim: int = 16) -> int:
+    # PQ needs the sub-vector count to divide the dimension.
+    num = max(dim // target_sub_dim, 1)
+    while dim % num:
+        num -= 1
+    return num
+
+
+class VectorIndexManager:
+    """
+    Keeps an ANN index on a vector store table, as well as the scalar and
+    full-text indexes listed in `scalar_index_columns`.
+
+    Tables smaller than `min_rows` are searched exhaustively. Once a table reaches
+    `min_rows`, an index is trained with about sqrt(rows) partitions. New rows
+    are added to the index incrementally by `table.optimize()`. The index is
+    re-trained once the table has grown by `retrain_growth` since the last
+    training, since partitions fitted on a small table degrade recall on a large
+    one.
+
+    Every add and delete writes new fragments and a new table version; `compact`
+    merges the fragments, drops deleted rows and removes old versions.
+    """
+
+    def __init__(
+        self,
+        vector_store: Any,
+        min_rows: int = 10_000,
+        retrain_growth: float = 2.0,
+        index_type: IndexType = "IVF_PQ",
+        metric: str = "L2",
+        scalar_index_columns: dict[str, ScalarIndexType] | None = None,
+    ):
+        self.vector_store = vector_store
+        self.min_rows = min_rows
+        self.retrain_growth = retrain_growth
+        self.index_type = index_type
+        self.metric = metric
+        self.scalar_index_columns = scalar_index_columns or {}
+        self._lock = threading.Lock()
+        self._trained_rows: int | None = None
+        self.compacted_fragments = 0
+        self.reclaimed_bytes = 0
+
+    def _index_stats(self, table: Any, column: str) -> dict[str, Any] | None:
+        dataset = table.to_lance()
+        for index in dataset.list_indices():
+            if column in index["fields"]:
+                return dataset.stats.index_stats(index["name"])
+        return None
+
+    def _has_unindexed_rows(self, table: Any) -> bool:
+        dataset = table.to_lance()
+        return any(
+            dataset.stats.index_stats(index["name"])["num_unindexed_rows"] > 0
+            for index in dataset.list_indices()
+        )
+
+    def _create_scalar_indexes(self, table: Any) -> None:
+        for column, index_type in self.scalar_index_columns.items():
+            if column in table.schema.names and not self._index_stats(table, column):
+                logger.info(
+                    f"Creating a {index_type} index on "
+                    f"'{self.vector_store._table_name}.{column}'."
+                )
+                if index_type == "INVERTED":
+                    table.create_fts_index(column, use_tantivy=False)
+                else:
+                    table.create_scalar_index(column, index_type=index_type)
+
+    def status(self) -> dict[str, Any]:
+        table = self.vector_store.get_table()
+        if table is None:
+            return {"table": self.vector_store._table_name, "num_rows": 0}
+        stats = self._index_stats(table, self.vector_store._vector_key)
+        dataset_stats = table.to_lance().stats.dataset_stats()
+        return {
+            "table": self.vector_store._table_name,
+            "num_rows": table.count_rows(),
+            "index_type": stats["index_type"] if stats else None,
+            "num_indexed_rows": stats["num_indexed_rows"] if stats else 0,
+            "num_unindexed_rows": stats["num_unindexed_rows"] if stats else 0,
+            "num_fragments": dataset_stats["num_fragments"],
+            "num_deleted_rows": dataset_stats["num_deleted_rows"],
+            "compacted_fragments": self.compacted_fragments,
+            "reclaimed_bytes": self.reclaimed_bytes,
+        }
+
+    def _train(self, table: Any, num_rows: int) -> None:
+        dim = table.schema.field(self.vector_store._vector_key).type.list_size
+        num_partitions = max(int(math.sqrt(num_rows)), 1)
+        logger.info(
+            f"Training a {self.index_type} index on '{self.vector_store._table_name}' "
+            f"({num_rows} rows, {num_partitions} partitions)."
+        )
+        table.create_index(
+            metric=self.metric,
+            num_partitions=num_partitions,
+            num_sub_vectors=_num_sub_vectors(dim),
+            vector_column_name=self.vector_store._vector_key,
+            replace=True,
+            index_type=self.index_type,
+        )
+        self._trained_rows = num_rows
+
+    def maintain(self) -> str:
+        """
+        Create, re-train or update the index as needed.
+
+        Returns:
+            str: The action taken: "none", "created", "retrained" or "updated".
+        """
+        with self._lock:
+            table = self.vector_store.get_table()
+            if table is None:
+                return "none"
+            self._create_scalar_indexes(table)
+            num_rows = table.count_rows()
+            self.vector_store.search_stats.set_num_rows(num_rows)
+            stats = self._index_stats(table, self.vector_store._vector_key)
+            if stats is None and num_rows >= self.min_rows:
+                self._train(table, num_rows)
+                return "created"
+
+            if stats is not None:
+                if self._trained_rows is None:
+                    # Index trained before this process started: count from its size.
+                    self._trained_rows = stats["num_indexed_rows"]
+                if num_rows >= self.retrain_growth * max(self._trained_rows, 1):
+                    self._train(table, num_rows)
+                    return "retrained"
+            if self._has_unindexed_rows(table):
+                # Unindexed rows are scanned at every search; fold them into the
+                # indexes.
+                table.optimize()
+                return "updated"
+            return "none"
+
+    def compact(self, cleanup_older_than: timedelta) -> dict[str, int]:
+        """
+        Merge small fragments, rewrite fragments with deleted rows and remove
+        table versions older than `cleanup_older_than`. Indexes are remapped to
+        the new fragments.
+
+        Returns:
+            dict: The number of fragments removed and of bytes reclaimed.
+        """
+        with self._lock:
+            table = self.vector_store.get_table()
+            if table is None:
+                return {"fragments_removed": 0, "bytes_removed": 0}
+            metrics = table.to_lance().optimize.compact_files()
+            # Versions still in use by a running search are kept by the retention.
+            cleanup = table.cleanup_old_versions(cleanup_older_than)
+            self.compacted_fragments += metrics.fragments_removed
+            self.reclaimed_bytes += cleanup.bytes_removed
+            return {
+                "fragments_removed": metrics.fragments_removed,
+                "bytes_removed": cleanup.bytes_removed,
+            }
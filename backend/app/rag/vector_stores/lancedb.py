@@ -0,0 +1,315 @@
+"""
+https://python.langchain.com/docs/integrations/vectorstores/lancedb/
+https://huggingface.co/jinaai/jina-clip-v2#matryoshka-representation-learning
+"""
+
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+from langchain_community.vectorstores import LanceDB
+from langchain_community.vectorstores.lancedb import to_lance_filter
+
+from app.rag.vector_stores.index_manager import SearchLatencyStats
+
+FULL_VECTOR_KEY = "vector_full"
+# Copy of metadata.file_id as a top-level column, so that it can carry a scalar
+# index and per-document filters do not scan the whole table.
+FILE_ID_KEY = "file_id"
+
+
+def truncate_embeddings(embeddings: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Matryoshka truncation: keep the first `dim` dimensions and re-normalize.
+    """
+    truncated = embeddings[:, :dim]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+
+def _fixed_size_vectors(embeddings: np.ndarray) -> pa.FixedSizeListArray:
+    return pa.FixedSizeListArray.from_arrays(
+        pa.array(embeddings.reshape(-1), type=pa.float32()), embeddings.shape[1]
+    )
+
+
+def make_record_batch(
+    ids: list[str],
+    texts: list[str],
+    embeddings: Any,
+    metadatas: list[dict],
+    metadata_type: pa.DataType | None = None,
+    search_dim: int | None = None,
+    id_key: str = "id",
+    text_key: str = "text",
+    vector_key: str = "vector",
+) -> pa.RecordBatch:
+    """
+    Build the rows of a vector store table. `metadata_type` is the table's
+    metadata struct type, to which the metadata is cast so that chunks missing
+    some keys (e.g. shallower section hierarchies) can still be appended.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    columns = {
+        id_key: pa.array(ids, type=pa.string()),
+        text_key: pa.array(texts, type=pa.string()),
+        "metadata": pa.array(metadatas, type=metadata_type),
+        FILE_ID_KEY: pa.array(
+            [metadata.get(FILE_ID_KEY) for metadata in metadatas], type=pa.string()
+        ),
+    }
+    if search_dim is None:
+        columns[vector_key] = _fixed_size_vectors(embeddings)
+    else:
+        columns[vector_key] = _fixed_size_vectors(
+            truncate_embeddings(embeddings, search_dim)
+        )
+        columns[FULL_VECTOR_KEY] = _fixed_size_vectors(embeddings)
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def rescore(results: pa.Table, embedding: np.ndarray, k: int) -> pa.Table:
+    """
+    Re-rank search results by their full-dimension vectors and keep the best `k`.
+    """
+    if len(results) == 0:
+        return results
+    full = (
+        results[FULL_VECTOR_KEY]
+        .combine_chunks()
+        .flatten()
+        .to_numpy()
+        .reshape(len(results), -1)
+    )
+    query = embedding / max(np.linalg.norm(embedding), 1e-12)
+    similarities = full @ query
+    order = np.argsort(-similarities)[:k]
+    results = results.take(pa.array(order))
+    # Squared L2 distance between unit vectors, consistent with the index metric.
+    distances = pa.array(2 - 2 * similarities[order], type=pa.float32())
+    return results.set_column(
+        results.schema.get_field_index("_distance"), "_distance", distances
+    )
+
+
+class NexusLanceDB(LanceDB):
+    """
+    LanceDB vector store with an optional low-dimension search mode.
+
+    When `search_dim` is set, the `vector` column holds Matryoshka-truncated
+    embeddings of that size and the full embeddings are kept in a side column.
+    Searches run on the small vectors and the best `rescore_factor * k`
+    candidates are re-ranked with the full vectors.
+
+    `nprobes` and `refine_factor` tune searches once the table has an ANN index
+    (see `VectorIndexManager`); they have no effect on exhaustive searches.
+    """
+
+    def __init__(
+        self,
+        connection: Any,
+        embedding: Any,
+        uri: str,
+        table_name: str,
+        search_dim: int | None = None,
+        rescore_factor: int = 4,
+        nprobes: int | None = None,
+        refine_factor: int | None = None,
+        **kwargs: Any,
+    ):
+        # Appending is required: the default "overwrite" mode replaces the vectors
+        # of every previously processed document.
+        kwargs.setdefault("mode", "append")
+        super().__init__(connection, embedding, uri, table_name=table_name, **kwargs)
+        self.search_dim = search_dim
+        self.rescore_factor = rescore_factor
+        self.nprobes = nprobes
+        self.refine_factor = refine_factor
+        self.search_stats = SearchLatencyStats()
+        self._check_table_schema()
+        self._add_file_id_column()
+
+    def _check_table_schema(self) -> None:
+        table = self.get_table()
+        if table is None:
+            return
+        schema = table.schema
+        has_full_vectors = FULL_VECTOR_KEY in schema.names
+        dim = schema.field(self._vector_key).type.list_size
+        if (self.search_dim is not None) != has_full_vectors or (
+            self.search_dim is not None and dim != self.search_dim
+        ):
+            raise ValueError(
+                f"Table '{self._table_name}' was created with a different search "
+                f"dimension ({dim}); use a new table name to change it."
+            )
+
+    def _add_file_id_column(self) -> None:
+        table = self.get_table()
+        if table is None or FILE_ID_KEY in table.schema.names:
+            return
+        # Tables created before the column existed are migrated in place.
+        table.add_columns({FILE_ID_KEY: f"metadata.{FILE_ID_KEY}"})
+
+    def add_texts(
+        self,
+        texts: Any,
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        return self.add_embeddings(
+            texts, self._embedding.embed_documents(texts), metadatas, ids
+        )
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+    ) -> list[str]:
+        """
+        Add rows whose embeddings were computed by the caller, e.g. image
+        embeddings stored with their caption as text.
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if metadatas is None:
+            metadatas = [{"id": doc_id} for doc_id in ids]
+        table = self.get_table()
+        data = make_record_batch(
+            ids,
+            texts,
+            embeddings,
+            metadatas,
+            metadata_type=table.schema.field("metadata").type if table else None,
+            search_dim=self.search_dim,
+            id_key=self._id_key,
+            text_key=self._text_key,
+            vector_key=self._vector_key,
+        )
+
+        if table is None:
+            self._table = self._connection.create_table(self._table_name, data=data)
+        else:
+            table.add(data, mode=self.mode)
+            self._update_fts_index(table)
+        self._fts_index = None
+        return ids
+
+    def _fts_index_name(self, table: Any) -> str | None:
+        for index in table.to_lance().list_indices():
+            if index["type"] == "Inverted" and self._text_key in index["fields"]:
+                return index["name"]
+        return None
+
+    def _update_fts_index(self, table: Any) -> None:
+        # Lance fails prefiltered full-text searches over rows missing from the
+        # index, so new rows are indexed right away rather than by maintenance.
+        index_name = self._fts_index_name(table)
+        if index_name is not None:
+            table.to_lance().optimize.optimize_indices(index_names=[index_name])
+
+    def lexical_search(
+        self,
+        query: str,
+        k: int | None = None,
+        filter: Any | None = None,
+        name: str | None = None,
+        score: bool = False,
+    ) -> Any:
+        """
+        BM25 full-text search over the text column. Returns no results until the
+        full-text index has been created (see `VectorIndexManager`).
+        """
+        if k is None:
+            k = self.limit
+        table = self.get_table(name)
+        if table is None or self._fts_index_name(table) is None:
+            return []
+        if isinstance(filter, dict):
+            filter = to_lance_filter(filter)
+        results = (
+            table.search(query, query_type="fts")
+            .where(filter, prefilter=True)
+            .limit(k)
+            .to_arrow()
+        )
+        return self.results_to_docs(results, score=score)
+
+    def _query(
+        self,
+        query: Any,
+        k: int | None = None,
+        filter: Any | None = None,
+        name: str | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        if kwargs.get("query_type", "vector") != "vector" or kwargs.get("metrics"):
+            return super()._query(query, k, filter=filter, name=name, **kwargs)
+        if k is None:
+            k = self.limit
+        table = self.get_table(name)
+        if isinstance(filter, dict):
+            filter = to_lance_filter(filter)
+        # Prefiltering by default: with an ANN index, filtering after the search
+        # can leave fewer than k rows of the requested document.
+        lance_query = (
+            table.search(query=query, vector_column_name=self._vector_key)
+            .limit(k)
+            .where(filter, prefilter=kwargs.get("prefilter", True))
+        )
+        if self.nprobes is not None:
+            lance_query = lance_query.nprobes(self.nprobes)
+        if self.refine_factor is not None:
+            lance_query = lance_query.refine_factor(self.refine_factor)
+        start = time.perf_counter()
+        results = lance_query.to_arrow()
+        seconds = time.perf_counter() - start
+        if self.search_stats.needs_count():
+            self.search_stats.set_num_rows(table.count_rows())
+        self.search_stats.record(self.search_stats.num_rows, seconds)
+        return results
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int | None = None,
+        filter: Any | None = None,
+        name: str | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        if self.get_table(name) is None:
+            # Nothing has been added yet, e.g. no document with figures.
+            return []
+        if self.search_dim is None:
+            return super().similarity_search_by_vector(
+                embedding, k, filter=filter, name=name, **kwargs
+            )
+        if k is None:
+            k = self.limit
+        score = kwargs.pop("score", False)
+        full = np.asarray(embedding, dtype=np.float32)
+        truncated = truncate_embeddings(full[None, :], self.search_dim)[0]
+        results = self._query(
+            truncated, k * self.rescore_factor, filter=filter, name=name, **kwargs
+        )
+        return self.results_to_docs(rescore(results, full, k), score=score)
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int | None = None,
+        filter: Any | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        if self.search_dim is None or kwargs.get("query_type", "vector") != "vector":
+            return super().similarity_search_with_score(
+                query, k, filter=filter, **kwargs
+            )
+        kwargs.setdefault("score", True)
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k, filter=filter, **kwargs)
@@ -0,0 +1,619 @@
+"""
+https://lancedb.github.io/lancedb/python/python/#python-api-reference-async
+"""
+
+import asyncio
+import time
+import uuid
+from collections.abc import Callable, Iterable
+from datetime import timedelta
+from functools import partial
+from operator import itemgetter
+from typing import Any
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+from langchain_community.vectorstores.lancedb import to_lance_filter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.rag.vector_stores.document_cache import DocumentVectorCache, DocumentVectors
+from app.rag.vector_stores.fusion import merge_top_k
+from app.rag.vector_stores.index_manager import SearchLatencyStats
+from app.rag.vector_stores.lancedb import (
+    FILE_ID_KEY,
+    FULL_VECTOR_KEY,
+    make_record_batch,
+    rescore,
+    truncate_embeddings,
+)
+
+
+def results_to_documents(
+    results: pa.Table, text_key: str = "text", score: bool = False
+) -> list[Any]:
+    """
+    Convert search results to Documents, for the callers that need them (e.g.
+    the prompt). Vectors and scores can be read from the Arrow table directly.
+    """
+    texts = results[text_key].to_pylist()
+    metadatas = results["metadata"].to_pylist()
+    docs = [
+        Document(page_content=text, metadata=metadata)
+        for text, metadata in zip(texts, metadatas, strict=True)
+    ]
+    if not score:
+        return docs
+    score_key = "_distance" if "_distance" in results.schema.names else "_score"
+    return list(zip(docs, results[score_key].to_pylist(), strict=True))
+
+
+async def _scan(table: Any, columns: list[str], where: str | None = None) -> pa.Table:
+    """
+    All the rows matching `where`: plain queries return 10 rows unless a limit is
+    set.
+    """
+    query = table.query().select(columns)
+    if where is not None:
+        query = query.where(where)
+    return await query.limit(await table.count_rows(where)).to_arrow()
+
+
+def _document_filter(filter: Any) -> str | None:
+    """
+    The file_id of a filter that selects a single document, e.g.
+    `{"file_id": file_id}`.
+    """
+    if isinstance(filter, dict) and filter.keys() == {FILE_ID_KEY}:
+        file_id = filter[FILE_ID_KEY]
+        return file_id if isinstance(file_id, str) else None
+    return None
+
+
+def file_ids_filter(file_ids: list[str]) -> str:
+    quoted = ", ".join("'" + file_id.replace("'", "''") + "'" for file_id in file_ids)
+    return f"{FILE_ID_KEY} IN ({quoted})"
+
+
+def _chunk_signature(text: str, metadata: dict) -> tuple:
+    return text, metadata.get("block_ids"), metadata.get("embedding_model")
+
+
+class AsyncLanceDB:
+    """
+    Vector store on LanceDB's async API, reading and writing the same tables as
+    `NexusLanceDB`.
+
+    Rows are written as Arrow record batches and searches return Arrow tables,
+    so vectors and scores can be read as NumPy arrays without conversion; only
+    `similarity_search_by_vector` and `lexical_search` build Documents.
+
+    Index maintenance stays on the sync `NexusLanceDB` (see `VectorIndexManager`).
+    Reads check for new table versions, so indexes built there are used by the
+    next search.
+
+    With a `document_cache`, searches filtered on a single file_id are exact
+    searches over the document's vectors in the cache, read from the table the
+    first time and after each write to the document.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        embedding: Embeddings,
+        table_name: str,
+        search_dim: int | None = None,
+        rescore_factor: int = 4,
+        nprobes: int | None = None,
+        refine_factor: int | None = None,
+        limit: int = 4,
+        search_stats: SearchLatencyStats | None = None,
+        document_cache: DocumentVectorCache | None = None,
+        id_key: str = "id",
+        text_key: str = "text",
+        vector_key: str = "vector",
+    ):
+        self.uri = uri
+        self._embedding = embedding
+        self._table_name = table_name
+        self.search_dim = search_dim
+        self.rescore_factor = rescore_factor
+        self.nprobes = nprobes
+        self.refine_factor = refine_factor
+        self.limit = limit
+        self.search_stats = search_stats or SearchLatencyStats()
+        self.document_cache = document_cache
+        self._id_key = id_key
+        self._text_key = text_key
+        self._vector_key = vector_key
+        self._connection: Any = None
+        self._table: Any = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    async def get_table(self) -> Any:
+        """
+        The table, or None until rows have been added.
+        """
+        if self._table is not None:
+            return self._table
+        async with self._lock:
+            if self._connection is None:
+                self._connection = await lancedb.connect_async(
+                    self.uri, read_consistency_interval=timedelta(0)
+                )
+            if self._table is None and self._table_name in (
+                await self._connection.table_names()
+            ):
+                table = await self._connection.open_table(self._table_name)
+                await self._check_table_schema(table)
+                self._table = table
+        return self._table
+
+    async def _check_table_schema(self, table: Any) -> None:
+        schema = await table.schema()
+        has_full_vectors = FULL_VECTOR_KEY in schema.names
+        dim = schema.field(self._vector_key).type.list_size
+        if (self.search_dim is not None) != has_full_vectors or (
+            self.search_dim is not None and dim != self.search_dim
+        ):
+            raise ValueError(
+                f"Table '{self._table_name}' was created with a different search "
+                f"dimension ({dim}); use a new table name to change it."
+            )
+        if FILE_ID_KEY not in schema.names:
+            # Tables created before the column existed are migrated in place.
+            await table.add_columns({FILE_ID_KEY: f"metadata.{FILE_ID_KEY}"})
+
+    async def add_documents(self, documents: list[Document]) -> list[str]:
+        texts = [doc.page_content for doc in documents]
+        # Embedding is CPU bound; keep it off the event loop.
+        embeddings = await asyncio.to_thread(self._embedding.embed_documents, texts)
+        return await self.add_embeddings(
+            texts, embeddings, [doc.metadata for doc in documents]
+        )
+
+    async def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: Any,
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+    ) -> list[str]:
+        """
+        Add rows whose embeddings were computed by the caller, e.g. image
+        embeddings stored with their caption as text.
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if metadatas is None:
+            metadatas = [{"id": doc_id} for doc_id in ids]
+        await self._write(texts, embeddings, metadatas, ids, upsert=False)
+        return ids
+
+    async def upsert_documents(
+        self,
+        documents: list[Document],
+        file_id: str,
+        embed: Callable[[list[int]], Any] | None = None,
+    ) -> dict[str, int]:
+        """
+        Make the rows of `file_id` match `documents`, keyed by `Document.id`.
+
+        Only new and changed chunks (text, blocks or embedding model) are embedded
+        and merged into the table; rows of chunks that no longer exist are
+        deleted.
+
+        Args:
+            embed: Embeds the documents at the given positions, e.g. images;
+                defaults to embedding their text.
+        """
+        existing = {}
+        table = await self.get_table()
+        if table is not None:
+            rows = await _scan(
+                table,
+                [self._id_key, self._text_key, "metadata"],
+                to_lance_filter({FILE_ID_KEY: file_id}),
+            )
+            for row in rows.to_pylist():
+                existing[row[self._id_key]] = _chunk_signature(
+                    row[self._text_key], row["metadata"]
+                )
+        changed = [
+            i
+            for i, doc in enumerate(documents)
+            if existing.get(doc.id) != _chunk_signature(doc.page_content, doc.metadata)
+        ]
+        stale = existing.keys() - {doc.id for doc in documents}
+
+        if changed:
+            if embed is None:
+                texts = [documents[i].page_content for i in changed]
+                embed_changed = partial(self._embedding.embed_documents, texts)
+            else:
+                embed_changed = partial(embed, changed)
+            # Embedding is CPU bound; keep it off the event loop.
+            embeddings = await asyncio.to_thread(embed_changed)
+            await self._write(
+                [documents[i].page_content for i in changed],
+                embeddings,
+                [documents[i].metadata for i in changed],
+                [documents[i].id for i in changed],
+                upsert=True,
+            )
+        if stale:
+            ids = ", ".join(f"'{doc_id}'" for doc_id in stale)
+            await table.delete(f"{self._id_key} IN ({ids})")
+            await self._invalidate(table, [file_id])
+        return {
+            "inserted": sum(documents[i].id not in existing for i in changed),
+            "updated": sum(documents[i].id in existing for i in changed),
+            "deleted": len(stale),
+            "unchanged": len(documents) - len(changed),
+        }
+
+    async def _write(
+        self,
+        texts: list[str],
+        embeddings: Any,
+        metadatas: list[dict],
+        ids: list[str],
+        upsert: bool,
+    ) -> None:
+        table = await self.get_table()
+        metadata_type = None
+        if table is not None:
+            metadata_type = (await table.schema()).field("metadata").type
+        batch = make_record_batch(
+            ids,
+            texts,
+            embeddings,
+            metadatas,
+            metadata_type=metadata_type,
+            search_dim=self.search_dim,
+            id_key=self._id_key,
+            text_key=self._text_key,
+            vector_key=self._vector_key,
+        )
+        data = pa.Table.from_batches([batch])
+        if table is None:
+            async with self._lock:
+                if self._table is None:
+                    self._table = await self._connection.create_table(
+                        self._table_name, data=data
+                    )
+                    return
+            # Created by a concurrent call: write with the table's metadata type.
+            return await self._write(texts, embeddings, metadatas, ids, upsert)
+        if upsert:
+            await (
+                table.merge_insert(self._id_key)
+                .when_matched_update_all()
+                .when_not_matched_insert_all()
+                .execute(data)
+            )
+        else:
+            await table.add(data)
+        await self._update_fts_index(table)
+        await self._invalidate(
+            table, {metadata.get(FILE_ID_KEY) for metadata in metadatas}
+        )
+
+    async def _invalidate(self, table: Any, file_ids: Iterable[str | None]) -> None:
+        """
+        Mark the cached vectors of documents that were just written to as stale,
+        for every process; those of other documents stay valid.
+        """
+        file_ids = [file_id for file_id in file_ids if file_id is not None]
+        if self.document_cache is None or not file_ids:
+            return
+        version = await table.version()
+        for file_id in file_ids:
+            self.document_cache.invalidate(file_id, version)
+
+    async def file_ids(self) -> set[str]:
+        """
+        The documents that have rows in the table.
+        """
+        table = await self.get_table()
+        if table is None:
+            return set()
+        rows = await _scan(table, [FILE_ID_KEY])
+        return set(rows[FILE_ID_KEY].unique().to_pylist())
+
+    async def version(self) -> int | None:
+        """
+        The current table version, or None until rows have been added.
+        """
+        table = await self.get_table()
+        return None if table is None else await table.version()
+
+    async def _document_rows(self, table: Any) -> dict[str, dict[str, tuple]]:
+        rows = await _scan(
+            table, [self._id_key, self._text_key, "metadata", FILE_ID_KEY]
+        )
+        documents: dict[str, dict[str, tuple]] = {}
+        for row in rows.to_pylist():
+            documents.setdefault(row[FILE_ID_KEY], {})[row[self._id_key]] = (
+                _chunk_signature(row[self._text_key], row["metadata"])
+            )
+        return documents
+
+    async def changed_file_ids(self, version: int | None) -> set[str]:
+        """
+        The documents whose rows were written or deleted since table `version`;
+        all of them if None.
+        """
+        table = await self.get_table()
+        if table is None:
+            return set()
+        current = await self._document_rows(table)
+        if version is None:
+            return set(current)
+        # A table of its own: checking out moves the table to that version.
+        connection = await lancedb.connect_async(self.uri)
+        previous_table = await connection.open_table(self._table_name)
+        await previous_table.checkout(version)
+        previous = await self._document_rows(previous_table)
+        return {
+            file_id
+            for file_id in current.keys() | previous.keys()
+            if current.get(file_id) != previous.get(file_id)
+        }
+
+    async def get_documents(self, file_id: str) -> list[Document]:
+        """
+        The chunks of a document, without their vectors.
+        """
+        table = await self.get_table()
+        if table is None:
+            return []
+        rows = await _scan(
+            table,
+            [self._id_key, self._text_key, "metadata"],
+            to_lance_filter({FILE_ID_KEY: file_id}),
+        )
+        return [
+            Document(
+                id=row[self._id_key],
+                page_content=row[self._text_key],
+                metadata=row["metadata"],
+            )
+            for row in rows.to_pylist()
+        ]
+
+    async def delete(self, filter: Any) -> None:
+        """
+        Delete the rows matching `filter`, e.g. `{"file_id": file_id}`.
+        """
+        table = await self.get_table()
+        if table is None:
+            return
+        where = to_lance_filter(filter) if isinstance(filter, dict) else filter
+        file_ids = [_document_filter(filter)]
+        if self.document_cache is not None and file_ids[0] is None:
+            # The documents the rows belong to.
+            rows = await _scan(table, [FILE_ID_KEY], where)
+            file_ids = rows[FILE_ID_KEY].unique().to_pylist()
+        await table.delete(where)
+        await self._invalidate(table, file_ids)
+
+    async def _fts_index_name(self, table: Any) -> str | None:
+        for index in await table.list_indices():
+            if index.index_type == "FTS" and self._text_key in index.columns:
+                return index.name
+        return None
+
+    async def _update_fts_index(self, table: Any) -> None:
+        # Lance fails prefiltered full-text searches over rows missing from the
+        # index. The async API can only optimize the whole table (compaction
+        # included), so the index alone is updated through the dataset.
+        index_name = await self._fts_index_name(table)
+        if index_name is not None:
+            await asyncio.to_thread(self._optimize_index, index_name)
+
+    def _optimize_index(self, index_name: str) -> None:
+        dataset = lancedb.connect(self.uri).open_table(self._table_name).to_lance()
+        dataset.optimize.optimize_indices(index_names=[index_name])
+
+    async def search(
+        self,
+        embedding: Any,
+        k: int | None = None,
+        filter: Any | None = None,
+    ) -> pa.Table:
+        """
+        Vector search, prefiltered by `filter`. Returns the rows as an Arrow table
+        with a `_distance` column.
+        """
+        if k is None:
+            k = self.limit
+        table = await self.get_table()
+        if table is None:
+            # Nothing has been added yet, e.g. no document with figures.
+            return pa.table({})
+        full = np.asarray(embedding, dtype=np.float32)
+        file_id = _document_filter(filter)
+        if self.document_cache is not None and file_id is not None:
+            return (await self._document_vectors(table, file_id)).search(full, k)
+        query = full
+        limit = k
+        if self.search_dim is not None:
+            query = truncate_embeddings(full[None, :], self.search_dim)[0]
+            limit = k * self.rescore_factor
+        lance_query = table.vector_search(query).column(self._vector_key).limit(limit)
+        if filter:
+            # Prefiltering: with an ANN index, filtering after the search can leave
+            # fewer than k rows of the requested document.
+            lance_query = lance_query.where(
+                to_lance_filter(filter) if isinstance(filter, dict) else filter
+            )
+        if self.nprobes is not None:
+            lance_query = lance_query.nprobes(self.nprobes)
+        if self.refine_factor is not None:
+            lance_query = lance_query.refine_factor(self.refine_factor)
+        start = time.perf_counter()
+        results = await lance_query.to_arrow()
+        seconds = time.perf_counter() - start
+        if self.search_stats.needs_count():
+            self.search_stats.set_num_rows(await table.count_rows())
+        self.search_stats.record(self.search_stats.num_rows, seconds)
+        if self.search_dim is not None:
+            results = rescore(results, full, k)
+        return results
+
+    async def search_many(
+        self,
+        embeddings: Any,
+        k: int | None = None,
+        filter: Any | None = None,
+    ) -> list[pa.Table]:
+        """
+        `search` for each of `embeddings`. Searches of a single document in the
+        `document_cache` are done with one matrix product; others concurrently.
+        """
+        if k is None:
+            k = self.limit
+        file_id = _document_filter(filter)
+        if self.document_cache is None or file_id is None:
+            return list(
+                await asyncio.gather(
+                    *(self.search(embedding, k, filter) for embedding in embeddings)
+                )
+            )
+        table = await self.get_table()
+        if table is None:
+            return [pa.table({}) for _ in embeddings]
+        vectors = await self._document_vectors(table, file_id)
+        return vectors.search_many(np.asarray(embeddings, dtype=np.float32), k)
+
+    async def _document_vectors(self, table: Any, file_id: str) -> DocumentVectors:
+        # Reads the invalidation marker, and the files after a write.
+        vectors = await asyncio.to_thread(self.document_cache.get, file_id)
+        if vectors is None:
+            # Read before the rows: a write to the document in between makes
+            # them stale rather than the other way around.
+            version = await table.version()
+            # The full vectors, so that no rescoring is needed.
+            vector_key = (
+                FULL_VECTOR_KEY if self.search_dim is not None else self._vector_key
+            )
+            rows = await _scan(
+                table,
+                [self._id_key, self._text_key, "metadata", FILE_ID_KEY, vector_key],
+                to_lance_filter({FILE_ID_KEY: file_id}),
+            )
+            vectors = await asyncio.to_thread(
+                self.document_cache.put, file_id, version, rows, vector_key
+            )
+        return vectors
+
+    async def similarity_search_by_vector(
+        self,
+        embedding: Any,
+        k: int | None = None,
+        filter: Any | None = None,
+        score: bool = False,
+    ) -> list[Any]:
+        results = await self.search(embedding, k, filter=filter)
+        if len(results) == 0:
+            return []
+        return results_to_documents(results, self._text_key, score=score)
+
+    async def similarity_search_by_vectors(
+        self,
+        embeddings: Any,
+        k: int | None = None,
+        filter: Any | None = None,
+        score: bool = False,
+    ) -> list[list[Any]]:
+        """
+        `similarity_search_by_vector` for each of `embeddings` (see `search_many`).
+        """
+        return [
+            results_to_documents(results, self._text_key, score=score)
+            if len(results)
+            else []
+            for results in await self.search_many(embeddings, k, filter=filter)
+        ]
+
+    async def search_documents(
+        self,
+        embedding: Any,
+        k: int | None = None,
+        file_ids: list[str] | None = None,
+        max_per_document: int | None = None,
+        max_partitions: int = 32,
+        max_rounds: int = 3,
+    ) -> list[tuple[Document, float]]:
+        """
+        Vector search over several documents, or the whole library when `file_ids`
+        is None. Returns (Document, distance) pairs, best first, with at most
+        `max_per_document` chunks of a document.
+
+        Up to `max_partitions` documents are searched one by one (exactly, with
+        the `document_cache`) and their results merged. Larger sets and the
+        library are searched at once, fetching more rows until the caps leave k,
+        for at most `max_rounds` searches: with fewer than k / `max_per_document`
+        matching documents, k results are never reached.
+        """
+        if k is None:
+            k = self.limit
+        if file_ids is not None and len(file_ids) <= max_partitions:
+            per_document = k if max_per_document is None else min(k, max_per_document)
+            rankings = await asyncio.gather(
+                *(
+                    self.similarity_search_by_vector(
+                        embedding,
+                        per_document,
+                        filter={FILE_ID_KEY: file_id},
+                        score=True,
+                    )
+                    for file_id in file_ids
+                )
+            )
+            return merge_top_k(rankings, k, score=itemgetter(1))
+
+        where = file_ids_filter(file_ids) if file_ids is not None else None
+        limit = k if max_per_document is None else 2 * k
+        for attempt in range(max_rounds):
+            results = await self.similarity_search_by_vector(
+                embedding, limit, filter=where, score=True
+            )
+            merged = merge_top_k(
+                [results],
+                k,
+                group=lambda result: result[0].metadata[FILE_ID_KEY],
+                max_per_group=max_per_document,
+            )
+            if len(merged) == k or len(results) < limit or attempt == max_rounds - 1:
+                return merged
+            limit *= 4
+
+    async def lexical_search(
+        self,
+        query: str,
+        k: int | None = None,
+        filter: Any | None = None,
+        score: bool = False,
+    ) -> list[Any]:
+        """
+        BM25 full-text search over the text column. Returns no results until the
+        full-text index has been created (see `VectorIndexManager`).
+        """
+        if k is None:
+            k = self.limit
+        table = await self.get_table()
+        if table is None or await self._fts_index_name(table) is None:
+            return []
+        lance_query = table.query().nearest_to_text(query, columns=self._text_key)
+        if filter:
+            lance_query = lance_query.where(
+                to_lance_filter(filter) if isinstance(filter, dict) else filter
+            )
+        results = await lance_query.limit(k).to_arrow()
+        return results_to_documents(results, self._text_key, score=score)
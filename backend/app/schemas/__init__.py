@@ -2,9 +2,19 @@ from .annotation import AnnotationBase, AnnotationCreate, AnnotationUpdate
 from .block import BlockBase, BlockCreate, BlockUpdate
 from .concept import ConceptBase, ConceptCreate, ConceptUpdate
 from .document import DocumentBase, DocumentCreate, DocumentUpdate
+from .embedding_migration import EmbeddingMigrationBase, EmbeddingMigrationCreate
+from .health import ComponentStatus, Readiness
 from .link import LinkCreate
+from .metrics import (
+    CacheStats,
+    LLMGatewayStats,
+    RetrievalLatency,
+    SearchLatency,
+    VectorIndexStats,
+)
 from .msg import Msg
-from .rag import RAGRequest, RAGResponse
+from .rag import RAGBatchRequest, RAGRequest, RAGResponse, RAGSource
+from .thumbnail import ThumbnailIndex, ThumbnailRect
 
 __all__ = [
     "AnnotationBase",
@@ -13,14 +23,27 @@ __all__ = [
     "BlockBase",
     "BlockCreate",
     "BlockUpdate",
+    "CacheStats",
+    "ComponentStatus",
     "ConceptBase",
     "ConceptCreate",
     "ConceptUpdate",
     "DocumentBase",
     "DocumentCreate",
     "DocumentUpdate",
+    "EmbeddingMigrationBase",
+    "EmbeddingMigrationCreate",
+    "LLMGatewayStats",
     "LinkCreate",
     "Msg",
+    "RAGBatchRequest",
     "RAGRequest",
     "RAGResponse",
+    "RAGSource",
+    "Readiness",
+    "RetrievalLatency",
+    "SearchLatency",
+    "ThumbnailIndex",
+    "ThumbnailRect",
+    "VectorIndexStats",
 ]
@@ -1,5 +1,11 @@
+import json
+import uuid
+from typing import Literal
+
 from pydantic import BaseModel
 
+CHUNK_NAMESPACE = uuid.UUID("9b7f3c1e-2d4a-4f6b-8e5d-0c1a2b3c4d5e")
+
 
 class ChunkMetadata(BaseModel):
     file_id: str
@@ -7,3 +13,21 @@ class ChunkMetadata(BaseModel):
     chunk_id: int
     block_ids: list[str]
     embedding_model: str | None = None
+    modality: Literal["text", "image"] = "text"
+
+    def uid(self) -> str:
+        """
+        Deterministic id of the chunk, so that reprocessing a document updates its
+        chunks instead of adding new ones. Text chunks are identified by their
+        section and position in it; image chunks by their block, since several
+        images share a section.
+        """
+        key = [
+            self.file_id,
+            self.modality,
+            sorted(self.section_hierarchy.items()),
+            self.chunk_id,
+        ]
+        if self.modality == "image":
+            key.append(self.block_ids)
+        return str(uuid.uuid5(CHUNK_NAMESPACE, json.dumps(key)))
@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class EmbeddingMigrationCreate(BaseModel):
+    model_key: str
+    model_kwargs: dict[str, Any] = Field(default_factory=dict)
+
+
+class EmbeddingMigrationBase(BaseModel):
+    id: str
+    model_key: str
+    model_kwargs: dict[str, Any] = Field(default_factory=dict)
+    table_name: str
+    image_table_name: str | None = None
+    source_id: str | None = None
+    status: str
+    num_documents: int = 0
+    num_done: int = 0
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,14 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class ComponentStatus(BaseModel):
+    status: Literal["pending", "loading", "ready", "failed"]
+    error: str | None = None
+    load_seconds: float | None = None
+
+
+class Readiness(BaseModel):
+    ready: bool
+    components: dict[str, ComponentStatus]
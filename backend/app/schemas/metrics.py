@@ -0,0 +1,51 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class SearchLatency(BaseModel):
+    min_rows: int
+    count: int
+    p50_ms: float
+    p95_ms: float
+
+
+class VectorIndexStats(BaseModel):
+    table: str
+    num_rows: int
+    index_type: str | None = None
+    num_indexed_rows: int = 0
+    num_unindexed_rows: int = 0
+    num_fragments: int = 0
+    num_deleted_rows: int = 0
+    # Since startup.
+    compacted_fragments: int = 0
+    reclaimed_bytes: int = 0
+    search_latency: list[SearchLatency] = []
+
+
+class LLMGatewayStats(BaseModel):
+    backend: str
+    max_concurrency: int
+    max_queue: int
+    in_flight: int
+    queued: int
+    # Since startup.
+    completed: int
+    rejected: int
+    timed_out: int
+    queue_wait_p50_ms: float
+    queue_wait_p95_ms: float
+
+
+class RetrievalLatency(BaseModel):
+    mode: str
+    count: int
+    p50_ms: float
+    p95_ms: float
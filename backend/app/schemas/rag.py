@@ -1,13 +1,38 @@
+from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 from app.models import Block
 
 
 class RAGRequest(BaseModel):
-    file_id: str
+    # A document, a set of documents (file_ids), or the whole library (neither).
+    file_id: str | None = None
+    file_ids: list[str] | None = None
     question: str
     k: int = 5
+    # vector: embeddings only; lexical: BM25 only; hybrid: both, fused by rank.
+    retrieval_mode: Literal["vector", "lexical", "hybrid"] = "vector"
+    # Chunks kept per document when searching several documents.
+    max_chunks_per_document: int | None = 2
+
+    @model_validator(mode="after")
+    def check_scope(self) -> "RAGRequest":
+        if self.file_id is not None and self.file_ids is not None:
+            raise ValueError("Give either file_id or file_ids, not both.")
+        return self
+
+
+class RAGBatchRequest(BaseModel):
+    file_id: str
+    questions: list[str] = Field(min_length=1, max_length=100)
+    k: int = 5
+    retrieval_mode: Literal["vector", "lexical", "hybrid"] = "vector"
+
+
+class RAGSource(BaseModel):
+    file_id: str
+    block_ids: list[str]
 
 
 class RAGResponse(BaseModel):
@@ -16,3 +41,9 @@ class RAGResponse(BaseModel):
     question: str | None = None
     answer: int | None = None
     section: list[Block] = None
+    # The chunks in the prompt, best first.
+    sources: list[RAGSource] = []
+    # Tokens of retrieved text in the prompt, and those left out to fit
+    # settings.RAG_CONTEXT_MAX_TOKENS.
+    context_tokens: int | None = None
+    context_tokens_saved: int | None = None
@@ -1,4 +1,3 @@
-
 from bs4 import BeautifulSoup
 from langchain_core.documents import Document
 from pydantic import BaseModel
@@ -57,10 +56,58 @@ class SectionBase(BaseModel):
             embedding_model=embedding_model,
         )
         page_content = text
-        chunk = Document(metadata=metadata.model_dump(), page_content=page_content)
+        chunk = Document(
+            id=metadata.uid(),
+            metadata=metadata.model_dump(),
+            page_content=page_content,
+        )
         return [chunk]
 
 
+IMAGE_BLOCK_TYPES = ("Picture", "Figure")
+
+
+def image_blocks_to_chunks(
+    blocks: list[BlockBase], levels: list[str], embedding_model
+) -> tuple[list[Document], list[str]]:
+    """
+    Convert Picture and Figure blocks into image chunks.
+
+    Returns the chunks and their base64-encoded images, in the same order. The
+    chunk text is whatever text Marker extracted for the block, if any, and the
+    section hierarchy is kept at the same `levels` as the text chunks.
+    """
+    chunks, images = [], []
+    for block in blocks:
+        if block.block_type not in IMAGE_BLOCK_TYPES or not block.images:
+            continue
+        image = block.images.get(block.block_id) or next(iter(block.images.values()))
+        soup = BeautifulSoup(block.html, "html.parser")
+        metadata = ChunkMetadata(
+            file_id=block.file_id,
+            # Every level is set (possibly empty) so that all image chunks share
+            # one metadata schema.
+            section_hierarchy={
+                level: (block.section_hierarchy or {}).get(level, "")
+                for level in levels
+            },
+            chunk_id=0,
+            block_ids=[block.block_id],
+            embedding_model=embedding_model,
+            modality="image",
+        )
+        chunks.append(
+            Document(
+                id=metadata.uid(),
+                metadata=metadata.model_dump(),
+                page_content=soup.get_text(separator=" ", strip=True)
+                or block.block_type,
+            )
+        )
+        images.append(image)
+    return chunks, images
+
+
 def gather_section_hierarchies(
     blocks: list[BlockBase], levels: list[str]
 ) -> list[dict[str, str]]:
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+
+class ThumbnailRect(BaseModel):
+    page_number: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class ThumbnailIndex(BaseModel):
+    file_id: str
+    format: str
+    sprite_width: int
+    sprite_height: int
+    pages: list[ThumbnailRect]
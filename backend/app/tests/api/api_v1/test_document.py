@@ -1,6 +1,7 @@
 import base64
 from pathlib import Path
 
+import fitz
 import pytest
 from fastapi.testclient import TestClient
 from odmantic import AIOEngine
@@ -23,6 +24,36 @@ def test_upload_document(pdf_path: Path, client: TestClient) -> None:
     assert res.status_code == 200
 
 
+def test_get_thumbnails(pdf_path: Path, client: TestClient) -> None:
+    with open(pdf_path, "rb") as f:
+        file_bytes = f.read()
+    content = base64.b64encode(file_bytes).decode("utf-8")
+    res = client.post(
+        f"{settings.API_V1_STR}/document/upload",
+        json={"name": "assets/2501.00663v1.pdf", "content": content},
+    )
+    document = res.json()
+
+    res = client.post(
+        f"{settings.API_V1_STR}/document/thumbnails",
+        json={"id": document["id"]},
+    )
+    assert res.status_code == 200
+    index = res.json()
+    with fitz.open(pdf_path) as doc:
+        assert len(index["pages"]) == len(doc)
+    for rect in index["pages"]:
+        assert rect["x"] + rect["width"] <= index["sprite_width"]
+        assert rect["y"] + rect["height"] <= index["sprite_height"]
+
+    res = client.post(
+        f"{settings.API_V1_STR}/document/thumbnail_sprite",
+        json={"id": document["id"]},
+    )
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("image/")
+
+
 @pytest.mark.asyncio
 async def test_process_document(
     pdf_path: str, engine: AIOEngine, client: TestClient
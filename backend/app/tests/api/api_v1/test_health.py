@@ -0,0 +1,18 @@
+import time
+
+from fastapi.testclient import TestClient
+
+
+def test_ready(client: TestClient):
+    res = client.get("/ready")
+    assert res.status_code in (200, 503)
+    assert set(res.json()["components"]) == {"embeddings", "llm", "vector_store"}
+
+    # The models finish loading in the background.
+    deadline = time.monotonic() + 600
+    while res.status_code == 503 and time.monotonic() < deadline:
+        time.sleep(1)
+        res = client.get("/ready")
+    assert res.status_code == 200
+    assert res.json()["ready"]
+    assert all(c["status"] == "ready" for c in res.json()["components"].values())
@@ -0,0 +1,31 @@
+import pytest
+from odmantic import AIOEngine
+
+from app.crud import block as crud_block
+from app.schemas.block import BlockCreate
+
+
+def make_block(block_id: str, html: str) -> BlockCreate:
+    return BlockCreate(
+        file_id="file_id",
+        page_number=0,
+        block_id=block_id,
+        block_type="Text",
+        html=html,
+        polygon=[[0.0, 0.0]],
+        bbox=[0.0, 0.0, 1.0, 1.0],
+    )
+
+
+@pytest.mark.asyncio
+async def test_upsert_blocks(engine: AIOEngine) -> None:
+    blocks = [make_block("0", "a"), make_block("1", "b")]
+    counts = await crud_block.upsert_multi(engine, file_id="file_id", objs_in=blocks)
+    assert counts == {"upserted": 2, "modified": 0, "deleted": 0}
+
+    blocks = [make_block("0", "a"), make_block("2", "c")]
+    counts = await crud_block.upsert_multi(engine, file_id="file_id", objs_in=blocks)
+    assert counts == {"upserted": 1, "modified": 0, "deleted": 1}
+
+    stored = await crud_block.get_multi(engine, {"file_id": "file_id"})
+    assert sorted(block.block_id for block in stored) == ["0", "2"]
@@ -1,16 +1,21 @@
 import asyncio
 import os
-from collections.abc import Generator
+from collections.abc import Callable, Generator
 from pathlib import Path
 from shutil import rmtree
 
+import numpy as np
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from app.core.config import settings
 from app.core.db import _MongoClientSingleton, get_mongodb_client, get_mongodb_engine
 from app.main import app
+from app.rag.embeddings.registry import register_embedding_model
+from app.schemas.chunk import ChunkMetadata
 
 TEST_MONGO_DATABASE = "test"
 settings.MONGO_DATABASE = TEST_MONGO_DATABASE
@@ -18,6 +23,9 @@ settings.MONGO_DATABASE = TEST_MONGO_DATABASE
 TEST_LANCE_URI = "lancedb/test"
 settings.LANCE_URI = TEST_LANCE_URI
 
+# Models load in the background; let the tests wait for them.
+settings.MODEL_READY_TIMEOUT = 600
+
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -66,6 +74,70 @@ def set_temp_document_dir(tmp_path_factory):
     yield temp_dir
 
 
+@pytest.fixture(scope="session", autouse=True)
+def set_temp_thumbnail_dir(tmp_path_factory):
+    temp_dir = tmp_path_factory.mktemp("thumbnails")
+    settings.THUMBNAIL_DIR_PATH = temp_dir
+    yield temp_dir
+
+
+@register_embedding_model("test-fake")
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings that count the texts they embed.
+    """
+
+    # Not wrapped in the embedding cache by `create_embeddings`.
+    cacheable = False
+
+    def __init__(self, name: str = "fake", dim: int = 8):
+        self.name = name
+        self.dim = dim
+        self.num_embedded = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.num_embedded += len(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return np.random.default_rng(len(text)).normal(size=self.dim).tolist()
+
+
+@pytest.fixture
+def fake_embeddings() -> type[FakeEmbeddings]:
+    return FakeEmbeddings
+
+
+@pytest.fixture
+def make_chunks() -> Callable[..., list[Document]]:
+    """
+    Chunks of a document, one section per text.
+    """
+
+    def make(
+        file_id: str, texts: list[str], model: str | None = None
+    ) -> list[Document]:
+        chunks = []
+        for i, text in enumerate(texts):
+            metadata = ChunkMetadata(
+                file_id=file_id,
+                section_hierarchy={"1": f"section {i}"},
+                chunk_id=0,
+                block_ids=[str(i)],
+                embedding_model=model,
+            )
+            chunks.append(
+                Document(
+                    id=metadata.uid(),
+                    page_content=text,
+                    metadata=metadata.model_dump(),
+                )
+            )
+        return chunks
+
+    return make
+
+
 def pytest_sessionfinish(session, exitstatus):
     """Hook to run after the entire test session finishes."""
     if os.path.exists(TEST_LANCE_URI):
@@ -0,0 +1,28 @@
+import numpy as np
+
+from app.rag.answer_cache import SemanticAnswerCache
+
+
+def test_similar_questions_share_answers() -> None:
+    cache = SemanticAnswerCache(threshold=0.9)
+    key = ("file", "model", 5, "vector")
+    cache.put(key, [1.0, 0.0], "v1", "answer")
+    # A paraphrase: close to the cached question.
+    assert cache.get(key, [0.95, 0.1], "v1") == "answer"
+    assert cache.get(key, [0.0, 1.0], "v1") is None
+    assert cache.get(("other", "model", 5, "vector"), [1.0, 0.0], "v1") is None
+    # The document was reprocessed: its answers are dropped.
+    assert cache.get(key, [1.0, 0.0], "v2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_and_eviction() -> None:
+    cache = SemanticAnswerCache(max_size=2, threshold=0.9)
+    vectors = np.eye(3)
+    for i, file_id in enumerate(["a", "a", "b"]):
+        cache.put((file_id, i), vectors[i], "v1", i)
+    # The oldest answer was evicted.
+    assert cache.get(("a", 0), vectors[0], "v1") is None
+    cache.invalidate("a")
+    assert cache.get(("a", 1), vectors[1], "v1") is None
+    assert cache.get(("b", 2), vectors[2], "v1") == 2
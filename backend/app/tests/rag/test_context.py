@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+from langchain_ollama import OllamaLLM
+
+from app.core.config import settings
+from app.core.llm import _token_counter
+from app.rag.context import estimate_tokens, pack_context
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def chunk(text: str, block_ids: list[str]) -> Document:
+    return Document(page_content=text, metadata={"block_ids": block_ids})
+
+
+DOCS = [
+    chunk(
+        "Titans learn to memorize at test time.\nFigure 1: The memory.\n", ["a", "b"]
+    ),
+    # An image chunk of a block already in the section chunk above.
+    chunk("Figure 1: The memory.", ["b"]),
+    chunk("RoPE is applied to queries and keys.\n", ["c"]),
+]
+
+
+def test_pack_context_deduplicates_blocks() -> None:
+    context = pack_context(DOCS, count_words, max_tokens=None)
+    assert context.text == (
+        "Titans learn to memorize at test time.\nFigure 1: The memory.\n\n"
+        "RoPE is applied to queries and keys."
+    )
+    assert context.docs == [DOCS[0], DOCS[2]]
+    assert context.tokens == count_words(context.text)
+    assert context.tokens_saved == count_words(DOCS[1].page_content)
+
+
+def test_pack_context_fills_budget() -> None:
+    context = pack_context(DOCS, count_words, max_tokens=10)
+    assert context.text == "Titans learn to memorize at test time.\nFigure 1: The"
+    assert context.docs == [DOCS[0]]
+    assert context.tokens == 10
+    assert context.original_tokens == 22
+    assert context.tokens_saved == 12
+
+
+def test_token_counter_falls_back_to_estimate(tmp_path, monkeypatch) -> None:
+    # No tokenizer of its own: not LangChain's GPT-2 default, which downloads.
+    assert _token_counter(OllamaLLM(model="llama3.2")) is estimate_tokens
+    # A tokenizer that cannot be loaded.
+    monkeypatch.setattr(settings, "LLM_TOKENIZER", str(tmp_path))
+    assert _token_counter(OllamaLLM(model="llama3.2")) is estimate_tokens
+    assert estimate_tokens("12345678") == 2
@@ -0,0 +1,105 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.vector_store import delete_document_vectors
+from app.rag.vector_stores.document_cache import DocumentVectorCache
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+
+class RandomEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = np.random.default_rng(len(texts)).normal(size=(len(texts), 32))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.asyncio
+async def test_document_search_matches_lancedb(tmp_path: Path) -> None:
+    cache = DocumentVectorCache(tmp_path / "cache", max_documents=1)
+    store = AsyncLanceDB(
+        str(tmp_path / "lance"), RandomEmbeddings(), "test", document_cache=cache
+    )
+    uncached = AsyncLanceDB(str(tmp_path / "lance"), RandomEmbeddings(), "test")
+    texts = [f"chunk {i}" for i in range(50)]
+    embeddings = store.embeddings.embed_documents(texts)
+    for file_id in ("a", "b"):
+        metadatas = [{"file_id": file_id} for _ in texts]
+        await store.add_embeddings(texts, embeddings, metadatas)
+
+    query = np.asarray(embeddings[7]) + 0.1
+    for file_id in ("a", "b", "a"):
+        expected = await uncached.search(query, k=5, filter={"file_id": file_id})
+        results = await store.search(query, k=5, filter={"file_id": file_id})
+        assert results["text"].to_pylist() == expected["text"].to_pylist()
+        assert results["file_id"].to_pylist() == [file_id] * 5
+        np.testing.assert_allclose(
+            results["_distance"].to_numpy(), expected["_distance"].to_numpy(), atol=1e-2
+        )
+    # One document is kept open; the other is loaded back from disk.
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["hits"] == 1
+
+    # A write to another document leaves the cached vectors valid, also for other
+    # processes sharing the directory.
+    await store.add_embeddings(texts[:1], embeddings[:1], [{"file_id": "c"}])
+    other = DocumentVectorCache(cache.directory)
+    assert other.get("a") is not None
+    assert cache.get("b") is not None
+
+    # A write to the document makes them stale.
+    await store.delete({"file_id": "a"})
+    assert other.get("a") is None
+    assert len(await store.search(query, k=5, filter={"file_id": "a"})) == 0
+    assert len(list(cache.directory.glob("a.*.npy"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_document_cache_bounds_disk_usage(tmp_path: Path) -> None:
+    cache = DocumentVectorCache(tmp_path / "cache", max_disk_documents=2)
+    store = AsyncLanceDB(
+        str(tmp_path / "lance"), RandomEmbeddings(), "test", document_cache=cache
+    )
+    texts = [f"chunk {i}" for i in range(5)]
+    embeddings = store.embeddings.embed_documents(texts)
+    for file_id in ("a", "b", "c"):
+        await store.add_embeddings(texts, embeddings, [{"file_id": file_id}] * 5)
+    cache.invalidate("a", 0)
+    for file_id in ("a", "b", "c"):
+        await store.search(embeddings[0], k=1, filter={"file_id": file_id})
+        # Distinct modification times.
+        time.sleep(0.01)
+
+    # The files and markers of the least recently used document are removed.
+    names = sorted(path.name for path in cache.directory.iterdir())
+    assert {name.split(".")[0] for name in names} == {"b", "c"}
+    # Its open vectors stay valid; other processes read it again from the table.
+    assert cache.get("a") is not None
+    assert DocumentVectorCache(cache.directory).get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_delete_document_vectors(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "LANCE_URI", str(tmp_path / "lance"))
+    monkeypatch.setattr(settings, "LANCE_DOCUMENT_CACHE_DIR_PATH", tmp_path / "cache")
+    cache = DocumentVectorCache(tmp_path / "cache" / "test")
+    store = AsyncLanceDB(
+        settings.LANCE_URI, RandomEmbeddings(), "test", document_cache=cache
+    )
+    texts = [f"chunk {i}" for i in range(5)]
+    embeddings = store.embeddings.embed_documents(texts)
+    for file_id in ("a", "b"):
+        await store.add_embeddings(texts, embeddings, [{"file_id": file_id}] * 5)
+        await store.search(embeddings[0], k=1, filter={"file_id": file_id})
+
+    # Without the embedding model; missing tables are skipped.
+    await delete_document_vectors("a", ["test", "missing"])
+    assert await store.file_ids() == {"b"}
+    assert len(await store.search(embeddings[0], k=1, filter={"file_id": "a"})) == 0
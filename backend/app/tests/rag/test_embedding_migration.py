@@ -0,0 +1,160 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from odmantic import AIOEngine
+
+from app.core import embedding_migration
+from app.core.config import settings
+from app.core.embedding_migration import sync_store
+from app.core.embeddings import _EmbeddingsSingleton, get_embeddings
+from app.core.vector_store import _VectorStoreSingleton, get_async_vector_store
+from app.models.document import Document
+from app.models.embedding_migration import EmbeddingMigration
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+
+@pytest.mark.asyncio
+async def test_sync_store_reembeds_into_new_table(
+    tmp_path: Path, fake_embeddings, make_chunks
+) -> None:
+    old = AsyncLanceDB(str(tmp_path), fake_embeddings("old", 8), "vectorstore")
+    new_embeddings = fake_embeddings("new", 16)
+    new = AsyncLanceDB(str(tmp_path), new_embeddings, "vectorstore_v2")
+    await old.upsert_documents(make_chunks("a", ["x", "y"], "old"), "a")
+    await old.upsert_documents(make_chunks("b", ["z"], "old"), "b")
+
+    await sync_store(None, old, new, images=False, duty_cycle=0.5)
+    assert await new.file_ids() == {"a", "b"}
+    docs = await new.get_documents("a")
+    assert {doc.metadata["embedding_model"] for doc in docs} == {"new"}
+    assert new_embeddings.num_embedded == 3
+    results = await new.search(new_embeddings.embed_query("x"), k=1)
+    assert results["text"].to_pylist() == ["x"]
+
+    # Catching up after changes to the served table only embeds what changed.
+    await old.upsert_documents(make_chunks("a", ["x", "y2"], "old"), "a")
+    await old.delete({"file_id": "b"})
+    await sync_store(None, old, new, images=False)
+    assert await new.file_ids() == {"a"}
+    assert sorted(doc.page_content for doc in await new.get_documents("a")) == [
+        "x",
+        "y2",
+    ]
+    assert new_embeddings.num_embedded == 4
+
+
+@pytest.mark.asyncio
+async def test_changed_file_ids(tmp_path: Path, fake_embeddings, make_chunks) -> None:
+    store = AsyncLanceDB(str(tmp_path), fake_embeddings(), "vectorstore")
+    assert await store.version() is None
+    for file_id in ("a", "b", "c"):
+        await store.upsert_documents(make_chunks(file_id, ["x", "y"]), file_id)
+    version = await store.version()
+
+    await store.upsert_documents(make_chunks("a", ["x", "y2"]), "a")
+    await store.upsert_documents(make_chunks("b", ["x", "y"]), "b")
+    await store.delete({"file_id": "c"})
+    await store.upsert_documents(make_chunks("d", ["x"]), "d")
+    assert await store.changed_file_ids(version) == {"a", "c", "d"}
+    assert await store.changed_file_ids(None) == {"a", "b", "d"}
+    # The store itself still reads the latest version.
+    assert await store.file_ids() == {"a", "b", "d"}
+
+
+@pytest_asyncio.fixture
+async def serving(
+    tmp_path: Path, monkeypatch, engine: AIOEngine
+) -> AsyncGenerator[None, None]:
+    """
+    Serve the "old" fake model and its tables from `tmp_path`; the model and
+    stores served before are restored after the test.
+    """
+    monkeypatch.setattr(settings, "LANCE_URI", str(tmp_path / "lance"))
+    monkeypatch.setattr(settings, "LANCE_IMAGE_TABLE_NAME", None)
+    monkeypatch.setattr(settings, "LANCE_DOCUMENT_CACHE_DIR_PATH", None)
+    monkeypatch.setattr(settings, "LANCE_MAINTENANCE_LOCK_PATH", tmp_path / "m.lock")
+    monkeypatch.setattr(settings, "EMBEDDINGS_MODEL_KEY", "test-fake")
+    monkeypatch.setattr(settings, "EMBEDDINGS_KWARGS", {"name": "old"})
+    monkeypatch.setattr(settings, "EMBEDDING_MIGRATION_LOCK_PATH", tmp_path / "e.lock")
+    monkeypatch.setattr(settings, "EMBEDDING_MIGRATION_POLL_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "EMBEDDING_MIGRATION_SETTLE_SECONDS", 0.5)
+    served = (
+        _EmbeddingsSingleton._instance,
+        _VectorStoreSingleton._instance,
+        embedding_migration._served_id,
+        dict(embedding_migration._models),
+    )
+    await engine.remove(EmbeddingMigration)
+    await embedding_migration._serve(embedding_migration._serving_config(None))
+    yield
+    (
+        _EmbeddingsSingleton._instance,
+        _VectorStoreSingleton._instance,
+        embedding_migration._served_id,
+        models,
+    ) = served
+    embedding_migration._models.clear()
+    embedding_migration._models.update(models)
+    await engine.remove(EmbeddingMigration)
+
+
+async def process(engine: AIOEngine, store: AsyncLanceDB, chunks: list) -> None:
+    file_id = chunks[0].metadata["file_id"]
+    await engine.save(Document(id=file_id, name=file_id, path=f"{file_id}.pdf"))
+    await store.upsert_documents(chunks, file_id)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("serving")
+async def test_cutover_and_rollback(
+    engine: AIOEngine, fake_embeddings, make_chunks
+) -> None:
+    await process(engine, get_async_vector_store(), make_chunks("a", ["x"], "old"))
+    migration = await embedding_migration.start_migration(
+        engine, "test-fake", {"name": "new", "dim": 16}
+    )
+    await embedding_migration._tasks[migration.id]
+    # Processed after the re-embedding: caught up at the cutover.
+    await process(engine, get_async_vector_store(), make_chunks("b", ["y"], "old"))
+
+    await embedding_migration.cutover(engine, migration.id)
+    store = get_async_vector_store()
+    assert get_embeddings().name == "new"
+    assert store._table_name == migration.table_name
+    assert await store.file_ids() == {"a", "b"}
+    # Processed by a worker that has not switched yet: synced once every
+    # worker has.
+    old_store = AsyncLanceDB(
+        settings.LANCE_URI, fake_embeddings("old"), settings.LANCE_TABLE_NAME
+    )
+    await process(engine, old_store, make_chunks("c", ["z"], "old"))
+    assert await store.file_ids() == {"a", "b"}
+    await asyncio.gather(*embedding_migration._late_syncs)
+    assert await store.file_ids() == {"a", "b", "c"}
+    docs = await store.get_documents("c")
+    assert {doc.metadata["embedding_model"] for doc in docs} == {"new"}
+
+    # A second worker, still serving the configured model, follows the cutover.
+    embedding_migration._served_id = None
+    await embedding_migration._serve(embedding_migration._serving_config(None))
+    assert get_embeddings().name == "old"
+    await embedding_migration.follow_active_migration(engine)
+    assert get_embeddings().name == "new"
+    assert get_async_vector_store()._table_name == migration.table_name
+
+    # Processed with the new model: re-embedded into the restored tables.
+    await process(engine, get_async_vector_store(), make_chunks("d", ["w"], "new"))
+    rolled_back = await embedding_migration.rollback(engine)
+    assert rolled_back.status == "rolled_back"
+    store = get_async_vector_store()
+    assert get_embeddings().name == "old"
+    assert store._table_name == settings.LANCE_TABLE_NAME
+    assert await store.file_ids() == {"a", "b", "c", "d"}
+    docs = await store.get_documents("d")
+    assert {doc.metadata["embedding_model"] for doc in docs} == {"old"}
+    await asyncio.gather(*embedding_migration._late_syncs)
+    for file_id in "abcd":
+        await engine.remove(Document, Document.id == file_id)
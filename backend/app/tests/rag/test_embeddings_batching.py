@@ -0,0 +1,25 @@
+from app.rag.embeddings.batching import length_bucketed_batches
+
+
+def test_length_bucketed_batches_covers_every_item_once() -> None:
+    lengths = [5, 120, 7, 64, 3, 64, 900, 12]
+    batches = length_bucketed_batches(lengths, batch_size=3, max_tokens_per_batch=256)
+    indices = [i for batch in batches for i in batch]
+    assert sorted(indices) == list(range(len(lengths)))
+
+
+def test_length_bucketed_batches_respects_limits() -> None:
+    lengths = [5, 120, 7, 64, 3, 64, 900, 12]
+    batches = length_bucketed_batches(lengths, batch_size=3, max_tokens_per_batch=256)
+    for batch in batches:
+        assert len(batch) <= 3
+        padded = max(lengths[i] for i in batch) * len(batch)
+        # Only an item longer than the budget may exceed it, alone in its batch.
+        assert padded <= 256 or len(batch) == 1
+    # Sorted longest first, so similar lengths end up together.
+    assert batches[0] == [6]
+    assert batches[1] == [1, 3]
+
+
+def test_length_bucketed_batches_empty() -> None:
+    assert length_bucketed_batches([], batch_size=8, max_tokens_per_batch=1024) == []
@@ -0,0 +1,105 @@
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.cache import CachedEmbeddings, EmbeddingDiskCache
+from app.rag.embeddings.dispatcher import QueryEmbeddingDispatcher
+from app.rag.embeddings.query_cache import QueryCachedEmbeddings, QueryEmbeddingCache
+from app.rag.embeddings.registry import register_embedding_model
+
+
+@register_embedding_model("test-counting")
+class CountingEmbeddings(Embeddings):
+    name = "test-counting"
+
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += texts
+        return [[float(len(text))] * self.dim for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_cached_embeddings_reuses_vectors(tmp_path: Path) -> None:
+    embeddings = CachedEmbeddings(
+        "test-counting", cache_dir=tmp_path, max_bytes=1024**2, dim=8
+    )
+    first = embeddings.embed_documents(["alpha", "beta  gamma", "alpha"])
+    assert embeddings.embeddings.embedded == ["alpha", "beta  gamma"]
+
+    # Whitespace-only differences map to the same normalized text.
+    second = embeddings.embed_documents(["beta gamma", "delta", "alpha"])
+    assert embeddings.embeddings.embedded == ["alpha", "beta  gamma", "delta"]
+    assert second[0] == first[1]
+    assert second[2] == first[0]
+
+    # A new instance reads the shards back from disk.
+    reopened = CachedEmbeddings(
+        "test-counting", cache_dir=tmp_path, max_bytes=1024**2, dim=8
+    )
+    assert reopened.embed_documents(["delta"]) == [second[1]]
+    assert reopened.embeddings.embedded == []
+
+
+def test_cached_embeddings_namespaced_by_kwargs(tmp_path: Path) -> None:
+    CachedEmbeddings(
+        "test-counting", cache_dir=tmp_path, max_bytes=1024**2, dim=8
+    ).embed_documents(["alpha"])
+    other = CachedEmbeddings(
+        "test-counting", cache_dir=tmp_path, max_bytes=1024**2, dim=4
+    )
+    assert len(other.embed_documents(["alpha"])[0]) == 4
+    assert other.embeddings.embedded == ["alpha"]
+
+
+def test_disk_cache_evicts_oldest_shards(tmp_path: Path) -> None:
+    cache = EmbeddingDiskCache(tmp_path, max_bytes=1024**2)
+    for i in range(4):
+        cache.put_many([bytes([i]) * 16], np.ones((1, 64), dtype=np.float32))
+    shard_size = cache.nbytes // 4
+
+    cache.max_bytes = 2 * shard_size
+    cache.put_many([bytes([9]) * 16], np.ones((1, 64), dtype=np.float32))
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get_many([bytes([0]) * 16]) == [None]
+    assert cache.get_many([bytes([9]) * 16])[0] is not None
+
+
+def test_disk_cache_merges_small_shards(tmp_path: Path) -> None:
+    cache = EmbeddingDiskCache(tmp_path, max_bytes=1024**2, merge_count=4)
+    for i in range(10):
+        cache.put_many([bytes([i]) * 16], np.full((1, 64), i, dtype=np.float32))
+    # Overwritten rows are not carried over.
+    cache.put_many([bytes([0]) * 16], np.full((1, 64), 20, dtype=np.float32))
+    assert len(cache._shards) < 4
+    assert len(list(tmp_path.glob("*.arrow"))) == len(cache._shards)
+    vectors = cache.get_many([bytes([i]) * 16 for i in range(10)])
+    assert [int(vector[0]) for vector in vectors] == [20, *range(1, 10)]
+    assert cache.is_stale(bytes([9]) * 16)
+    assert not cache.is_stale(bytes([0]) * 16)
+
+
+@pytest.mark.asyncio
+async def test_batched_queries_bypass_disk_cache(tmp_path: Path) -> None:
+    embeddings = CachedEmbeddings(
+        "test-counting", cache_dir=tmp_path, max_bytes=1024**2, dim=8
+    )
+    shards = sorted(tmp_path.rglob("*"))
+    dispatcher = QueryEmbeddingDispatcher(embeddings, max_wait=0.001)
+    vectors = await asyncio.gather(
+        dispatcher.embed_query("alpha"), dispatcher.embed_query("beta")
+    )
+    assert vectors == [[5.0] * 8, [4.0] * 8]
+    assert await dispatcher.embed_queries(["gamma", "delta"]) == [[5.0] * 8] * 2
+    assert embeddings.embeddings.embedded == ["alpha", "beta", "gamma", "delta"]
+    # The query embedding cache in front embeds its misses the same way.
+    query_cached = QueryCachedEmbeddings(embeddings, QueryEmbeddingCache())
+    assert query_cached.embed_queries(["alpha", "epsilon"]) == [[5.0] * 8, [7.0] * 8]
+    assert sorted(tmp_path.rglob("*")) == shards
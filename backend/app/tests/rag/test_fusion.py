@@ -0,0 +1,38 @@
+from app.rag.vector_stores.fusion import merge_top_k, reciprocal_rank_fusion
+
+
+def test_reciprocal_rank_fusion_merges_by_rank() -> None:
+    text = ["a", "b", "c"]
+    image = ["x", "b"]
+    fused = reciprocal_rank_fusion([text, image], key=str)
+    # "b" appears in both lists; ties keep the order of the first list.
+    assert fused == ["b", "a", "x", "c"]
+
+
+def test_reciprocal_rank_fusion_weights() -> None:
+    fused = reciprocal_rank_fusion(
+        [["a", "b"], ["x", "y"]], key=str, weights=[1.0, 0.5]
+    )
+    assert fused == ["a", "b", "x", "y"]
+
+
+def test_merge_top_k_caps_groups() -> None:
+    first = [(0.1, "a"), (0.2, "a"), (0.3, "a")]
+    second = [(0.15, "b"), (0.4, "b")]
+    merged = merge_top_k(
+        [first, second],
+        k=3,
+        score=lambda item: item[0],
+        group=lambda item: item[1],
+        max_per_group=2,
+    )
+    assert merged == [(0.1, "a"), (0.15, "b"), (0.2, "a")]
+    # The third item of "a" is skipped for the second of "b".
+    merged = merge_top_k(
+        [first, second],
+        k=4,
+        score=lambda item: item[0],
+        group=lambda item: item[1],
+        max_per_group=2,
+    )
+    assert merged[-1] == (0.4, "b")
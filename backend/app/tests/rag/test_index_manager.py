@@ -0,0 +1,91 @@
+from datetime import timedelta
+from pathlib import Path
+
+import lancedb
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.rag.vector_stores.index_manager import VectorIndexManager
+from app.rag.vector_stores.lancedb import NexusLanceDB
+
+
+class RandomEmbeddings(Embeddings):
+    def __init__(self, dim: int = 32):
+        self.rng = np.random.default_rng(0)
+        self.dim = dim
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.rng.normal(size=(len(texts), self.dim)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def add_rows(store: NexusLanceDB, n: int) -> None:
+    store.add_texts([f"text {i}" for i in range(n)])
+
+
+def test_index_lifecycle(tmp_path: Path) -> None:
+    store = NexusLanceDB(
+        lancedb.connect(tmp_path), RandomEmbeddings(), str(tmp_path), "test", nprobes=4
+    )
+    manager = VectorIndexManager(store, min_rows=256, retrain_growth=2.0)
+    assert manager.maintain() == "none"
+
+    add_rows(store, 200)
+    assert manager.maintain() == "none"
+    add_rows(store, 100)
+    assert manager.maintain() == "created"
+    assert manager.status()["num_indexed_rows"] == 300
+
+    add_rows(store, 100)
+    assert manager.maintain() == "updated"
+    assert manager.status()["num_unindexed_rows"] == 0
+
+    add_rows(store, 200)
+    assert manager.maintain() == "retrained"
+    assert manager.maintain() == "none"
+
+    assert len(store.similarity_search("query", k=3)) == 3
+    # Grouped by the size counted by the last maintenance run.
+    assert store.search_stats.num_rows == 600
+    assert store.search_stats.summary() == [
+        {**store.search_stats.summary()[0], "min_rows": 512, "count": 1}
+    ]
+
+
+def test_file_id_prefilter(tmp_path: Path) -> None:
+    store = NexusLanceDB(
+        lancedb.connect(tmp_path), RandomEmbeddings(), str(tmp_path), "test"
+    )
+    texts = [f"text {i}" for i in range(100)]
+    store.add_texts(texts, metadatas=[{"file_id": str(i % 10)} for i in range(100)])
+    manager = VectorIndexManager(store, scalar_index_columns={"file_id": "BTREE"})
+    manager.maintain()
+    assert manager._index_stats(store.get_table(), "file_id") is not None
+
+    docs = store.similarity_search("query", k=20, filter={"file_id": "3"})
+    assert len(docs) == 10
+    assert all(doc.metadata["file_id"] == "3" for doc in docs)
+
+
+def test_compact_after_delete(tmp_path: Path) -> None:
+    store = NexusLanceDB(
+        lancedb.connect(tmp_path), RandomEmbeddings(), str(tmp_path), "test"
+    )
+    for file_id in range(5):
+        store.add_texts(
+            ["a", "b"], metadatas=[{"file_id": str(file_id)}, {"file_id": "x"}]
+        )
+    manager = VectorIndexManager(store)
+    store.get_table().delete("file_id = '0'")
+    assert manager.status()["num_deleted_rows"] == 1
+
+    stats = manager.compact(timedelta(0))
+    assert stats["fragments_removed"] == 5
+    assert stats["bytes_removed"] > 0
+    status = manager.status()
+    assert status["num_rows"] == 9
+    assert status["num_fragments"] == 1
+    assert status["num_deleted_rows"] == 0
+    assert status["reclaimed_bytes"] == stats["bytes_removed"]
@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from app.core.lease import FileLease
+
+
+def test_file_lease_has_one_holder(tmp_path: Path) -> None:
+    path = tmp_path / "locks" / "maintenance.lock"
+    first, second = FileLease(path), FileLease(path)
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert second.held and not first.held
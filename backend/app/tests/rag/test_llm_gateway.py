@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.rag.llm_gateway import LLMGateway, LLMOverloaded
+
+
+class SlowLLM:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, input: str) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await self.release.wait()
+        self.running -= 1
+        return input
+
+    async def astream(self, input: str):
+        for token in input.split():
+            yield token
+
+
+@pytest.mark.asyncio
+async def test_gateway_limits_concurrency_and_queue() -> None:
+    llm = SlowLLM()
+    gateway = LLMGateway(llm, "slow", max_concurrency=2, max_queue=1)
+    tasks = [asyncio.create_task(gateway.ainvoke(str(i))) for i in range(3)]
+    await asyncio.sleep(0.01)
+    assert (gateway.in_flight, gateway.queued) == (2, 1)
+    # The queue is full.
+    with pytest.raises(LLMOverloaded):
+        await gateway.ainvoke("rejected")
+    llm.release.set()
+    assert await asyncio.gather(*tasks) == ["0", "1", "2"]
+    assert llm.max_running == 2
+    stats = gateway.stats()
+    assert (stats["completed"], stats["rejected"], stats["queued"]) == (3, 1, 0)
+    assert [token async for token in gateway.astream("a b")] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_gateway_queue_timeout() -> None:
+    llm = SlowLLM()
+    gateway = LLMGateway(llm, "slow", max_concurrency=1, queue_timeout=0.01)
+    running = asyncio.create_task(gateway.ainvoke("running"))
+    await asyncio.sleep(0)
+    with pytest.raises(LLMOverloaded):
+        await gateway.ainvoke("waiting")
+    assert gateway.stats()["timed_out"] == 1
+    llm.release.set()
+    assert await running == "running"
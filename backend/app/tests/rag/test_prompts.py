@@ -0,0 +1,26 @@
+import pytest
+
+from app.rag.prompts import create_prompt, register_prompt
+from app.rag.prompts.registry import PROMPT_REGISTRY
+
+
+def test_rag_prompt_formats_offline() -> None:
+    messages = create_prompt("rag").invoke(
+        {"question": "What is RoPE?", "context": "RoPE rotates queries and keys."}
+    )
+    text = messages.to_messages()[0].content
+    assert "Question: What is RoPE?" in text
+    assert "Context: RoPE rotates queries and keys." in text
+
+
+def test_prompt_versions(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Removed after the test, so that later prompt singletons do not build it.
+    monkeypatch.setitem(PROMPT_REGISTRY, "test-versions", {})
+    register_prompt("test-versions", 1)(lambda: "first")
+    register_prompt("test-versions", 2)(lambda: "second")
+    assert create_prompt("test-versions") == "second"
+    assert create_prompt("test-versions", 1) == "first"
+    with pytest.raises(ValueError):
+        create_prompt("test-versions", 3)
+    with pytest.raises(ValueError):
+        create_prompt("missing")
@@ -0,0 +1,51 @@
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.query_cache import QueryCachedEmbeddings, QueryEmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    name = "test-counting"
+
+    def __init__(self):
+        self.queries: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [float(len(text))]
+
+
+def test_query_cache_hits_and_eviction() -> None:
+    cache = QueryEmbeddingCache(max_size=2)
+    embeddings = QueryCachedEmbeddings(CountingEmbeddings(), cache)
+
+    embeddings.embed_query("summarize this paper")
+    # Normalized questions share an entry.
+    embeddings.embed_query("  summarize   this paper ")
+    embeddings.embed_query("what are the contributions")
+    embeddings.embed_query("limitations")
+    # The least recently used question was evicted.
+    embeddings.embed_query("summarize this paper")
+    assert embeddings.embeddings.queries == [
+        "summarize this paper",
+        "what are the contributions",
+        "limitations",
+        "summarize this paper",
+    ]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 4, 2)
+    assert stats["hit_ratio"] == 0.2
+
+
+def test_query_cache_ttl() -> None:
+    cache = QueryEmbeddingCache(max_size=8, ttl=0.05)
+    embeddings = QueryCachedEmbeddings(CountingEmbeddings(), cache)
+    embeddings.embed_query("question")
+    embeddings.embed_query("question")
+    time.sleep(0.1)
+    embeddings.embed_query("question")
+    assert embeddings.embeddings.queries == ["question", "question"]
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.dispatcher import QueryEmbeddingDispatcher
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_batches_concurrent_queries() -> None:
+    embeddings = RecordingEmbeddings()
+    dispatcher = QueryEmbeddingDispatcher(embeddings, max_batch_size=4, max_wait=0.05)
+    texts = ["a", "bb", "bb", "ccc", "dddd", "eeeee"]
+    vectors = await asyncio.gather(*(dispatcher.embed_query(t) for t in texts))
+
+    assert vectors == [[float(len(t))] for t in texts]
+    # The first batch is full; duplicates within a batch are embedded once.
+    assert embeddings.batches == [["a", "bb", "ccc"], ["dddd", "eeeee"]]
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_propagates_errors() -> None:
+    class FailingEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts: list[str]) -> list[list[float]]:
+            raise RuntimeError("boom")
+
+    dispatcher = QueryEmbeddingDispatcher(FailingEmbeddings(), max_wait=0.001)
+    with pytest.raises(RuntimeError, match="boom"):
+        await dispatcher.embed_query("question")
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_cancels_callers_of_cancelled_batch() -> None:
+    class SlowEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts: list[str]) -> list[list[float]]:
+            time.sleep(0.2)
+            return super().embed_documents(texts)
+
+    dispatcher = QueryEmbeddingDispatcher(SlowEmbeddings(), max_wait=0.001)
+    query = asyncio.ensure_future(dispatcher.embed_query("question"))
+    await asyncio.sleep(0.05)
+    dispatcher._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(query, 1)
@@ -0,0 +1,145 @@
+from pathlib import Path
+
+import lancedb
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.rag.retrieval import retrieve, retrieve_many
+from app.rag.vector_stores.document_cache import DocumentVectorCache
+from app.rag.vector_stores.index_manager import VectorIndexManager
+from app.rag.vector_stores.lancedb import NexusLanceDB
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+TEXTS = [
+    "The memory module learns to memorize at test time.",
+    "We compare against Transformers and linear recurrent models.",
+    "RoPE is applied to queries and keys.",
+    "Results on language modeling and commonsense reasoning.",
+]
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = np.random.default_rng(len(text)).normal(size=16)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def metadatas(file_id: str, start: int, count: int) -> list[dict]:
+    return [{"file_id": file_id, "block_ids": [str(i)]} for i in range(start, count)]
+
+
+@pytest.mark.asyncio
+async def test_lexical_and_hybrid_retrieval(tmp_path: Path) -> None:
+    store = AsyncLanceDB(str(tmp_path), HashEmbeddings(), "test", search_dim=8)
+    embeddings = store.embeddings.embed_documents(TEXTS)
+    for file_id in ("a", "b"):
+        await store.add_embeddings(TEXTS, embeddings, metadatas(file_id, 0, 4))
+    # Indexes are maintained through the sync store, on the same table.
+    sync_store = NexusLanceDB(
+        lancedb.connect(tmp_path), HashEmbeddings(), str(tmp_path), "test", 8
+    )
+    VectorIndexManager(sync_store, scalar_index_columns={"text": "INVERTED"}).maintain()
+    # Rows added after the full-text index was created are searchable as well.
+    await store.add_embeddings(
+        ["RoPE frequencies are rescaled."],
+        store.embeddings.embed_documents(["RoPE frequencies are rescaled."]),
+        metadatas("a", 4, 5),
+    )
+
+    lexical = await retrieve(
+        store, None, "RoPE", None, k=3, file_id="a", mode="lexical"
+    )
+    assert sorted(doc.metadata["block_ids"][0] for doc in lexical) == ["2", "4"]
+    assert all(doc.metadata["file_id"] == "a" for doc in lexical)
+
+    results = await store.search(embeddings[0], k=2, filter={"file_id": "b"})
+    assert results["file_id"].to_pylist() == ["b", "b"]
+    assert results["_distance"].to_numpy()[0] == pytest.approx(0, abs=1e-5)
+
+    hybrid = await retrieve(
+        store, None, "RoPE", embeddings[0], k=3, file_id="a", mode="hybrid"
+    )
+    assert len(hybrid) == 3
+    # The best vector match and the best lexical match are both kept.
+    block_ids = {doc.metadata["block_ids"][0] for doc in hybrid}
+    assert {"0", lexical[0].metadata["block_ids"][0]} <= block_ids
+
+
+@pytest.mark.asyncio
+async def test_retrieve_many_matches_retrieve(tmp_path: Path) -> None:
+    cache = DocumentVectorCache(tmp_path / "cache")
+    store = AsyncLanceDB(
+        str(tmp_path / "lance"), HashEmbeddings(), "test", document_cache=cache
+    )
+    embeddings = store.embeddings.embed_documents(TEXTS)
+    for file_id in ("a", "b"):
+        await store.add_embeddings(TEXTS, embeddings, metadatas(file_id, 0, 4))
+
+    questions = ["memory", "RoPE keys", "linear models"]
+    query_embeddings = store.embeddings.embed_documents(questions)
+    batch = await retrieve_many(
+        store, None, questions, query_embeddings, k=2, file_id="b"
+    )
+    for question, embedding, docs in zip(
+        questions, query_embeddings, batch, strict=True
+    ):
+        single = await retrieve(store, None, question, embedding, k=2, file_id="b")
+        assert [doc.page_content for doc in docs] == [
+            doc.page_content for doc in single
+        ]
+        assert all(doc.metadata["file_id"] == "b" for doc in docs)
+    # The searches of all the questions read the document's vectors once.
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_library_retrieval_caps_documents(tmp_path: Path) -> None:
+    cache = DocumentVectorCache(tmp_path / "cache")
+    store = AsyncLanceDB(
+        str(tmp_path / "lance"), HashEmbeddings(), "test", document_cache=cache
+    )
+    embeddings = store.embeddings.embed_documents(TEXTS)
+    for file_id in ("a", "b", "c"):
+        await store.add_embeddings(TEXTS, embeddings, metadatas(file_id, 0, 4))
+
+    docs = await retrieve(
+        store, None, TEXTS[0], embeddings[0], k=4, file_id=None, max_per_document=2
+    )
+    file_ids = [doc.metadata["file_id"] for doc in docs]
+    assert len(docs) == 4
+    assert max(file_ids.count(file_id) for file_id in set(file_ids)) == 2
+    # The exact match of each document comes first.
+    assert [doc.page_content for doc in docs[:3]] == [TEXTS[0]] * 3
+
+    # A set of documents, searched one by one or at once.
+    for max_partitions in (32, 1):
+        pairs = await store.search_documents(
+            embeddings[0],
+            k=3,
+            file_ids=["a", "c"],
+            max_per_document=1,
+            max_partitions=max_partitions,
+        )
+        assert sorted(doc.metadata["file_id"] for doc, _ in pairs) == ["a", "c"]
+        assert [distance for _, distance in pairs] == sorted(
+            distance for _, distance in pairs
+        )
+
+    # Too few documents to fill k: the rows fetched stop growing.
+    searches = []
+    search = store.similarity_search_by_vector
+
+    async def counting_search(embedding, k, **kwargs):
+        searches.append(k)
+        return await search(embedding, k, **kwargs)
+
+    store.similarity_search_by_vector = counting_search
+    pairs = await store.search_documents(
+        embeddings[0], k=4, max_per_document=1, max_rounds=1
+    )
+    assert len(pairs) == 3
+    assert searches == [8]
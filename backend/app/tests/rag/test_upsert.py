@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pytest
+
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+
+@pytest.mark.asyncio
+async def test_reprocess_replaces_changed_chunks(
+    tmp_path: Path, fake_embeddings, make_chunks
+) -> None:
+    embeddings = fake_embeddings()
+    store = AsyncLanceDB(str(tmp_path), embeddings, "test")
+    await store.upsert_documents(make_chunks("b", ["other"]), file_id="b")
+    counts = await store.upsert_documents(make_chunks("a", ["x", "y", "z"]), "a")
+    assert counts == {"inserted": 3, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    # Same document again: nothing is embedded or written.
+    counts = await store.upsert_documents(make_chunks("a", ["x", "y", "z"]), "a")
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+    assert embeddings.num_embedded == 4
+
+    # One section changed and the last one is gone.
+    counts = await store.upsert_documents(make_chunks("a", ["x", "y2"]), "a")
+    assert counts == {"inserted": 0, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert embeddings.num_embedded == 5
+
+    table = await store.get_table()
+    assert await table.count_rows() == 3
+    rows = await table.query().where("file_id = 'a'").to_arrow()
+    assert sorted(rows["text"].to_pylist()) == ["x", "y2"]
@@ -0,0 +1,86 @@
+"""
+Latency of a per-document vector search through AsyncLanceDB, prefiltering the
+table on file_id compared to an exact search over the document's cached float16
+vectors.
+
+    PYTHONPATH=. python benchmarks/_document_cache.py --num_documents 100 1000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.rag.vector_stores.document_cache import DocumentVectorCache
+from app.rag.vector_stores.lancedb_async import AsyncLanceDB
+
+
+class NoEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> list[float]:
+        raise NotImplementedError
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-document search with and without the cache."
+    )
+    parser.add_argument("--num_documents", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--chunks_per_document", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num_queries", type=int, default=200)
+    return parser.parse_args()
+
+
+async def search_latency(store, queries, file_ids, k: int):
+    latencies = []
+    for query, file_id in zip(queries, file_ids, strict=True):
+        start = time.perf_counter()
+        await store.similarity_search_by_vector(query, k, filter={"file_id": file_id})
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+async def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_documents in args.num_documents:
+            uri = str(Path(tmp_dir) / f"lance{num_documents}")
+            lance = AsyncLanceDB(uri, NoEmbeddings(), "docs")
+            texts = [f"chunk {i}" for i in range(args.chunks_per_document)]
+            for i in range(num_documents):
+                vectors = rng.normal(size=(len(texts), args.dim)).astype(np.float32)
+                await lance.add_embeddings(
+                    texts, vectors, [{"file_id": f"file-{i}"} for _ in texts]
+                )
+            cached = AsyncLanceDB(
+                uri,
+                NoEmbeddings(),
+                "docs",
+                document_cache=DocumentVectorCache(
+                    Path(tmp_dir) / f"cache{num_documents}"
+                ),
+            )
+            queries = rng.normal(size=(args.num_queries, args.dim)).astype(np.float32)
+            # Queries go to a few documents at a time, as users read them.
+            file_ids = [f"file-{i}" for i in rng.integers(8, size=args.num_queries)]
+
+            scan = await search_latency(lance, queries, file_ids, args.k)
+            exact = await search_latency(cached, queries, file_ids, args.k)
+            print(
+                f"{num_documents:>6} documents: "
+                f"LanceDB p50={scan[0]:7.2f}ms p99={scan[1]:7.2f}ms | "
+                f"cache p50={exact[0]:7.2f}ms p99={exact[1]:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
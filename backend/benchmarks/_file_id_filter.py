@@ -0,0 +1,99 @@
+"""
+Latency of a per-document vector search as the library grows: filtering on
+metadata.file_id (a full scan of the filter column) compared to prefiltering on
+the indexed top-level file_id column.
+
+    PYTHONPATH=. python benchmarks/_file_id_filter.py --num_documents 100 1000 10000
+"""
+
+import argparse
+import tempfile
+import time
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from app.rag.vector_stores.lancedb import _fixed_size_vectors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-document search with and without a file_id index."
+    )
+    parser.add_argument(
+        "--num_documents", type=int, nargs="+", default=[100, 1000, 10000]
+    )
+    parser.add_argument("--chunks_per_document", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num_queries", type=int, default=50)
+    return parser.parse_args()
+
+
+def make_table(connection, name: str, num_documents: int, args) -> lancedb.table.Table:
+    rng = np.random.default_rng(0)
+    table = None
+    # Written in batches of documents, as documents are processed one by one.
+    batch_documents = max(1, 200_000 // (args.chunks_per_document * args.dim))
+    for start in range(0, num_documents, batch_documents):
+        file_ids = [
+            f"file-{i}"
+            for i in range(start, min(start + batch_documents, num_documents))
+            for _ in range(args.chunks_per_document)
+        ]
+        vectors = rng.normal(size=(len(file_ids), args.dim)).astype(np.float32)
+        data = pa.table(
+            {
+                "metadata": pa.array([{"file_id": f} for f in file_ids]),
+                "file_id": pa.array(file_ids),
+                "vector": _fixed_size_vectors(vectors),
+            }
+        )
+        if table is None:
+            table = connection.create_table(name, data=data)
+        else:
+            table.add(data)
+    return table
+
+
+def search_latency(table, queries, file_ids, where: str, prefilter: bool, k: int):
+    latencies = []
+    for query, file_id in zip(queries, file_ids, strict=True):
+        start = time.perf_counter()
+        table.search(query).where(where.format(file_id), prefilter=prefilter).limit(
+            k
+        ).to_arrow()
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as uri:
+        connection = lancedb.connect(uri)
+        for num_documents in args.num_documents:
+            table = make_table(connection, f"docs{num_documents}", num_documents, args)
+            table.compact_files()
+            queries = rng.normal(size=(args.num_queries, args.dim)).astype(np.float32)
+            file_ids = [
+                f"file-{i}" for i in rng.integers(num_documents, size=args.num_queries)
+            ]
+
+            scan = search_latency(
+                table, queries, file_ids, "metadata.file_id = '{}'", False, args.k
+            )
+            table.create_scalar_index("file_id", index_type="BTREE")
+            indexed = search_latency(
+                table, queries, file_ids, "file_id = '{}'", True, args.k
+            )
+            print(
+                f"{num_documents:>7} documents ({table.count_rows():>8} rows): "
+                f"metadata.file_id p50={scan[0]:7.2f}ms p99={scan[1]:7.2f}ms | "
+                f"indexed file_id p50={indexed[0]:7.2f}ms p99={indexed[1]:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
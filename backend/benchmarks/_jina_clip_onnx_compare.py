@@ -0,0 +1,88 @@
+"""
+Accuracy vs. speed of the int8 ONNX Runtime text encoder against the PyTorch
+JinaClipV2Embeddings on CPU.
+
+    PYTHONPATH=. python benchmarks/_jina_clip_onnx_compare.py --pdf_path assets/2501.00663v1.pdf
+"""
+
+import argparse
+import time
+
+import fitz
+import numpy as np
+import torch
+
+from app.rag.embeddings.jina_clip import JinaClipV2Embeddings
+from app.rag.embeddings.jina_clip_onnx import JinaClipV2OnnxEmbeddings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare the ONNX int8 and PyTorch jina-clip-v2 text encoders."
+    )
+    parser.add_argument(
+        "--pdf_path",
+        type=str,
+        default="assets/2501.00663v1.pdf",
+        help="The PDF whose text blocks are used as chunks.",
+    )
+    parser.add_argument("--num_chunks", type=int, default=256)
+    parser.add_argument("--num_threads", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--model_dir", type=str, default="./data/onnx/jina-clip-v2")
+    return parser.parse_args()
+
+
+def load_chunks(pdf_path: str, num_chunks: int) -> list[str]:
+    chunks = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            chunks += [b[4].strip() for b in page.get_text("blocks") if b[4].strip()]
+    return list(dict.fromkeys(chunks))[:num_chunks]
+
+
+def timed(embeddings, texts: list[str]) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    texts = load_chunks(args.pdf_path, args.num_chunks)
+
+    reference = JinaClipV2Embeddings()
+    quantized = JinaClipV2OnnxEmbeddings(
+        model_dir=args.model_dir, intra_op_num_threads=args.num_threads
+    )
+    # Warm up both sessions.
+    reference.embed_documents(texts[:4])
+    quantized.embed_documents(texts[:4])
+
+    expected, reference_time = timed(reference, texts)
+    actual, quantized_time = timed(quantized, texts)
+
+    cosine = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    # Retrieval agreement: each chunk used as a query against all the others.
+    expected_top = np.argsort(-(expected @ expected.T), axis=1)[:, 1 : args.k + 1]
+    actual_top = np.argsort(-(actual @ actual.T), axis=1)[:, 1 : args.k + 1]
+    overlap = np.mean(
+        [
+            len(set(e) & set(a)) / args.k
+            for e, a in zip(expected_top, actual_top, strict=True)
+        ]
+    )
+
+    print(f"{len(texts)} chunks")
+    print(f"pytorch fp32  {len(texts) / reference_time:8.2f} chunks/s")
+    print(f"onnx int8     {len(texts) / quantized_time:8.2f} chunks/s")
+    print(f"cosine(fp32, int8) mean={cosine.mean():.4f} min={cosine.min():.4f}")
+    print(f"top-{args.k} neighbour overlap: {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+CPU throughput of JinaClipV2Embeddings: one forward pass per chunk (the previous
+behaviour) vs. length-bucketed batches.
+
+    PYTHONPATH=. python benchmarks/_jina_clip_throughput.py --pdf_path assets/2501.00663v1.pdf
+"""
+
+import argparse
+import time
+
+import fitz
+import torch
+
+from app.rag.embeddings.jina_clip import JinaClipV2Embeddings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark batched embedding throughput on CPU."
+    )
+    parser.add_argument(
+        "--pdf_path",
+        type=str,
+        default="assets/2501.00663v1.pdf",
+        help="The PDF whose text blocks are used as chunks.",
+    )
+    parser.add_argument("--num_chunks", type=int, default=256)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--max_tokens_per_batch", type=int, default=16384)
+    parser.add_argument("--num_threads", type=int, default=None)
+    return parser.parse_args()
+
+
+def load_chunks(pdf_path: str, num_chunks: int) -> list[str]:
+    chunks = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            chunks += [
+                block[4] for block in page.get_text("blocks") if block[4].strip()
+            ]
+    # Repeat the blocks if the document is too short to reach num_chunks.
+    return (chunks * (num_chunks // max(len(chunks), 1) + 1))[:num_chunks]
+
+
+def run(name: str, fn, texts: list[str]) -> None:
+    start = time.perf_counter()
+    fn(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {len(texts) / elapsed:8.2f} chunks/s ({elapsed:.2f}s)")
+
+
+def main():
+    args = parse_args()
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+
+    texts = load_chunks(args.pdf_path, args.num_chunks)
+    embeddings = JinaClipV2Embeddings(
+        batch_size=args.batch_size, max_tokens_per_batch=args.max_tokens_per_batch
+    )
+    # Warm up so that lazy initialization does not count against either run.
+    embeddings.embed_documents(texts[:4])
+
+    run(
+        "per-chunk",
+        lambda texts: [embeddings.model.encode_text(text) for text in texts],
+        texts,
+    )
+    run("bucketed", embeddings.embed_documents, texts)
+
+
+if __name__ == "__main__":
+    main()
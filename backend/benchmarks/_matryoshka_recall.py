@@ -0,0 +1,149 @@
+"""
+Recall and latency of Matryoshka-truncated search with full-dimension rescoring,
+compared to searching the full jina-clip-v2 embeddings.
+
+    PYTHONPATH=. python benchmarks/_matryoshka_recall.py --pdf_paths assets/2501.00663v1.pdf
+"""
+
+import argparse
+import tempfile
+import time
+
+import fitz
+import lancedb
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embeddings.jina_clip import JinaClipV2Embeddings
+from app.rag.vector_stores.lancedb import NexusLanceDB, truncate_embeddings
+
+
+class PrecomputedEmbeddings(Embeddings):
+    def __init__(self, texts: list[str], vectors: np.ndarray):
+        self.vectors = dict(zip(texts, vectors.tolist(), strict=True))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.vectors[text]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Matryoshka search with full-dimension rescoring."
+    )
+    parser.add_argument(
+        "--pdf_paths",
+        type=str,
+        nargs="+",
+        default=["assets/2501.00663v1.pdf"],
+        help="PDFs whose text blocks are used as the corpus.",
+    )
+    parser.add_argument("--search_dims", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--rescore_factor", type=int, default=4)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num_queries", type=int, default=100)
+    parser.add_argument("--replicate", type=int, default=1)
+    return parser.parse_args()
+
+
+def load_texts(pdf_paths: list[str]) -> list[str]:
+    texts = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                texts += [b[4].strip() for b in page.get_text("blocks") if b[4].strip()]
+    return list(dict.fromkeys(texts))
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = [len(set(f) & set(e)) for f, e in zip(found, expected, strict=True)]
+    return sum(hits) / expected.size
+
+
+def search_latency(store: NexusLanceDB, queries: np.ndarray, k: int) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        store.similarity_search_by_vector(query.tolist(), k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    args = parse_args()
+    texts = load_texts(args.pdf_paths)
+    embeddings = JinaClipV2Embeddings()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # Queries are held-out blocks; the corpus can be replicated with small noise to
+    # approximate a larger library.
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(
+        len(texts), size=min(args.num_queries, len(texts)), replace=False
+    )
+    queries = vectors[query_ids]
+    corpus = np.concatenate(
+        [vectors]
+        + [
+            vectors + rng.normal(scale=0.01, size=vectors.shape).astype(np.float32)
+            for _ in range(args.replicate - 1)
+        ]
+    )
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    expected = top_k(corpus, queries, args.k)
+    print(f"corpus: {len(corpus)} vectors x {corpus.shape[1]} dims, k={args.k}")
+
+    with tempfile.TemporaryDirectory() as uri:
+        connection = lancedb.connect(uri)
+        corpus_texts = [f"{i}" for i in range(len(corpus))]
+        query_texts = [f"q{i}" for i in range(len(queries))]
+        shim = PrecomputedEmbeddings(
+            corpus_texts + query_texts, np.concatenate([corpus, queries])
+        )
+
+        full_store = NexusLanceDB(connection, shim, uri, table_name="full")
+        full_store.add_texts(corpus_texts)
+        print(
+            f"{'full':<10} recall@k=1.000 "
+            f"vector bytes={corpus.nbytes:>12,} "
+            f"latency={search_latency(full_store, queries, args.k):.2f}ms"
+        )
+
+        for dim in args.search_dims:
+            truncated = truncate_embeddings(corpus, dim)
+            candidates = top_k(truncated, truncate_embeddings(queries, dim), args.k)
+            pool = top_k(
+                truncated,
+                truncate_embeddings(queries, dim),
+                args.k * args.rescore_factor,
+            )
+            rescored = np.stack(
+                [
+                    ids[np.argsort(-(corpus[ids] @ query))[: args.k]]
+                    for ids, query in zip(pool, queries, strict=True)
+                ]
+            )
+            store = NexusLanceDB(
+                connection,
+                shim,
+                uri,
+                table_name=f"dim{dim}",
+                search_dim=dim,
+                rescore_factor=args.rescore_factor,
+            )
+            store.add_texts(corpus_texts)
+            print(
+                f"{dim:<10} recall@k={recall(rescored, expected):.3f} "
+                f"(no rescore {recall(candidates, expected):.3f}) "
+                f"vector bytes={truncated.nbytes:>12,} "
+                f"latency={search_latency(store, queries, args.k):.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Query embedding latency under concurrency: one synchronous embed_query per
+request on the event loop, compared to the batching QueryEmbeddingDispatcher.
+Event-loop lag is measured by a ticker coroutine running alongside the requests.
+
+    PYTHONPATH=. python benchmarks/_query_embedding_load.py --concurrency 1 8 32
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.rag.embeddings.dispatcher import QueryEmbeddingDispatcher
+from app.rag.embeddings.jina_clip import JinaClipV2Embeddings
+
+QUESTIONS = [
+    "Summarize this paper.",
+    "What are the main contributions?",
+    "How does the memory module work at test time?",
+    "Which datasets are used in the experiments?",
+    "What are the limitations of the proposed approach?",
+    "How does the method compare to Transformers on long contexts?",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Load test query embedding with and without micro-batching."
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--num_requests", type=int, default=256)
+    parser.add_argument("--max_batch_size", type=int, default=32)
+    parser.add_argument("--max_wait_ms", type=float, default=5.0)
+    return parser.parse_args()
+
+
+async def ticker(lags: list[float], stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_load(embed, num_requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def request(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            # Distinct questions so that no result is shared between requests.
+            await embed(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+            latencies.append(time.perf_counter() - start)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(num_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    return np.asarray(latencies) * 1000, np.asarray(lags or [0.0]) * 1000, elapsed
+
+
+def report(label: str, latencies, lags, elapsed: float, num_requests: int):
+    print(
+        f"{label:<12} p50={np.percentile(latencies, 50):8.1f}ms "
+        f"p99={np.percentile(latencies, 99):8.1f}ms "
+        f"qps={num_requests / elapsed:7.1f} "
+        f"loop lag p99={np.percentile(lags, 99):7.1f}ms"
+    )
+
+
+async def main():
+    args = parse_args()
+    embeddings = JinaClipV2Embeddings()
+    embeddings.embed_query("warm up")
+
+    async def blocking(text: str):
+        return embeddings.embed_query(text)
+
+    for concurrency in args.concurrency:
+        print(f"concurrency={concurrency}")
+        report(
+            "blocking",
+            *await run_load(blocking, args.num_requests, concurrency),
+            args.num_requests,
+        )
+        dispatcher = QueryEmbeddingDispatcher(
+            embeddings,
+            max_batch_size=args.max_batch_size,
+            max_wait=args.max_wait_ms / 1000,
+        )
+        report(
+            "dispatcher",
+            *await run_load(dispatcher.embed_query, args.num_requests, concurrency),
+            args.num_requests,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
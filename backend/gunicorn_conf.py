@@ -1,8 +1,15 @@
+import os
+import subprocess
+import sys
+
+from app.core.config import settings
+
 # Bind to all interfaces on port 8000
 bind = "0.0.0.0:8000"
 
-# Calculate the number of workers based on available CPU cores
-workers = 1
+# Workers share one embedding model through the embedding server when
+# EMBEDDINGS_MODEL_KEY is "embedding-server"; otherwise each loads its own copy.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
 
 # Use Uvicorn's worker class for ASGI applications
 worker_class = "uvicorn.workers.UvicornWorker"
@@ -14,3 +21,21 @@ timeout = 30
 loglevel = "info"
 accesslog = "-"  # Logs access messages to stdout
 errorlog = "-"  # Logs error messages to stderr
+
+_embedding_server: subprocess.Popen | None = None
+
+
+def on_starting(server):
+    global _embedding_server
+    if settings.EMBEDDINGS_MODEL_KEY == "embedding-server":
+        server.log.info("Starting the embedding server.")
+        _embedding_server = subprocess.Popen(
+            [sys.executable, "-m", "app.rag.embeddings.server"]
+        )
+
+
+def on_exit(server):
+    if _embedding_server is not None:
+        server.log.info("Stopping the embedding server.")
+        _embedding_server.terminate()
+        _embedding_server.wait()